@@ -3,21 +3,25 @@ from __future__ import annotations
 import asyncio
 
 from homeassistant import config_entries, core
+from homeassistant.exceptions import ServiceValidationError
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
 
 from .const import (
     DOMAIN,
+    STORAGE_VERSION,
     CONF_REBUILD_HISTORY,
-    CONF_INDEX_BATTERY_IN,
-    CONF_INDEX_BATTERY_OUT,
-    CONF_CAPACITY_BATTERY,
-    CONF_INDEX_BASE_EMULATED,
-    CONF_INDEX_INJECTION_EMULATED,
     CONF_TARIFF_OPTION,
     CONF_SUBSCRIBED_POWER,
     TARIFF_OPTION_BASE,
 )
+from .journal import DeltaJournal, replay_battery
+from .runtime import UrbanSolarRuntimeData
 
 SERVICE_REBUILD_HISTORY = "rebuild_history"
+SERVICE_REPLAY_JOURNAL = "replay_journal"
+SERVICE_GET_STATE_AT = "get_state_at"
 
 
 async def async_setup(hass: core.HomeAssistant, config: dict) -> bool:
@@ -27,16 +31,68 @@ async def async_setup(hass: core.HomeAssistant, config: dict) -> bool:
 
 async def async_setup_entry(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> bool:
     """Set up a config entry for UrbanSolar."""
+    runtime = UrbanSolarRuntimeData()
+    runtime.options = dict(entry.options)
+    runtime.store = Store(hass, STORAGE_VERSION, _storage_key(entry))
+    runtime.load_dict(await runtime.store.async_load())
+    runtime.journal = DeltaJournal(_journal_path(hass, entry))
+    runtime.tariff_store = _tariff_store(hass, entry)
+    entry.runtime_data = runtime
     # Charger la plateforme sensor
     await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+    entry.async_on_unload(entry.add_update_listener(_async_reload_entry))
     _register_services(hass)
     return True
 
 
 async def async_unload_entry(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> bool:
     """Unload a config entry."""
-    await hass.config_entries.async_forward_entry_unload(entry, "sensor")
-    return True
+    unloaded = await hass.config_entries.async_unload_platforms(entry, ["sensor"])
+    if unloaded:
+        runtime: UrbanSolarRuntimeData = entry.runtime_data
+        await runtime.store.async_save(runtime.as_dict())
+        if runtime.coordinator is not None:
+            await runtime.coordinator.async_flush_journal()
+    return unloaded
+
+
+async def async_remove_entry(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> None:
+    """Remove the persisted accumulators of a deleted entry."""
+    await Store(hass, STORAGE_VERSION, _storage_key(entry)).async_remove()
+    await _tariff_store(hass, entry).async_remove()
+    await hass.async_add_executor_job(DeltaJournal(_journal_path(hass, entry)).remove)
+
+
+async def _async_migrate_unique_ids(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> None:
+    """Prefix the unique ids registered before they were scoped to the config entry."""
+    prefix = f"{entry.entry_id}_"
+
+    @core.callback
+    def _migrate(entity_entry: er.RegistryEntry):
+        if entity_entry.unique_id.startswith(prefix):
+            return None
+        return {"new_unique_id": f"{prefix}{entity_entry.unique_id}"}
+
+    await er.async_migrate_entries(hass, entry.entry_id, _migrate)
+
+
+def _storage_key(entry: config_entries.ConfigEntry) -> str:
+    return f"{DOMAIN}.{entry.entry_id}"
+
+
+def _tariff_store(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> Store:
+    return Store(hass, STORAGE_VERSION, f"{_storage_key(entry)}.tariffs")
+
+
+def _journal_path(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> str:
+    return hass.config.path(".storage", f"{_storage_key(entry)}.journal")
+
+
+async def _async_reload_entry(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> None:
+    """Reload the entry when its options change."""
+    if dict(entry.options) == entry.runtime_data.options:
+        return
+    await hass.config_entries.async_reload(entry.entry_id)
 
 
 async def async_migrate_entry(hass: core.HomeAssistant, entry: config_entries.ConfigEntry) -> bool:
@@ -46,6 +102,9 @@ async def async_migrate_entry(hass: core.HomeAssistant, entry: config_entries.Co
         data.setdefault(CONF_TARIFF_OPTION, TARIFF_OPTION_BASE)
         data.setdefault(CONF_SUBSCRIBED_POWER, 6)
         hass.config_entries.async_update_entry(entry, data=data, version=2)
+    if entry.version == 2:
+        await _async_migrate_unique_ids(hass, entry)
+        hass.config_entries.async_update_entry(entry, version=3)
     return True
 
 
@@ -71,30 +130,100 @@ def _register_services(hass: core.HomeAssistant) -> None:
                     data = dict(entry.data)
                     data[CONF_REBUILD_HISTORY] = False
                     hass.config_entries.async_update_entry(entry, data=data)
-                if result:
-                    sensor_battery_in = hass.data[DOMAIN].get(CONF_INDEX_BATTERY_IN)
-                    sensor_battery_out = hass.data[DOMAIN].get(CONF_INDEX_BATTERY_OUT)
-                    sensor_capacity = hass.data[DOMAIN].get(CONF_CAPACITY_BATTERY)
-                    sensor_base_emulated = hass.data[DOMAIN].get(CONF_INDEX_BASE_EMULATED)
-                    sensor_injection_emulated = hass.data[DOMAIN].get(CONF_INDEX_INJECTION_EMULATED)
-                    if sensor_battery_in:
-                        sensor_battery_in._state = result.battery_in
-                        sensor_battery_in._last_injection = result.last_injection_state
-                        sensor_battery_in.async_write_ha_state()
-                    if sensor_battery_out:
-                        sensor_battery_out._state = result.battery_out
-                        sensor_battery_out._last_base = result.last_base_state
-                        sensor_battery_out.async_write_ha_state()
-                    if sensor_capacity:
-                        sensor_capacity._state = result.capacity
-                        sensor_capacity.async_write_ha_state()
-                    if sensor_base_emulated:
-                        sensor_base_emulated._state = result.base_emulated
-                        sensor_base_emulated._last_base = result.last_base_state
-                        sensor_base_emulated._last_injection = result.last_injection_state
-                        sensor_base_emulated.async_write_ha_state()
-                    if sensor_injection_emulated and result.last_injection_state is not None:
-                        sensor_injection_emulated._state = result.last_injection_state
-                        sensor_injection_emulated.async_write_ha_state()
+                runtime = getattr(entry, "runtime_data", None)
+                if result and runtime is not None and runtime.coordinator is not None:
+                    await runtime.coordinator.async_apply_rebuild(result)
 
     hass.services.async_register(DOMAIN, SERVICE_REBUILD_HISTORY, _handle_rebuild)
+
+    async def _handle_replay_journal(call):
+        """Replay the delta journal on given starting totals (audit / what-if)."""
+        entry = _loaded_entry(hass, call.data.get("entry_id"))
+        runtime: UrbanSolarRuntimeData = entry.runtime_data
+        await runtime.coordinator.async_flush_journal()
+
+        since = call.data.get("since")
+        since_ts = _parse_timestamp(since) if since else None
+        battery_in = float(call.data.get("battery_in", 0.0))
+        battery_out = float(call.data.get("battery_out", 0.0))
+
+        def _replay():
+            count = 0
+
+            def _counted():
+                nonlocal count
+                for record in runtime.journal.replay(since_ts):
+                    count += 1
+                    yield record
+
+            totals = replay_battery(_counted(), battery_in, battery_out)
+            return count, totals
+
+        count, (battery_in, battery_out) = await hass.async_add_executor_job(_replay)
+        return {
+            "records": count,
+            "battery_in": round(battery_in, 3),
+            "battery_out": round(battery_out, 3),
+            "capacity": round(max(battery_in - battery_out, 0.0), 3),
+        }
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_REPLAY_JOURNAL,
+        _handle_replay_journal,
+        supports_response=core.SupportsResponse.ONLY,
+    )
+
+    async def _handle_get_state_at(call):
+        """Return the virtual battery state at one or several dates."""
+        from .history import async_fetch_states_at
+
+        entry = _loaded_entry(hass, call.data.get("entry_id"))
+        requested = call.data.get("datetime")
+        if not requested:
+            raise ServiceValidationError("'datetime' is required (a date or a list of dates)")
+        if not isinstance(requested, (list, tuple)):
+            requested = [requested]
+        timestamps = [_parse_timestamp(value) for value in requested]
+
+        results = await async_fetch_states_at(hass, entry, timestamps)
+        if results is None:
+            raise ServiceValidationError("Statistics of the derived sensors are not available")
+        states = []
+        for item in results:
+            start = item.pop("statistics_start")
+            item["datetime"] = dt_util.utc_from_timestamp(item.pop("timestamp")).isoformat()
+            item["statistics_hour"] = (
+                dt_util.utc_from_timestamp(start).isoformat() if start is not None else None
+            )
+            states.append(item)
+        return {"states": states}
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_STATE_AT,
+        _handle_get_state_at,
+        supports_response=core.SupportsResponse.ONLY,
+    )
+
+
+def _parse_timestamp(value) -> float:
+    """Parse a service date (naive values are local time) into a UTC timestamp."""
+    parsed = dt_util.parse_datetime(str(value))
+    if parsed is None:
+        raise ServiceValidationError(f"Invalid datetime: {value}")
+    return dt_util.as_utc(parsed).timestamp()
+
+
+def _loaded_entry(hass: core.HomeAssistant, entry_id) -> config_entries.ConfigEntry:
+    """Return the requested loaded entry, or the only loaded one when no id is given."""
+    entries = [
+        entry
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        if entry.state is config_entries.ConfigEntryState.LOADED
+        and (not entry_id or entry.entry_id == entry_id)
+    ]
+    if len(entries) != 1:
+        raise ServiceValidationError("Select exactly one loaded Urban Solar entry with 'entry_id'")
+    return entries[0]
+
@@ -1,5 +1,6 @@
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.core import callback
 from homeassistant.helpers.selector import selector
 from homeassistant.const import UnitOfEnergy, UnitOfPower
 from typing import Any, Dict
@@ -8,18 +9,29 @@ from .const import (
     DOMAIN,
     CONF_INDEX_BASE_SENSOR,
     CONF_INDEX_INJECTION_SENSOR,
+    CONF_IMPORT_POWER_SENSOR,
+    CONF_EXPORT_POWER_SENSOR,
     CONF_START_BATTERY_ENERGY,
     CONF_TARIFF_OPTION,
     CONF_SUBSCRIBED_POWER,
     CONF_REBUILD_HISTORY,
+    CONF_REDUCE_RECORDER_WRITES,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_OFFPEAK_HOURS,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_OFFPEAK_HOURS,
     TARIFF_OPTION_BASE,
     TARIFF_OPTION_HPHC,
     TARIFF_POWER_OPTIONS,
 )
+from .timeofuse import parse_offpeak_hours
 
 
 class UrbanSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
-    VERSION = 2
+    VERSION = 3
+
+    def __init__(self):
+        self._data: Dict[str, Any] = {}
 
     async def async_step_user(self, user_input=None):
         if user_input is not None:
@@ -29,6 +41,9 @@ class UrbanSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                     user_input[CONF_SUBSCRIBED_POWER] = int(user_input[CONF_SUBSCRIBED_POWER])
                 except (TypeError, ValueError):
                     user_input[CONF_SUBSCRIBED_POWER] = 6
+            if user_input.get(CONF_TARIFF_OPTION) == TARIFF_OPTION_HPHC:
+                self._data = user_input
+                return await self.async_step_offpeak()
             return self.async_create_entry(title="Urban Solar", data=user_input)
 
         return self.async_show_form(
@@ -56,21 +71,112 @@ class UrbanSolarConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 vol.Required(CONF_INDEX_BASE_SENSOR): selector({
                     "entity": {
                         "domain": "sensor",
-                        "device_class": "energy"
+                        "device_class": "energy",
+                        "multiple": True
                     }
                 }),
                 vol.Required(CONF_INDEX_INJECTION_SENSOR): selector({
                     "entity": {
                         "domain": "sensor",
-                        "device_class": "energy"
+                        "device_class": "energy",
+                        "multiple": True
                     }
                 }),
+                **_power_schema({}),
                 vol.Required(CONF_REBUILD_HISTORY, default=False): selector({
                     "boolean": {}
                 }),
-            })
+                **_recorder_schema({}),
+            }),
+        )
+
+    async def async_step_offpeak(self, user_input=None):
+        """Off-peak hours, asked only with the HP/HC option."""
+        errors = _offpeak_errors(user_input)
+        if user_input is not None and not errors:
+            return self.async_create_entry(title="Urban Solar", data={**self._data, **user_input})
 
+        return self.async_show_form(
+            step_id="offpeak",
+            data_schema=vol.Schema(_offpeak_schema(user_input or {})),
+            errors=errors,
         )
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry):
+        return UrbanSolarOptionsFlow()
+
     async def async_step_import(self, import_info: Dict[str, Any]):
         return self.async_create_entry(title="Urban Solar", data=import_info)
+
+
+class UrbanSolarOptionsFlow(config_entries.OptionsFlow):
+    async def async_step_init(self, user_input=None):
+        errors = _offpeak_errors(user_input)
+        if user_input is not None and not errors:
+            return self.async_create_entry(title="", data=user_input)
+
+        current = {**(self.config_entry.options or self.config_entry.data), **(user_input or {})}
+        offpeak = self.config_entry.data.get(CONF_TARIFF_OPTION) == TARIFF_OPTION_HPHC
+        return self.async_show_form(
+            step_id="init",
+            data_schema=vol.Schema({
+                **(_offpeak_schema(current) if offpeak else {}),
+                **_power_schema(current),
+                **_recorder_schema(current),
+            }),
+            errors=errors,
+        )
+
+
+def _offpeak_errors(user_input) -> Dict[str, str]:
+    if user_input is None or CONF_OFFPEAK_HOURS not in user_input:
+        return {}
+    try:
+        parse_offpeak_hours(user_input[CONF_OFFPEAK_HOURS])
+    except ValueError:
+        return {CONF_OFFPEAK_HOURS: "invalid_offpeak_hours"}
+    return {}
+
+
+def _offpeak_schema(current: Dict[str, Any]) -> Dict[Any, Any]:
+    # Only used with the HP/HC option, e.g. "22:00-06:00" or "01:30-07:30, 12:30-14:30".
+    return {
+        vol.Required(
+            CONF_OFFPEAK_HOURS,
+            default=current.get(CONF_OFFPEAK_HOURS, DEFAULT_OFFPEAK_HOURS),
+        ): str,
+    }
+
+
+def _power_schema(current: Dict[str, Any]) -> Dict[Any, Any]:
+    power_selector = selector({
+        "entity": {
+            "domain": "sensor",
+            "device_class": "power"
+        }
+    })
+    return {
+        vol.Optional(
+            CONF_IMPORT_POWER_SENSOR,
+            description={"suggested_value": current.get(CONF_IMPORT_POWER_SENSOR)},
+        ): power_selector,
+        vol.Optional(
+            CONF_EXPORT_POWER_SENSOR,
+            description={"suggested_value": current.get(CONF_EXPORT_POWER_SENSOR)},
+        ): power_selector,
+    }
+
+
+def _recorder_schema(current: Dict[str, Any]) -> Dict[Any, Any]:
+    return {
+        vol.Required(
+            CONF_REDUCE_RECORDER_WRITES,
+            default=current.get(CONF_REDUCE_RECORDER_WRITES, False),
+        ): selector({"boolean": {}}),
+        vol.Required(
+            CONF_MIN_WRITE_INTERVAL,
+            default=current.get(CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL),
+        ): vol.All(vol.Coerce(int), vol.Range(min=0, max=3600)),
+    }
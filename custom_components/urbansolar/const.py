@@ -10,6 +10,8 @@ CONF_CAPACITY_BATTERY = "battery_capacity"
 CONF_INDEX_BASE_EMULATED = "index_base_emulated"
 CONF_INDEX_INJECTION_EMULATED = "index_injection_emulated"
 CONF_REBUILD_HISTORY = "rebuild_history"
+CONF_IMPORT_POWER_SENSOR = "import_power_sensor"
+CONF_EXPORT_POWER_SENSOR = "export_power_sensor"
 
 # Tariffs / pricing configuration
 CONF_TARIFF_OPTION = "tariff_option"
@@ -28,3 +30,35 @@ SENSOR_TARIFF_ENERGY_HP_TTC = "tariff_energy_hp_ttc"
 SENSOR_TARIFF_ENERGY_HC_TTC = "tariff_energy_hc_ttc"
 SENSOR_TARIFF_ACH_HP_TTC = "tariff_acheminement_hp_ttc"
 SENSOR_TARIFF_ACH_HC_TTC = "tariff_acheminement_hc_ttc"
+# Monthly subscription fee TTC of the subscribed power (EUR / month)
+SENSOR_TARIFF_SUBSCRIPTION_TTC = "tariff_subscription_ttc"
+
+# Persistent accumulator snapshot (one Store file per entry)
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY_S = 300
+
+# Recorder write-load reduction (opt-in)
+CONF_REDUCE_RECORDER_WRITES = "reduce_recorder_writes"
+CONF_MIN_WRITE_INTERVAL = "min_write_interval_s"
+DEFAULT_MIN_WRITE_INTERVAL = 0
+
+# Forecast sensors
+SENSOR_DEPLETION_FORECAST = "battery_depletion_forecast"
+SENSOR_CAPACITY_MONTH_END = "battery_capacity_month_end"
+
+# Cost sensors (EUR totals priced with the tariff in force each hour)
+SENSOR_COST_ENERGY = "base_emulated_energy_cost"
+SENSOR_COST_ACHEMINEMENT = "battery_out_acheminement_cost"
+SENSOR_INJECTION_CREDIT_VALUE = "injection_credit_value"
+UNIT_EUR = "EUR"
+
+# HP/HC split of the emulated consumption (off-peak ranges in local time)
+CONF_OFFPEAK_HOURS = "offpeak_hours"
+DEFAULT_OFFPEAK_HOURS = "22:00-06:00"
+SENSOR_BASE_EMULATED_HP = "base_emulated_hp"
+SENSOR_BASE_EMULATED_HC = "base_emulated_hc"
+SENSOR_BATTERY_OUT_HP = "battery_out_hp"
+SENSOR_BATTERY_OUT_HC = "battery_out_hc"
+
+# Estimated bill of the current billing period (calendar month)
+SENSOR_ESTIMATED_BILL = "estimated_bill"
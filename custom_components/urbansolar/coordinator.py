@@ -0,0 +1,609 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_EXPORT_POWER_SENSOR,
+    CONF_IMPORT_POWER_SENSOR,
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_OFFPEAK_HOURS,
+    CONF_REDUCE_RECORDER_WRITES,
+    CONF_TARIFF_OPTION,
+    DEFAULT_MIN_WRITE_INTERVAL,
+    DEFAULT_OFFPEAK_HOURS,
+    DOMAIN,
+    STORAGE_SAVE_DELAY_S,
+    TARIFF_OPTION_HPHC,
+)
+from .costs import PRICE_KEYS, CostTotals, LivePrices, bill_period_start
+from .forecast import SEED_DAYS
+from .journal import JOURNAL_COMPACT_AFTER_S
+from .power import PowerIntegrator
+from .runtime import BatterySnapshot, UrbanSolarRuntimeData, source_entity_list
+from .timeofuse import OffPeakSchedule
+
+_LOGGER = logging.getLogger(__name__)
+
+# Drift between live totals and hourly statistics tolerated by the reconciliation job.
+RECONCILE_DRIFT_THRESHOLD_KWH = 0.01
+
+# Smallest change of the power-based capacity estimate pushed to the entities.
+POWER_PUSH_THRESHOLD_KWH = 0.001
+
+
+def entry_option(config_entry, key, default=None):
+    """Return an option, or the value chosen in the config flow until the options flow is saved.
+
+    Once saved, the options hold every option field: a missing key was cleared there.
+    """
+    if config_entry.options:
+        return config_entry.options.get(key, default)
+    return config_entry.data.get(key, default)
+
+
+def offpeak_schedule(config_entry) -> OffPeakSchedule:
+    """Compiled off-peak schedule of the entry (the default one if the option is invalid)."""
+    value = entry_option(config_entry, CONF_OFFPEAK_HOURS, DEFAULT_OFFPEAK_HOURS)
+    try:
+        return OffPeakSchedule.from_string(value)
+    except ValueError as err:
+        _LOGGER.warning("Invalid off-peak hours '%s' (%s); using %s", value, err, DEFAULT_OFFPEAK_HOURS)
+        return OffPeakSchedule.from_string(DEFAULT_OFFPEAK_HOURS)
+
+
+def _as_float(state):
+    if state is None:
+        return None
+    if state.state in ("unknown", "unavailable"):
+        return None
+    try:
+        return float(state.state)
+    except (TypeError, ValueError):
+        return None
+
+
+def _power_w(state) -> Optional[float]:
+    power = _as_float(state)
+    if power is not None and state.attributes.get("unit_of_measurement") == "kW":
+        power *= 1000
+    return power
+
+
+class UrbanSolarCoordinator(DataUpdateCoordinator[BatterySnapshot]):
+    """Compute the virtual battery once per trigger and fan it out to the entities."""
+
+    def __init__(self, hass: HomeAssistant, config_entry, runtime: UrbanSolarRuntimeData) -> None:
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=config_entry,
+            name=f"{DOMAIN} battery",
+            update_interval=None,
+        )
+        self.runtime = runtime
+        self.base_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_BASE_SENSOR))
+        self.injection_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_INJECTION_SENSOR))
+        self._base_entity_set = frozenset(self.base_entity_ids)
+        self.import_power_entity_id: Optional[str] = entry_option(config_entry, CONF_IMPORT_POWER_SENSOR)
+        self.export_power_entity_id: Optional[str] = entry_option(config_entry, CONF_EXPORT_POWER_SENSOR)
+        if self.import_power_entity_id:
+            runtime.import_power = PowerIntegrator()
+        if self.export_power_entity_id:
+            runtime.export_power = PowerIntegrator()
+        self.reduce_writes: bool = bool(entry_option(config_entry, CONF_REDUCE_RECORDER_WRITES, False))
+        self.min_write_interval: int = int(
+            entry_option(config_entry, CONF_MIN_WRITE_INTERVAL, DEFAULT_MIN_WRITE_INTERVAL) or 0
+        )
+        self._init_source_last()
+        tariff_option = config_entry.data.get(CONF_TARIFF_OPTION)
+        self._live_prices = LivePrices(tariff_option) if tariff_option in PRICE_KEYS else None
+        self.offpeak_schedule: Optional[OffPeakSchedule] = None
+        if tariff_option == TARIFF_OPTION_HPHC:
+            self.offpeak_schedule = offpeak_schedule(config_entry)
+        self._expected_restores = 0
+        self._restored = 0
+        # Entities are available with the stored accumulators before the first source event.
+        self.needs_restore = runtime.battery_in is None
+        if not self.needs_restore:
+            self.data = runtime.snapshot()
+        # Source values received since the last computation (coalesced bursts).
+        self._pending: Dict[str, float] = {}
+        self._pending_previous: Dict[str, float] = {}
+        self._pending_task = None
+        self._journal_lock = asyncio.Lock()
+        # Entities refreshed by power samples; the others follow the index and hourly updates.
+        self._capacity_listeners: list = []
+
+    @callback
+    def async_add_capacity_listener(self, update_callback):
+        """Listen for the capacity estimate moved by power samples; returns the remover."""
+        self._capacity_listeners.append(update_callback)
+
+        @callback
+        def _remove() -> None:
+            self._capacity_listeners.remove(update_callback)
+
+        return _remove
+
+    @property
+    def source_entity_ids(self) -> list:
+        return self.base_entity_ids + self.injection_entity_ids
+
+    def _init_source_last(self) -> None:
+        """Drop removed sources and seed single-source entries stored before multi-meter."""
+        runtime = self.runtime
+        source_last = {
+            entity_id: value
+            for entity_id, value in runtime.source_last.items()
+            if entity_id in self.source_entity_ids
+        }
+        if not source_last:
+            if len(self.base_entity_ids) == 1 and runtime.last_base is not None:
+                source_last[self.base_entity_ids[0]] = runtime.last_base
+            if len(self.injection_entity_ids) == 1 and runtime.last_injection is not None:
+                source_last[self.injection_entity_ids[0]] = runtime.last_injection
+        runtime.source_last = source_last
+
+    def _source_sum(self, entity_ids: list) -> Optional[float]:
+        """Sum of the last known indexes of ``entity_ids`` (None when none is known)."""
+        values = [
+            self.runtime.source_last[entity_id]
+            for entity_id in entity_ids
+            if entity_id in self.runtime.source_last
+        ]
+        return sum(values) if values else None
+
+    @property
+    def power_entity_ids(self) -> list:
+        return [
+            entity_id
+            for entity_id in (self.import_power_entity_id, self.export_power_entity_id)
+            if entity_id
+        ]
+
+    def expect_restores(self, count: int) -> None:
+        """Delay the first computation until ``count`` entities restored their state.
+
+        Only used when no accumulator snapshot was stored yet (first start after
+        an upgrade); the legacy restore_state values then seed the accumulators.
+        """
+        self._expected_restores = count
+
+    @callback
+    def async_entity_restored(self) -> None:
+        self._restored += 1
+        if self._restored == self._expected_restores:
+            self.config_entry.async_create_task(self.hass, self.async_refresh())
+
+    async def _async_update_data(self) -> BatterySnapshot:
+        """Recompute from the current state of every source sensor."""
+        values = {}
+        for entity_id in self.source_entity_ids:
+            value = _as_float(self.hass.states.get(entity_id))
+            if value is not None:
+                values[entity_id] = value
+        metrics = self.runtime.metrics
+        wait_start = time.perf_counter()
+        async with self.runtime.calc_lock:
+            metrics.lock_wait_ms.observe((time.perf_counter() - wait_start) * 1000)
+            self._roll_bill_period(time.time())
+            snapshot = self._apply_source_values(values)
+        self._schedule_save()
+        return snapshot
+
+    @callback
+    def async_source_update(self, event) -> None:
+        """Handle a state change event of one of the source sensors."""
+        metrics = self.runtime.metrics
+        metrics.source_events += 1
+        new_value = _as_float(event.data.get("new_state"))
+        if new_value is None:
+            return
+        old_value = _as_float(event.data.get("old_state"))
+        if new_value == old_value:
+            return
+
+        entity_id = event.data["entity_id"]
+        if entity_id not in self._pending and old_value is not None:
+            self._pending_previous[entity_id] = old_value
+        self._pending[entity_id] = new_value
+
+        if self._pending_task is None:
+            self._pending_task = self.config_entry.async_create_task(
+                self.hass, self._async_process_pending()
+            )
+        else:
+            metrics.recomputes_coalesced += 1
+
+    @callback
+    def async_power_update(self, event) -> None:
+        """Integrate a power sample and refresh the capacity estimate."""
+        runtime = self.runtime
+        if event.data["entity_id"] == self.import_power_entity_id:
+            integrator = runtime.import_power
+        else:
+            integrator = runtime.export_power
+        new_state = event.data.get("new_state")
+        power = _power_w(new_state)
+        if power is None:
+            # Unavailable: the outage is not integrated.
+            integrator.mark_unavailable()
+            return
+        integrator.add_sample(new_state.last_updated_timestamp, power)
+        self._async_push_capacity()
+
+    @callback
+    def async_seed_power(self) -> None:
+        """Start integrating the current value of the power sensors."""
+        now_ts = time.time()
+        runtime = self.runtime
+        for entity_id, integrator in (
+            (self.import_power_entity_id, runtime.import_power),
+            (self.export_power_entity_id, runtime.export_power),
+        ):
+            if integrator is not None:
+                power = _power_w(self.hass.states.get(entity_id))
+                if power is not None:
+                    integrator.add_sample(now_ts, power)
+
+    @callback
+    def async_advance_power(self, now) -> None:
+        """Integrate the last power of sensors holding a steady value."""
+        now_ts = time.time()
+        for integrator in (self.runtime.import_power, self.runtime.export_power):
+            if integrator is not None:
+                integrator.advance(now_ts)
+        self._async_push_capacity()
+
+    @callback
+    def _async_push_capacity(self) -> None:
+        if self.data is None:
+            return
+        runtime = self.runtime
+        capacity = runtime.estimated_capacity()
+        if abs(capacity - self.data.capacity) >= POWER_PUSH_THRESHOLD_KWH:
+            # Only the capacity depends on power samples: skip the fan-out to every entity.
+            self.data = runtime.snapshot()
+            for update_callback in list(self._capacity_listeners):
+                update_callback()
+
+    async def _async_process_pending(self) -> None:
+        metrics = self.runtime.metrics
+        wait_start = time.perf_counter()
+        async with self.runtime.calc_lock:
+            metrics.lock_wait_ms.observe((time.perf_counter() - wait_start) * 1000)
+            self._pending_task = None
+            values, previous = self._pending, self._pending_previous
+            self._pending, self._pending_previous = {}, {}
+            snapshot = self._apply_source_values(values, previous)
+        self.async_set_updated_data(snapshot)
+        self._schedule_save()
+
+    @callback
+    def _schedule_save(self) -> None:
+        # Store flushes pending delayed saves on Home Assistant shutdown.
+        self.runtime.store.async_delay_save(self.runtime.as_dict, STORAGE_SAVE_DELAY_S)
+
+    def _apply_source_values(
+        self,
+        values: Dict[str, float],
+        previous: Optional[Dict[str, float]] = None,
+    ) -> BatterySnapshot:
+        """Apply new source indexes; sources missing from ``values`` are left untouched.
+
+        ``previous`` holds the values carried by the events' old states and is
+        only used as baseline for a source not seen yet. The deltas of all base
+        (resp. injection) sources are summed into one battery. Must be called
+        with ``calc_lock`` held.
+        """
+        runtime = self.runtime
+        metrics = runtime.metrics
+        started = time.perf_counter()
+        battery_in_total = runtime.battery_in or 0.0
+        battery_out_total = runtime.battery_out or 0.0
+        source_last = runtime.source_last
+
+        applied_inj = 0.0
+        applied_base = 0.0
+        applied_out = 0.0
+        base_seen = False
+        injection_seen = False
+
+        for entity_id, value in values.items():
+            is_base = entity_id in self._base_entity_set
+            last = source_last.get(entity_id)
+            if last is None and previous:
+                last = previous.get(entity_id)
+            if last is not None:
+                delta = value - last
+                if delta > 0:
+                    if is_base:
+                        applied_base += delta
+                    else:
+                        applied_inj += delta
+                elif delta < 0:
+                    metrics.negative_deltas_clamped += 1
+            source_last[entity_id] = value
+            if is_base:
+                base_seen = True
+            else:
+                injection_seen = True
+
+        if applied_inj > 0:
+            battery_in_total += applied_inj
+            if runtime.export_power is not None:
+                runtime.export_power.reanchor()
+
+        if applied_base > 0:
+            capacity_before = max(battery_in_total - battery_out_total, 0.0)
+            applied_out = min(applied_base, capacity_before)
+            battery_out_total += applied_out
+            if runtime.import_power is not None:
+                runtime.import_power.reanchor()
+
+        last_base = self._source_sum(self.base_entity_ids)
+        last_injection = self._source_sum(self.injection_entity_ids)
+        if injection_seen:
+            runtime.injection_emulated = last_injection
+
+        base_emulated_total = runtime.base_emulated or 0.0
+        if base_seen:
+            base_emulated_total = max(last_base - battery_out_total, 0.0)
+
+        runtime.battery_in = battery_in_total
+        runtime.battery_out = battery_out_total
+        runtime.capacity = max(battery_in_total - battery_out_total, 0.0)
+        runtime.base_emulated = base_emulated_total
+        runtime.last_injection = last_injection
+        runtime.last_base = last_base
+        now_ts = time.time()
+        if applied_base or applied_inj:
+            offpeak = False
+            if self.offpeak_schedule is not None:
+                offpeak = self.offpeak_schedule.is_offpeak(now_ts)
+                self._add_split(offpeak, applied_base - applied_out, applied_out)
+            self._add_costs(now_ts, offpeak, applied_base - applied_out, applied_out, applied_inj)
+        if (applied_base or applied_inj) and runtime.journal is not None:
+            runtime.journal.append(now_ts, applied_base, applied_inj, last_base, last_injection)
+        runtime.rolling.add(now_ts, applied_base, applied_out, applied_inj)
+        if runtime.forecast.add(now_ts, applied_base, applied_inj):
+            runtime.forecast.project(runtime.capacity, dt_util.utcnow())
+        snapshot = runtime.snapshot()
+        metrics.recomputes += 1
+        metrics.recompute_ms.observe((time.perf_counter() - started) * 1000)
+        return snapshot
+
+    def _add_split(self, offpeak: bool, delta_emulated: float, delta_out: float) -> None:
+        runtime = self.runtime
+        if runtime.base_emulated_hp is None:
+            runtime.base_emulated_hp = runtime.base_emulated_hc = 0.0
+            runtime.battery_out_hp = runtime.battery_out_hc = 0.0
+        if offpeak:
+            runtime.base_emulated_hc += delta_emulated
+            runtime.battery_out_hc += delta_out
+        else:
+            runtime.base_emulated_hp += delta_emulated
+            runtime.battery_out_hp += delta_out
+
+    def _add_costs(
+        self, now_ts: float, offpeak: bool, delta_emulated: float, delta_out: float, delta_inj: float
+    ) -> None:
+        """Price the deltas with the tariff in force this hour (skipped until a tariff is known)."""
+        runtime = self.runtime
+        if self._live_prices is None or runtime.tariff_data is None or not runtime.tariff_data.timeline:
+            return
+        totals = CostTotals(
+            runtime.cost_energy or 0.0, runtime.cost_acheminement or 0.0, runtime.injection_credit or 0.0
+        )
+        totals.add(
+            self._live_prices.at(runtime.tariff_data.timeline, now_ts, offpeak), delta_emulated, delta_out, delta_inj
+        )
+        self._roll_bill_period(now_ts)
+        runtime.bill_energy = (runtime.bill_energy or 0.0) + totals.cost_energy - (runtime.cost_energy or 0.0)
+        runtime.bill_acheminement = (
+            (runtime.bill_acheminement or 0.0) + totals.cost_acheminement - (runtime.cost_acheminement or 0.0)
+        )
+        runtime.cost_energy = totals.cost_energy
+        runtime.cost_acheminement = totals.cost_acheminement
+        runtime.injection_credit = totals.injection_credit
+
+    def _roll_bill_period(self, now_ts: float) -> bool:
+        """Start a new billing period when ``now_ts`` left the current one; return True when it did."""
+        runtime = self.runtime
+        if self._live_prices is None:
+            return False
+        start = bill_period_start(now_ts)
+        if runtime.bill_period_start == start:
+            return False
+        runtime.bill_period_start = start
+        runtime.bill_energy = 0.0
+        runtime.bill_acheminement = 0.0
+        return True
+
+    async def async_flush_journal(self) -> None:
+        """Write the buffered journal records to disk."""
+        journal = self.runtime.journal
+        async with self._journal_lock:
+            data = journal.take_pending()
+            if data:
+                await self.hass.async_add_executor_job(journal.write, data)
+
+    async def async_compact_journal(self) -> None:
+        """Merge old journal records into hourly ones."""
+        journal = self.runtime.journal
+        async with self._journal_lock:
+            await self.hass.async_add_executor_job(journal.write, journal.take_pending())
+            removed = await self.hass.async_add_executor_job(
+                journal.compact, time.time() - JOURNAL_COMPACT_AFTER_S
+            )
+        if removed:
+            _LOGGER.debug("UrbanSolar journal compacted: %s records merged", removed)
+
+    async def async_apply_rebuild(self, result) -> None:
+        """Replace the live accumulators with the totals of a history rebuild."""
+        runtime = self.runtime
+        async with runtime.calc_lock:
+            runtime.battery_in = result.battery_in
+            runtime.battery_out = result.battery_out
+            runtime.capacity = result.capacity
+            runtime.base_emulated = result.base_emulated
+            runtime.last_base = result.last_base_state
+            runtime.last_injection = result.last_injection_state
+            runtime.source_last = dict(result.last_source_states)
+            if result.last_injection_state is not None:
+                runtime.injection_emulated = result.last_injection_state
+            if result.split is not None:
+                (
+                    runtime.base_emulated_hp,
+                    runtime.base_emulated_hc,
+                    runtime.battery_out_hp,
+                    runtime.battery_out_hc,
+                ) = result.split
+            if result.costs is not None:
+                runtime.cost_energy = result.costs.cost_energy
+                runtime.cost_acheminement = result.costs.cost_acheminement
+                runtime.injection_credit = result.costs.injection_credit
+            if result.bill is not None:
+                runtime.bill_period_start, runtime.bill_energy, runtime.bill_acheminement = result.bill
+            snapshot = runtime.snapshot()
+        self.async_set_updated_data(snapshot)
+        await runtime.store.async_save(runtime.as_dict())
+
+    async def async_seed_forecast(self) -> None:
+        """Seed the depletion forecast from the hourly statistics of the sources."""
+        from .history import async_fetch_source_hourly_deltas
+
+        try:
+            rows = await async_fetch_source_hourly_deltas(
+                self.hass, self.config_entry, time.time() - SEED_DAYS * 86400
+            )
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.debug("UrbanSolar forecast seed query failed: %s", err)
+            return
+        runtime = self.runtime
+        async with runtime.calc_lock:
+            if rows:
+                runtime.forecast.seed(rows)
+            runtime.forecast.project(runtime.capacity or 0.0, dt_util.utcnow())
+            snapshot = runtime.snapshot()
+        self.async_set_updated_data(snapshot)
+
+    async def async_hourly_tick(self, now) -> None:
+        """Close the hour in the forecast and rolling windows even when the sources did not move."""
+        runtime = self.runtime
+        # Waits for a recompute in progress rather than skipping the hour.
+        async with runtime.calc_lock:
+            now_ts = time.time()
+            if self._roll_bill_period(now_ts):
+                self._schedule_save()
+            runtime.rolling.add(now_ts, 0.0, 0.0, 0.0)
+            if runtime.forecast.add(now_ts, 0.0, 0.0):
+                runtime.forecast.project(runtime.capacity or 0.0, now)
+            snapshot = runtime.snapshot()
+        self.async_set_updated_data(snapshot)
+
+    async def async_run_reconcile(self) -> None:
+        """Compare the live totals with the latest hourly statistics and fix drift."""
+        from .history import async_fetch_reconcile_sample
+
+        rebuild_lock = self.hass.data.get(DOMAIN, {}).get("rebuild_lock")
+        if rebuild_lock is not None and rebuild_lock.locked():
+            return
+        try:
+            sample = await async_fetch_reconcile_sample(self.hass, self.config_entry)
+        except Exception as err:  # pylint: disable=broad-except
+            _LOGGER.debug("UrbanSolar reconciliation query failed: %s", err)
+            return
+        if sample is None:
+            return
+
+        runtime = self.runtime
+        async with runtime.calc_lock:
+            if runtime.battery_in is None or runtime.last_base is None or runtime.last_injection is None:
+                return
+            went_back = sorted(
+                entity_id
+                for entity_id, state in sample.source_states.items()
+                if runtime.source_last.get(entity_id, state) < state - RECONCILE_DRIFT_THRESHOLD_KWH
+            )
+            if (
+                went_back
+                or runtime.last_injection < sample.injection_state - RECONCILE_DRIFT_THRESHOLD_KWH
+                or runtime.last_base < sample.base_state - RECONCILE_DRIFT_THRESHOLD_KWH
+            ):
+                # Meter replaced or index reset: the statistics cannot tell the flows since then.
+                _LOGGER.warning(
+                    "UrbanSolar reconciliation skipped: source index went backwards since %s (%s); "
+                    "totals kept (in %.3f, out %.3f)",
+                    dt_util.utc_from_timestamp(sample.start_ts).isoformat(),
+                    ", ".join(went_back) or "summed indexes",
+                    runtime.battery_in,
+                    runtime.battery_out or 0.0,
+                )
+                return
+            battery_in = runtime.battery_in
+            battery_out = runtime.battery_out or 0.0
+
+            # Battery In is fully determined by the injection index since the sampled hour.
+            expected_in = sample.battery_in + max(runtime.last_injection - sample.injection_state, 0.0)
+            # Battery Out can only have grown by at most the base delta since then.
+            out_low = sample.battery_out
+            out_high = sample.battery_out + max(runtime.last_base - sample.base_state, 0.0)
+
+            if abs(battery_in - expected_in) > RECONCILE_DRIFT_THRESHOLD_KWH:
+                battery_in = expected_in
+            if battery_out < out_low - RECONCILE_DRIFT_THRESHOLD_KWH:
+                battery_out = out_low
+            elif battery_out > out_high + RECONCILE_DRIFT_THRESHOLD_KWH:
+                battery_out = out_high
+            if battery_in == runtime.battery_in and battery_out == runtime.battery_out:
+                return
+
+            _LOGGER.warning(
+                "UrbanSolar live totals drifted from statistics (in %.3f -> %.3f, out %.3f -> %.3f); corrected",
+                runtime.battery_in,
+                battery_in,
+                runtime.battery_out or 0.0,
+                battery_out,
+            )
+            runtime.battery_in = battery_in
+            runtime.battery_out = battery_out
+            runtime.capacity = max(battery_in - battery_out, 0.0)
+            runtime.base_emulated = max(runtime.last_base - battery_out, 0.0)
+            runtime.metrics.reconcile_corrections += 1
+            snapshot = runtime.snapshot()
+        self.async_set_updated_data(snapshot)
+        self._schedule_save()
+
+
+class UrbanSolarTariffCoordinator(DataUpdateCoordinator[Dict[str, float]]):
+    """Refresh the tariff once and share it with every tariff sensor of the entry."""
+
+    def __init__(self, hass: HomeAssistant, config_entry, tariff_data) -> None:
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=config_entry,
+            name=f"{DOMAIN} tariffs",
+            update_interval=None,
+        )
+        self.tariff_data = tariff_data
+        self._force_next = False
+
+    async def async_force_refresh(self) -> None:
+        self._force_next = True
+        await self.async_refresh()
+
+    async def _async_update_data(self) -> Dict[str, float]:
+        force, self._force_next = self._force_next, False
+        await self.tariff_data.async_update(force=force)
+        return self.tariff_data.values
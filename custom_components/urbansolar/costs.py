@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+from typing import List, Optional, Sequence, Tuple
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    SENSOR_TARIFF_ACH_HC_TTC,
+    SENSOR_TARIFF_ACH_HP_TTC,
+    SENSOR_TARIFF_ACH_TTC,
+    SENSOR_TARIFF_ENERGY_HC_TTC,
+    SENSOR_TARIFF_ENERGY_HP_TTC,
+    SENSOR_TARIFF_ENERGY_TTC,
+    TARIFF_OPTION_BASE,
+    TARIFF_OPTION_HPHC,
+)
+from .timeline import TariffTimeline
+
+# ((energy HP, energy HC), (acheminement HP, acheminement HC)) price keys per tariff option.
+PRICE_KEYS = {
+    TARIFF_OPTION_BASE: (
+        (SENSOR_TARIFF_ENERGY_TTC, SENSOR_TARIFF_ENERGY_TTC),
+        (SENSOR_TARIFF_ACH_TTC, SENSOR_TARIFF_ACH_TTC),
+    ),
+    TARIFF_OPTION_HPHC: (
+        (SENSOR_TARIFF_ENERGY_HP_TTC, SENSOR_TARIFF_ENERGY_HC_TTC),
+        (SENSOR_TARIFF_ACH_HP_TTC, SENSOR_TARIFF_ACH_HC_TTC),
+    ),
+}
+
+
+class HourlyPrices:
+    """(energy, acheminement) price of every hour of a range, resolved once from a timeline.
+
+    With HP/HC, ``offpeak`` holds the off-peak share of each hour of the range
+    and the HP and HC prices are weighted by it.
+    """
+
+    __slots__ = ("first_hour", "energy", "acheminement")
+
+    def __init__(
+        self,
+        timeline: TariffTimeline,
+        option: str,
+        first_ts: float,
+        last_ts: float,
+        offpeak: Optional[Sequence[float]] = None,
+    ) -> None:
+        energy_keys, acheminement_keys = PRICE_KEYS[option]
+        self.first_hour = int(first_ts // 3600)
+        hours = [hour * 3600.0 for hour in range(self.first_hour, int(last_ts // 3600) + 1)]
+        self.energy = _hourly_prices(timeline, hours, energy_keys, offpeak)
+        self.acheminement = _hourly_prices(timeline, hours, acheminement_keys, offpeak)
+
+    def at(self, ts: float) -> Tuple[Optional[float], Optional[float]]:
+        index = int(ts // 3600) - self.first_hour
+        if 0 <= index < len(self.energy):
+            return self.energy[index], self.acheminement[index]
+        return None, None
+
+
+class CostTotals:
+    """EUR totals: energy on base emulated, acheminement on battery out, injection credit value."""
+
+    __slots__ = ("cost_energy", "cost_acheminement", "injection_credit")
+
+    def __init__(self, cost_energy: float = 0.0, cost_acheminement: float = 0.0, injection_credit: float = 0.0) -> None:
+        self.cost_energy = cost_energy
+        self.cost_acheminement = cost_acheminement
+        self.injection_credit = injection_credit
+
+    def add(
+        self,
+        prices: Tuple[Optional[float], Optional[float]],
+        delta_emulated: float,
+        delta_out: float,
+        delta_inj: float,
+    ) -> None:
+        energy, acheminement = prices
+        if energy is not None:
+            self.cost_energy += delta_emulated * energy
+            self.injection_credit += delta_inj * energy
+        if acheminement is not None:
+            self.cost_acheminement += delta_out * acheminement
+
+
+class LivePrices:
+    """Prices of the current hour for the live path, re-resolved when the hour or the timeline changes."""
+
+    __slots__ = ("option", "_key", "_prices")
+
+    def __init__(self, option: str) -> None:
+        self.option = option
+        self._key: Optional[Tuple[int, int]] = None
+        # (HP prices, HC prices), each (energy, acheminement).
+        self._prices: Tuple[Tuple[Optional[float], Optional[float]], ...] = ((None, None), (None, None))
+
+    def at(self, timeline: TariffTimeline, ts: float, offpeak: bool = False) -> Tuple[Optional[float], Optional[float]]:
+        key = (int(ts // 3600), timeline.revision)
+        if key != self._key:
+            self._key = key
+            version = timeline.at(ts) or {}
+            energy_keys, acheminement_keys = PRICE_KEYS[self.option]
+            self._prices = tuple(
+                (version.get(energy_keys[period]), version.get(acheminement_keys[period])) for period in (0, 1)
+            )
+        return self._prices[1 if offpeak else 0]
+
+
+def bill_period_start(ts: float) -> float:
+    """Start of the billing period (calendar month, local time) containing ``ts``."""
+    local = dt_util.as_local(dt_util.utc_from_timestamp(ts))
+    return dt_util.start_of_local_day(local.date().replace(day=1)).timestamp()
+
+
+def _hourly_prices(
+    timeline: TariffTimeline,
+    hours: Sequence[float],
+    keys: Tuple[str, str],
+    offpeak: Optional[Sequence[float]],
+) -> List[Optional[float]]:
+    peak = timeline.prices(hours, keys[0])
+    if keys[1] == keys[0] or offpeak is None:
+        return peak
+    off = timeline.prices(hours, keys[1])
+    return [_weighted(hp, hc, share) for hp, hc, share in zip(peak, off, offpeak)]
+
+
+def _weighted(peak: Optional[float], off: Optional[float], share: float) -> Optional[float]:
+    if share == 0.0:
+        return peak
+    if share == 1.0:
+        return off
+    if peak is None or off is None:
+        return None
+    return peak + share * (off - peak)
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from homeassistant.core import HomeAssistant
+
+from .runtime import UrbanSolarRuntimeData
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry) -> Dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    runtime: UrbanSolarRuntimeData = entry.runtime_data
+    return {
+        "entry": {
+            "data": dict(entry.data),
+            "options": dict(entry.options),
+        },
+        "accumulators": runtime.as_dict(),
+        "estimated_capacity": runtime.estimated_capacity(),
+        "live_metrics": runtime.metrics.as_dict(),
+    }
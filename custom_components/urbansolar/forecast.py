@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from homeassistant.util import dt as dt_util
+
+# Weight of a new hourly observation in the moving averages (one update per slot and day).
+EWMA_ALPHA = 0.1
+# Depletion is only searched within this horizon.
+FORECAST_HORIZON_HOURS = 366 * 24
+# Hours without any source movement are folded as zero, up to this many.
+MAX_IDLE_HOURS_FOLDED = 48
+# Days of source statistics used to seed the averages at startup.
+SEED_DAYS = 365
+
+
+def _season(month: int) -> int:
+    """0 = winter (DJF), 1 = spring, 2 = summer, 3 = autumn."""
+    return (month % 12) // 3
+
+
+def local_slot(hour_key: int) -> Tuple[int, int]:
+    """Return (season * 24 + hour, hour) of the local hour starting at ``hour_key * 3600``."""
+    local = dt_util.as_local(dt_util.utc_from_timestamp(hour_key * 3600))
+    return _season(local.month) * 24 + local.hour, local.hour
+
+
+class DepletionForecast:
+    """Hourly injection/consumption EWMAs per season and hour of day.
+
+    ``add`` is O(1); the projection only runs when an hour is closed.
+    """
+
+    __slots__ = (
+        "inj_avg",
+        "base_avg",
+        "inj_hour_avg",
+        "base_hour_avg",
+        "seen",
+        "_hour_key",
+        "_hour_inj",
+        "_hour_base",
+        "depletion_time",
+        "month_end_capacity",
+    )
+
+    def __init__(self) -> None:
+        self.inj_avg: List[float] = [0.0] * 96
+        self.base_avg: List[float] = [0.0] * 96
+        # Hour-of-day fallback for seasons without any observation yet.
+        self.inj_hour_avg: List[float] = [0.0] * 24
+        self.base_hour_avg: List[float] = [0.0] * 24
+        self.seen: List[bool] = [False] * 96
+        self._hour_key: Optional[int] = None
+        self._hour_inj = 0.0
+        self._hour_base = 0.0
+        self.depletion_time: Optional[datetime] = None
+        self.month_end_capacity: Optional[float] = None
+
+    def add(self, ts: float, delta_base: float, delta_inj: float) -> bool:
+        """Accumulate deltas in the current hour; return True when an hour was closed."""
+        hour_key = int(ts // 3600)
+        closed = False
+        if self._hour_key is None:
+            self._hour_key = hour_key
+        elif hour_key != self._hour_key:
+            self._fold(self._hour_key, self._hour_base, self._hour_inj)
+            idle = min(hour_key - self._hour_key - 1, MAX_IDLE_HOURS_FOLDED)
+            for offset in range(idle):
+                self._fold(hour_key - idle + offset, 0.0, 0.0)
+            self._hour_key = hour_key
+            self._hour_base = 0.0
+            self._hour_inj = 0.0
+            closed = True
+        self._hour_base += delta_base
+        self._hour_inj += delta_inj
+        return closed
+
+    def seed(self, rows: Iterable[Tuple[float, float, float]]) -> None:
+        """Fold historical hourly (start_ts, delta_base, delta_inj) rows."""
+        for start_ts, delta_base, delta_inj in rows:
+            self._fold(int(start_ts // 3600), delta_base, delta_inj)
+
+    def _fold(self, hour_key: int, delta_base: float, delta_inj: float) -> None:
+        slot, hour = local_slot(hour_key)
+        if self.seen[slot]:
+            self.inj_avg[slot] += EWMA_ALPHA * (delta_inj - self.inj_avg[slot])
+            self.base_avg[slot] += EWMA_ALPHA * (delta_base - self.base_avg[slot])
+        else:
+            self.inj_avg[slot] = delta_inj
+            self.base_avg[slot] = delta_base
+            self.seen[slot] = True
+        self.inj_hour_avg[hour] += EWMA_ALPHA * (delta_inj - self.inj_hour_avg[hour])
+        self.base_hour_avg[hour] += EWMA_ALPHA * (delta_base - self.base_hour_avg[hour])
+
+    def project(self, capacity: float, now: datetime) -> None:
+        """Simulate the battery from ``now`` with the averaged deltas.
+
+        Local days whose lowest capacity stays above zero are applied in one
+        step; the other days, the first partial day and the DST change days
+        are simulated hour by hour. Steps are real (UTC) hours.
+        """
+        start = dt_util.as_local(now).replace(minute=0, second=0, microsecond=0)
+        start_utc = dt_util.as_utc(start)
+        month_end = (start.replace(day=1, hour=0) + timedelta(days=32)).replace(day=1)
+        hours_to_month_end = int((dt_util.as_utc(month_end) - start_utc).total_seconds() // 3600)
+
+        net = [
+            self.inj_avg[slot] - self.base_avg[slot]
+            if self.seen[slot]
+            else self.inj_hour_avg[slot % 24] - self.base_hour_avg[slot % 24]
+            for slot in range(96)
+        ]
+        # Per season: net change over a whole day and lowest change before its last hour.
+        day_net = []
+        day_low = []
+        for season in range(4):
+            total = 0.0
+            low = float("inf")
+            for hour in range(24):
+                total += net[season * 24 + hour]
+                if hour < 23:
+                    low = min(low, total)
+            day_net.append(total)
+            day_low.append(low)
+
+        depletion_step: Optional[int] = None
+        self.month_end_capacity = None
+        step = 0
+        for season, hours in _local_days(start):
+            if step >= FORECAST_HORIZON_HOURS:
+                break
+            if step == hours_to_month_end:
+                self.month_end_capacity = capacity
+            if depletion_step is None and capacity <= 0:
+                depletion_step = step
+            if depletion_step is not None and self.month_end_capacity is not None:
+                break
+            if (
+                depletion_step is None
+                and len(hours) == 24
+                and hours[0] == 0
+                and step + 24 <= FORECAST_HORIZON_HOURS
+                and not step < hours_to_month_end < step + 24
+                and capacity + day_low[season] > 0
+            ):
+                capacity = max(capacity + day_net[season], 0.0)
+                step += 24
+                continue
+            for hour in hours:
+                if step >= FORECAST_HORIZON_HOURS:
+                    break
+                if step == hours_to_month_end:
+                    self.month_end_capacity = capacity
+                if depletion_step is None and capacity <= 0:
+                    depletion_step = step
+                if depletion_step is not None and self.month_end_capacity is not None:
+                    break
+                capacity = max(capacity + net[season * 24 + hour], 0.0)
+                step += 1
+
+        self.depletion_time = None
+        if depletion_step is not None:
+            self.depletion_time = dt_util.as_local(start_utc + timedelta(hours=depletion_step))
+
+
+def _local_days(start: datetime) -> Iterator[Tuple[int, Sequence[int]]]:
+    """(season, local hours) of each local day from ``start``, the first one partial."""
+    day_start = start
+    full_day = range(24)
+    while True:
+        next_day = day_start.replace(hour=0) + timedelta(days=1)
+        if next_day.utcoffset() == day_start.utcoffset():
+            hours: Sequence[int] = range(day_start.hour, 24) if day_start.hour else full_day
+        else:
+            # DST change: 23 or 25 hours.
+            first_utc = dt_util.as_utc(day_start)
+            count = int((dt_util.as_utc(next_day) - first_utc).total_seconds() // 3600)
+            hours = [dt_util.as_local(first_utc + timedelta(hours=offset)).hour for offset in range(count)]
+        yield _season(day_start.month), hours
+        day_start = next_day
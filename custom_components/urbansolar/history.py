@@ -1,12 +1,15 @@
 from __future__ import annotations
 
 import asyncio
+import heapq
+import itertools
 import logging
 import os
 import sqlite3
 import time
-from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from dataclasses import dataclass, field
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from homeassistant.core import HomeAssistant
 from homeassistant.helpers import entity_registry as er
@@ -20,13 +23,32 @@ from .const import (
     CONF_INDEX_INJECTION_SENSOR,
     CONF_INDEX_INJECTION_EMULATED,
     CONF_START_BATTERY_ENERGY,
+    CONF_TARIFF_OPTION,
+    SENSOR_BASE_EMULATED_HC,
+    SENSOR_BASE_EMULATED_HP,
+    SENSOR_BATTERY_OUT_HC,
+    SENSOR_BATTERY_OUT_HP,
+    SENSOR_COST_ACHEMINEMENT,
+    SENSOR_COST_ENERGY,
+    SENSOR_INJECTION_CREDIT_VALUE,
+    TARIFF_OPTION_HPHC,
+    UNIT_EUR,
 )
+from .costs import PRICE_KEYS, CostTotals, HourlyPrices, bill_period_start
+from .runtime import source_entity_list
+from .timeline import TariffTimeline
+from .timeofuse import OffPeakSchedule
 
 _LOGGER = logging.getLogger(__name__)
 # Slower batch settings to reduce MariaDB lock pressure on slow instances.
 REBUILD_BATCH_SIZE = 300
 REBUILD_BATCH_SLEEP_S = 0.1
 
+# Unique ids of the EUR statistics, in CostTotals field order.
+COST_SENSOR_IDS = (SENSOR_COST_ENERGY, SENSOR_COST_ACHEMINEMENT, SENSOR_INJECTION_CREDIT_VALUE)
+# Unique ids of the HP/HC split statistics, in RebuildResult.split order.
+SPLIT_SENSOR_IDS = (SENSOR_BASE_EMULATED_HP, SENSOR_BASE_EMULATED_HC, SENSOR_BATTERY_OUT_HP, SENSOR_BATTERY_OUT_HC)
+
 
 @dataclass
 class RebuildResult:
@@ -37,19 +59,60 @@ class RebuildResult:
     last_base_state: Optional[float]
     last_injection_state: Optional[float]
     rows: int
+    # Last index of each source sensor (last_*_state are their sums).
+    last_source_states: Dict[str, float] = field(default_factory=dict)
+    # EUR totals, when cost statistics were rebuilt too.
+    costs: Optional[CostTotals] = None
+    # (base emulated HP, base emulated HC, battery out HP, battery out HC) with HP/HC.
+    split: Optional[Tuple[float, float, float, float]] = None
+    # (billing period start, energy cost, acheminement cost) since that start, with costs.
+    bill: Optional[Tuple[float, float, float]] = None
+
+
+@dataclass
+class RebuildExtras:
+    """Optional statistics rebuilt in the same pass as the energy ones.
+
+    Their per-hour arrays (off-peak share, prices) are built once the time
+    range of the source history is known.
+    """
+
+    split_entity_ids: Optional[Tuple[str, ...]] = None
+    schedule: Optional[OffPeakSchedule] = None
+    cost_entity_ids: Optional[Tuple[str, ...]] = None
+    timeline: Optional[TariffTimeline] = None
+    tariff_option: Optional[str] = None
+    bill_period_start: Optional[float] = None
+
+    @property
+    def entity_ids(self) -> Tuple[Tuple[str, str, Optional[str]], ...]:
+        """(statistic id, unit, unit class) of the extra statistics, in derived row order."""
+        split = tuple((entity_id, "kWh", "energy") for entity_id in self.split_entity_ids or ())
+        costs = tuple((entity_id, UNIT_EUR, None) for entity_id in self.cost_entity_ids or ())
+        return split + costs
+
+    def hourly(self, first_ts: float, last_ts: float) -> Tuple[Optional[List[float]], Optional[HourlyPrices]]:
+        """(off-peak share per hour, prices per hour) from the hour of ``first_ts``."""
+        offpeak = None
+        if self.schedule is not None:
+            _, offpeak = self.schedule.hourly_fractions(first_ts, last_ts)
+        prices = None
+        if self.cost_entity_ids:
+            prices = HourlyPrices(self.timeline, self.tariff_option, first_ts, last_ts, offpeak)
+        if not self.split_entity_ids:
+            offpeak = None
+        return offpeak, prices
 
 
 async def async_rebuild_history(hass: HomeAssistant, config_entry) -> Optional[RebuildResult]:
     """Rebuild derived statistics from recorder history (SQLite/MariaDB)."""
-    base_entity_id = config_entry.data.get(CONF_INDEX_BASE_SENSOR)
-    injection_entity_id = config_entry.data.get(CONF_INDEX_INJECTION_SENSOR)
-    if not base_entity_id or not injection_entity_id:
+    base_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_BASE_SENSOR))
+    injection_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_INJECTION_SENSOR))
+    if not base_entity_ids or not injection_entity_ids:
         _LOGGER.error("Missing base or injection entity id; history rebuild skipped")
         return None
 
-    ent_reg = er.async_get(hass)
-    entries = er.async_entries_for_config_entry(ent_reg, config_entry.entry_id)
-    entity_ids: Dict[str, str] = {e.unique_id: e.entity_id for e in entries if e.unique_id}
+    entity_ids = _derived_entity_ids(hass, config_entry)
 
     battery_in_entity_id = entity_ids.get(CONF_INDEX_BATTERY_IN)
     battery_out_entity_id = entity_ids.get(CONF_INDEX_BATTERY_OUT)
@@ -72,6 +135,8 @@ async def async_rebuild_history(hass: HomeAssistant, config_entry) -> Optional[R
         _LOGGER.error("Missing derived entities in registry (%s); history rebuild skipped", ", ".join(missing))
         return None
 
+    extras = _rebuild_extras(config_entry, entity_ids)
+
     start_capacity = float(config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0) or 0.0)
     _LOGGER.info("Rebuilding UrbanSolar history (this can take a while)...")
 
@@ -92,27 +157,29 @@ async def async_rebuild_history(hass: HomeAssistant, config_entry) -> Optional[R
         result: Optional[RebuildResult] = await hass.async_add_executor_job(
             _rebuild_sqlite,
             db_path,
-            base_entity_id,
-            injection_entity_id,
+            base_entity_ids,
+            injection_entity_ids,
             battery_in_entity_id,
             battery_out_entity_id,
             capacity_entity_id,
             base_emulated_entity_id,
             injection_emulated_entity_id,
             start_capacity,
+            extras,
         )
     elif dialect_name in ("mysql", "mariadb"):
         result = await hass.async_add_executor_job(
             _rebuild_sqlalchemy,
             engine,
-            base_entity_id,
-            injection_entity_id,
+            base_entity_ids,
+            injection_entity_ids,
             battery_in_entity_id,
             battery_out_entity_id,
             capacity_entity_id,
             base_emulated_entity_id,
             injection_emulated_entity_id,
             start_capacity,
+            extras,
         )
     else:
         _LOGGER.error("Unsupported recorder backend '%s'; history rebuild skipped", dialect_name)
@@ -123,24 +190,487 @@ async def async_rebuild_history(hass: HomeAssistant, config_entry) -> Optional[R
     return result
 
 
+def _rebuild_extras(config_entry, entity_ids: Dict[str, str]) -> Optional[RebuildExtras]:
+    """HP/HC split and cost statistics to rebuild with the energy ones, if any."""
+    from .coordinator import offpeak_schedule
+
+    extras = RebuildExtras()
+    tariff_option = config_entry.data.get(CONF_TARIFF_OPTION)
+    if tariff_option == TARIFF_OPTION_HPHC:
+        split_entity_ids = tuple(entity_ids.get(unique_id) for unique_id in SPLIT_SENSOR_IDS)
+        if all(split_entity_ids):
+            extras.split_entity_ids = split_entity_ids
+        # Costs need the schedule even when the split statistics are missing.
+        extras.schedule = offpeak_schedule(config_entry)
+
+    if tariff_option in PRICE_KEYS:
+        runtime = getattr(config_entry, "runtime_data", None)
+        tariff_data = getattr(runtime, "tariff_data", None)
+        cost_entity_ids = tuple(entity_ids.get(unique_id) for unique_id in COST_SENSOR_IDS)
+        if tariff_data is None or not tariff_data.timeline:
+            _LOGGER.info("No tariff known yet; cost statistics are not rebuilt")
+        elif all(cost_entity_ids):
+            extras.cost_entity_ids = cost_entity_ids
+            # The executor job reads a copy: a tariff refresh may update the timeline meanwhile.
+            extras.timeline = tariff_data.timeline.copy()
+            extras.tariff_option = tariff_option
+            extras.bill_period_start = bill_period_start(time.time())
+
+    if not extras.entity_ids:
+        return None
+    return extras
+
+
+@dataclass
+class ReconcileSample:
+    start_ts: float
+    battery_in: float
+    battery_out: float
+    base_state: float
+    injection_state: float
+    # Index of each source sensor at that hour.
+    source_states: Dict[str, float] = field(default_factory=dict)
+
+
+async def async_fetch_reconcile_sample(hass: HomeAssistant, config_entry) -> Optional[ReconcileSample]:
+    """Return the latest hourly derived row with the source indexes of the same hour."""
+    base_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_BASE_SENSOR))
+    injection_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_INJECTION_SENSOR))
+    entity_ids = _derived_entity_ids(hass, config_entry)
+    battery_in_entity_id = entity_ids.get(CONF_INDEX_BATTERY_IN)
+    battery_out_entity_id = entity_ids.get(CONF_INDEX_BATTERY_OUT)
+    if not all((base_entity_ids, injection_entity_ids, battery_in_entity_id, battery_out_entity_id)):
+        return None
+    return await _async_run_query(
+        hass,
+        _query_reconcile_sample,
+        battery_in_entity_id,
+        battery_out_entity_id,
+        base_entity_ids,
+        injection_entity_ids,
+    )
+
+
+def _query_reconcile_sample(
+    execute: Callable[[str, Dict[str, Any]], Any],
+    battery_in_entity_id: str,
+    battery_out_entity_id: str,
+    base_entity_ids: Sequence[str],
+    injection_entity_ids: Sequence[str],
+) -> Optional[ReconcileSample]:
+    meta_ids = []
+    for statistic_id in (battery_in_entity_id, battery_out_entity_id, *base_entity_ids, *injection_entity_ids):
+        row = execute(
+            "SELECT id FROM statistics_meta WHERE statistic_id = :sid",
+            {"sid": statistic_id},
+        ).fetchone()
+        if not row:
+            return None
+        meta_ids.append(int(row[0]))
+
+    # Single-row lookups on the (metadata_id, start_ts) index.
+    latest = execute(
+        "SELECT start_ts, state FROM statistics WHERE metadata_id = :mid ORDER BY start_ts DESC LIMIT 1",
+        {"mid": meta_ids[0]},
+    ).fetchone()
+    if not latest or latest[1] is None:
+        return None
+    start_ts = latest[0]
+
+    states = [latest[1]]
+    for meta_id in meta_ids[1:]:
+        row = execute(
+            "SELECT state FROM statistics WHERE metadata_id = :mid AND start_ts = :ts",
+            {"mid": meta_id, "ts": start_ts},
+        ).fetchone()
+        if not row or row[0] is None:
+            return None
+        states.append(row[0])
+
+    base_end = 2 + len(base_entity_ids)
+    return ReconcileSample(
+        start_ts=start_ts,
+        battery_in=float(states[0]),
+        battery_out=float(states[1]),
+        base_state=sum(float(state) for state in states[2:base_end]),
+        injection_state=sum(float(state) for state in states[base_end:]),
+        source_states={
+            entity_id: float(state)
+            for entity_id, state in zip((*base_entity_ids, *injection_entity_ids), states[2:])
+        },
+    )
+
+
+async def async_fetch_states_at(
+    hass: HomeAssistant, config_entry, timestamps: Sequence[float]
+) -> Optional[List[Dict[str, Optional[float]]]]:
+    """Return the derived battery values in force at each timestamp.
+
+    Each value comes from the last hourly statistics row that ended at or before
+    the timestamp: one ``ORDER BY start_ts DESC LIMIT 1`` lookup on the
+    (metadata_id, start_ts) index per sensor and timestamp.
+    """
+    entity_ids = _derived_entity_ids(hass, config_entry)
+    statistic_ids = {
+        "battery_in": entity_ids.get(CONF_INDEX_BATTERY_IN),
+        "battery_out": entity_ids.get(CONF_INDEX_BATTERY_OUT),
+        "capacity": entity_ids.get(CONF_CAPACITY_BATTERY),
+        "base_emulated": entity_ids.get(CONF_INDEX_BASE_EMULATED),
+    }
+    if not all(statistic_ids.values()):
+        return None
+    return await _async_run_query(hass, _query_states_at, statistic_ids, list(timestamps))
+
+
+def _query_states_at(
+    execute: Callable[[str, Dict[str, Any]], Any],
+    statistic_ids: Dict[str, str],
+    timestamps: List[float],
+) -> List[Dict[str, Optional[float]]]:
+    meta_ids: Dict[str, Optional[int]] = {}
+    for key, statistic_id in statistic_ids.items():
+        row = execute(
+            "SELECT id FROM statistics_meta WHERE statistic_id = :sid",
+            {"sid": statistic_id},
+        ).fetchone()
+        meta_ids[key] = int(row[0]) if row else None
+
+    results: List[Dict[str, Optional[float]]] = []
+    for ts in timestamps:
+        # A row starting at start_ts holds the state at the end of its hour.
+        values: Dict[str, Optional[float]] = {"timestamp": ts, "statistics_start": None}
+        for key, meta_id in meta_ids.items():
+            row = None
+            if meta_id is not None:
+                row = execute(
+                    "SELECT start_ts, state FROM statistics "
+                    "WHERE metadata_id = :mid AND start_ts <= :ts ORDER BY start_ts DESC LIMIT 1",
+                    {"mid": meta_id, "ts": ts - 3600},
+                ).fetchone()
+            values[key] = float(row[1]) if row and row[1] is not None else None
+            if row and key == "battery_in":
+                values["statistics_start"] = row[0]
+        results.append(values)
+    return results
+
+
+async def async_fetch_source_hourly_deltas(
+    hass: HomeAssistant, config_entry, since_ts: float
+) -> Optional[List[Tuple[float, float, float]]]:
+    """Return hourly (start_ts, delta_base, delta_inj) of the source indexes since ``since_ts``."""
+    base_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_BASE_SENSOR))
+    injection_entity_ids = source_entity_list(config_entry.data.get(CONF_INDEX_INJECTION_SENSOR))
+    if not base_entity_ids or not injection_entity_ids:
+        return None
+    return await _async_run_query(
+        hass, _query_source_hourly_deltas, base_entity_ids, injection_entity_ids, since_ts
+    )
+
+
+def _query_source_hourly_deltas(
+    execute: Callable[[str, Dict[str, Any]], Any],
+    base_entity_ids: Sequence[str],
+    injection_entity_ids: Sequence[str],
+    since_ts: float,
+) -> List[Tuple[float, float, float]]:
+    deltas: Dict[float, List[float]] = {}
+    sources = [(0, entity_id) for entity_id in base_entity_ids]
+    sources += [(1, entity_id) for entity_id in injection_entity_ids]
+    for column, statistic_id in sources:
+        row = execute(
+            "SELECT id FROM statistics_meta WHERE statistic_id = :sid",
+            {"sid": statistic_id},
+        ).fetchone()
+        if not row:
+            continue
+        previous = None
+        for start_ts, state in execute(
+            "SELECT start_ts, state FROM statistics "
+            "WHERE metadata_id = :mid AND start_ts >= :since ORDER BY start_ts",
+            {"mid": int(row[0]), "since": since_ts},
+        ):
+            if state is None:
+                continue
+            state = float(state)
+            if previous is not None:
+                deltas.setdefault(start_ts, [0.0, 0.0])[column] += max(state - previous, 0.0)
+            previous = state
+    return [(start_ts, values[0], values[1]) for start_ts, values in sorted(deltas.items())]
+
+
+def _derived_entity_ids(hass: HomeAssistant, config_entry) -> Dict[str, str]:
+    """Map the sensor key of each entity of the entry (its unique id without the entry prefix) to its entity id."""
+    ent_reg = er.async_get(hass)
+    entries = er.async_entries_for_config_entry(ent_reg, config_entry.entry_id)
+    prefix = f"{config_entry.entry_id}_"
+    return {
+        e.unique_id[len(prefix):]: e.entity_id
+        for e in entries
+        if e.unique_id and e.unique_id.startswith(prefix)
+    }
+
+
+async def _async_run_query(hass: HomeAssistant, job: Callable[..., Any], *args: Any) -> Any:
+    """Run ``job(execute, *args)`` in the executor against the recorder database.
+
+    ``execute(sql, params)`` takes SQL with ``:named`` parameters on both backends.
+    """
+    engine = _get_recorder_engine(hass)
+    if engine is None:
+        return None
+
+    dialect_name = getattr(getattr(engine, "dialect", None), "name", None)
+    if dialect_name == "sqlite":
+        db_path = _sqlite_path_from_engine(engine) or hass.config.path("home-assistant_v2.db")
+        if not os.path.isfile(db_path):
+            return None
+        return await hass.async_add_executor_job(_run_sqlite_query, db_path, job, args)
+    if dialect_name in ("mysql", "mariadb"):
+        return await hass.async_add_executor_job(_run_sqlalchemy_query, engine, job, args)
+    return None
+
+
+def _run_sqlite_query(db_path: str, job: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        return job(conn.execute, *args)
+    finally:
+        conn.close()
+
+
+def _run_sqlalchemy_query(engine, job: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        return job(lambda sql, params: conn.execute(text(sql), params), *args)
+
+
+def _tagged(rows: Iterable[Sequence[Any]], index: int) -> Iterator[Tuple[float, int, Any, Any]]:
+    for start_ts, sum_value, state in rows:
+        yield start_ts, index, sum_value, state
+
+
+def _merge_source_rows(
+    series: Sequence[Iterable[Sequence[Any]]], base_count: int
+) -> Iterator[Tuple[float, List[Tuple[int, Any, Any]]]]:
+    """k-way merge of N (start_ts, sum, state) series sorted by start_ts, grouped per hour.
+
+    Only the hours with a base row are kept (the first ``base_count`` series):
+    an injection row of an hour without base statistics is skipped, and its
+    delta is counted at the next hour that has both.
+    """
+    merged = heapq.merge(
+        *(_tagged(rows, index) for index, rows in enumerate(series)), key=itemgetter(0, 1)
+    )
+    return _group_source_rows(merged, base_count)
+
+
+def _group_source_rows(
+    rows: Iterable[Sequence[Any]], base_count: int
+) -> Iterator[Tuple[float, List[Tuple[int, Any, Any]]]]:
+    """Group (start_ts, source index, sum, state) rows sorted by start_ts per hour, base sources first."""
+    for start_ts, group in itertools.groupby(rows, key=itemgetter(0)):
+        hour_rows = sorted(((index, sum_value, state) for _, index, sum_value, state in group), key=itemgetter(0))
+        if hour_rows[0][0] < base_count:
+            yield start_ts, hour_rows
+
+
+class _HistoryReplay:
+    """Replay the merged hourly source statistics (base sources first) into the battery."""
+
+    __slots__ = (
+        "base_count",
+        "last_states",
+        "last_sums",
+        "base_rows",
+        "battery_in",
+        "battery_out",
+        "capacity",
+        "base_total",
+        "base_emulated",
+        "injection_emulated_state",
+        "sum_battery_in",
+        "sum_battery_out",
+        "sum_base_emulated",
+        "sum_injection_emulated",
+        "offpeak",
+        "split",
+        "prices",
+        "costs",
+        "bill_period_start",
+        "bill_start_costs",
+    )
+
+    def __init__(
+        self,
+        base_count: int,
+        source_count: int,
+        start_capacity: float,
+        offpeak: Optional[Tuple[int, List[float]]] = None,
+        prices: Optional[HourlyPrices] = None,
+        bill_period_start: Optional[float] = None,
+    ) -> None:
+        self.base_count = base_count
+        self.last_states: List[Optional[float]] = [None] * source_count
+        self.last_sums: List[Optional[float]] = [None] * source_count
+        self.base_rows = 0
+        self.battery_in = max(start_capacity, 0.0)
+        self.battery_out = 0.0
+        self.capacity = self.battery_in
+        self.base_total = 0.0
+        self.base_emulated = 0.0
+        self.injection_emulated_state: Optional[float] = None
+        self.sum_battery_in = 0.0
+        self.sum_battery_out = 0.0
+        self.sum_base_emulated = 0.0
+        self.sum_injection_emulated = 0.0
+        # (first hour, off-peak share of each hour) when splitting HP/HC.
+        self.offpeak = offpeak
+        self.split = [0.0, 0.0, 0.0, 0.0]
+        self.prices = prices
+        self.costs = CostTotals()
+        # Totals when the replay reached the current billing period.
+        self.bill_period_start = bill_period_start
+        self.bill_start_costs: Optional[Tuple[float, float]] = None
+
+    def step(self, start_ts: float, hour_rows: List[Tuple[int, Any, Any]]) -> None:
+        delta_base = 0.0
+        delta_inj = 0.0
+        for index, sum_value, state in hour_rows:
+            if sum_value is None or sum_value < 0:
+                sum_value = 0.0
+            delta = None
+            last_state = self.last_states[index]
+            if state is not None and last_state is not None:
+                delta = state - last_state
+            if delta is None:
+                last_sum = self.last_sums[index]
+                delta = 0.0 if last_sum is None else sum_value - last_sum
+            if index < self.base_count:
+                self.base_rows += 1
+                if delta > 0:
+                    delta_base += delta
+            elif delta > 0:
+                delta_inj += delta
+            if state is not None:
+                self.last_states[index] = state
+            self.last_sums[index] = sum_value
+
+        self.battery_in += delta_inj
+        capacity_before = max(self.battery_in - self.battery_out, 0.0)
+        delta_out = min(delta_base, capacity_before)
+        self.battery_out += delta_out
+        self.capacity = max(self.battery_in - self.battery_out, 0.0)
+
+        self.base_total += delta_base
+        self.base_emulated = max(self.base_total - self.battery_out, 0.0)
+
+        self.sum_battery_in += delta_inj
+        self.sum_battery_out += delta_out
+        self.sum_base_emulated += max(delta_base - delta_out, 0.0)
+        self.sum_injection_emulated += delta_inj
+        delta_emulated = max(delta_base - delta_out, 0.0)
+        if self.offpeak is not None:
+            first_hour, shares = self.offpeak
+            index = int(start_ts // 3600) - first_hour
+            share = shares[index] if 0 <= index < len(shares) else 0.0
+            split = self.split
+            split[0] += delta_emulated * (1.0 - share)
+            split[1] += delta_emulated * share
+            split[2] += delta_out * (1.0 - share)
+            split[3] += delta_out * share
+        if self.prices is not None:
+            costs = self.costs
+            if (
+                self.bill_start_costs is None
+                and self.bill_period_start is not None
+                and start_ts >= self.bill_period_start
+            ):
+                self.bill_start_costs = (costs.cost_energy, costs.cost_acheminement)
+            costs.add(self.prices.at(start_ts), delta_emulated, delta_out, delta_inj)
+
+        injection_state = self._state_sum(self.base_count, len(self.last_states))
+        if injection_state is not None:
+            self.injection_emulated_state = injection_state
+        elif self.injection_emulated_state is None:
+            self.injection_emulated_state = 0.0
+
+    def derived_rows(self, start_ts: float, meta_ids: Sequence[int]) -> List[Tuple[float, int, float, Any, float]]:
+        """(created_ts, metadata_id, start_ts, state, sum) of the derived statistics.
+
+        ``meta_ids`` lists the five energy statistics, then the four HP/HC ones
+        when splitting, then the three cost ones when priced.
+        """
+        created_ts = start_ts + 3600
+        values = [
+            (self.battery_in, self.sum_battery_in),
+            (self.battery_out, self.sum_battery_out),
+            (self.capacity, 0.0),
+            (self.base_emulated, self.sum_base_emulated),
+            (self.injection_emulated_state, self.sum_injection_emulated),
+        ]
+        if self.offpeak is not None:
+            values.extend((total, total) for total in self.split)
+        if self.prices is not None:
+            costs = self.costs
+            values.extend(
+                (total, total) for total in (costs.cost_energy, costs.cost_acheminement, costs.injection_credit)
+            )
+        return [
+            (created_ts, meta_id, start_ts, state, sum_value)
+            for meta_id, (state, sum_value) in zip(meta_ids, values)
+        ]
+
+    def _state_sum(self, start: int, end: int) -> Optional[float]:
+        states = [state for state in self.last_states[start:end] if state is not None]
+        return sum(states) if states else None
+
+    def result(self, source_entity_ids: Sequence[str], rows: int) -> RebuildResult:
+        return RebuildResult(
+            battery_in=self.battery_in,
+            battery_out=self.battery_out,
+            capacity=self.capacity,
+            base_emulated=self.base_emulated,
+            last_base_state=self._state_sum(0, self.base_count),
+            last_injection_state=self._state_sum(self.base_count, len(self.last_states)),
+            rows=rows,
+            last_source_states={
+                entity_id: state
+                for entity_id, state in zip(source_entity_ids, self.last_states)
+                if state is not None
+            },
+            costs=self.costs if self.prices is not None else None,
+            split=tuple(self.split) if self.offpeak is not None else None,
+            bill=self._bill(),
+        )
+
+    def _bill(self) -> Optional[Tuple[float, float, float]]:
+        if self.prices is None or self.bill_period_start is None:
+            return None
+        costs = self.costs
+        energy, acheminement = self.bill_start_costs or (costs.cost_energy, costs.cost_acheminement)
+        return (self.bill_period_start, costs.cost_energy - energy, costs.cost_acheminement - acheminement)
+
+
 def _rebuild_sqlite(
     db_path: str,
-    base_entity_id: str,
-    injection_entity_id: str,
+    base_entity_ids: Sequence[str],
+    injection_entity_ids: Sequence[str],
     battery_in_entity_id: str,
     battery_out_entity_id: str,
     capacity_entity_id: str,
     base_emulated_entity_id: str,
     injection_emulated_entity_id: str,
     start_capacity: float,
+    extras: Optional[RebuildExtras] = None,
 ) -> Optional[RebuildResult]:
     conn = sqlite3.connect(db_path)
     try:
         cur = conn.cursor()
 
-        base_meta_id = _get_meta_id(cur, base_entity_id, create=False)
-        injection_meta_id = _get_meta_id(cur, injection_entity_id, create=False)
-        if base_meta_id is None or injection_meta_id is None:
+        source_entity_ids = [*base_entity_ids, *injection_entity_ids]
+        source_meta_ids = [_get_meta_id(cur, entity_id, create=False) for entity_id in source_entity_ids]
+        if None in source_meta_ids:
             _LOGGER.error("Missing statistics meta for base/injection; history rebuild skipped")
             return None
 
@@ -150,22 +680,6 @@ def _rebuild_sqlite(
         base_emulated_meta_id = _get_meta_id(cur, base_emulated_entity_id, create=True)
         injection_emulated_meta_id = _get_meta_id(cur, injection_emulated_entity_id, create=True)
 
-        base_rows = cur.execute(
-            "SELECT start_ts, sum, state FROM statistics WHERE metadata_id = ? ORDER BY start_ts",
-            (base_meta_id,),
-        ).fetchall()
-        if not base_rows:
-            _LOGGER.error("No base statistics found; history rebuild skipped")
-            return None
-
-        injection_rows = cur.execute(
-            "SELECT start_ts, sum, state FROM statistics WHERE metadata_id = ? ORDER BY start_ts",
-            (injection_meta_id,),
-        ).fetchall()
-        injection_by_ts: Dict[float, Tuple[float, Optional[float]]] = {
-            row[0]: (row[1] if row[1] is not None else 0.0, row[2]) for row in injection_rows
-        }
-
         derived_meta_ids = (
             battery_in_meta_id,
             battery_out_meta_id,
@@ -173,129 +687,84 @@ def _rebuild_sqlite(
             base_emulated_meta_id,
             injection_emulated_meta_id,
         )
+        offpeak = prices = None
+        if extras is not None:
+            derived_meta_ids += tuple(
+                _get_meta_id(cur, entity_id, create=True, unit=unit, unit_class=unit_class)
+                for entity_id, unit, unit_class in extras.entity_ids
+            )
+            first_ts, last_ts = cur.execute(
+                "SELECT MIN(start_ts), MAX(start_ts) FROM statistics "
+                f"WHERE metadata_id IN ({','.join('?' * len(source_meta_ids))})",
+                source_meta_ids,
+            ).fetchone()
+            if first_ts is not None:
+                # Off-peak share and prices of every hour, looked up by index in the replay.
+                offpeak, prices = _replay_arrays(extras, first_ts, last_ts)
+        placeholders = ",".join("?" * len(derived_meta_ids))
         cur.execute(
-            "DELETE FROM statistics WHERE metadata_id IN (?,?,?,?,?)",
+            f"DELETE FROM statistics WHERE metadata_id IN ({placeholders})",
             derived_meta_ids,
         )
         cur.execute(
-            "DELETE FROM statistics_short_term WHERE metadata_id IN (?,?,?,?,?)",
+            f"DELETE FROM statistics_short_term WHERE metadata_id IN ({placeholders})",
             derived_meta_ids,
         )
 
-        battery_in_total = max(start_capacity, 0.0)
-        battery_out_total = 0.0
-        base_emulated_total = 0.0
-        capacity = max(battery_in_total - battery_out_total, 0.0)
-        base_total = 0.0
-
-        sum_battery_in = 0.0
-        sum_battery_out = 0.0
-        sum_base_emulated = 0.0
-        sum_injection_emulated = 0.0
-
-        sum_battery_in = 0.0
-        sum_battery_out = 0.0
-        sum_base_emulated = 0.0
-        sum_injection_emulated = 0.0
-
-        sum_battery_in = 0.0
-        sum_battery_out = 0.0
-        sum_base_emulated = 0.0
-        sum_injection_emulated = 0.0
-
-        rows_to_insert = []
-        last_base_state = None
-        last_injection_state = None
-        last_base_sum = None
-        last_injection_sum = None
-        injection_emulated_state = None
-
-        for start_ts, base_sum, base_state in base_rows:
-            if base_sum is None or base_sum < 0:
-                base_sum = 0.0
-            inj_sum, inj_state = injection_by_ts.get(start_ts, (0.0, None))
-            if inj_sum is None or inj_sum < 0:
-                inj_sum = 0.0
-
-            delta_base = None
-            if base_state is not None and last_base_state is not None:
-                delta_base = base_state - last_base_state
-            if delta_base is None:
-                if last_base_sum is None:
-                    delta_base = 0.0
-                else:
-                    delta_base = base_sum - last_base_sum
-            if delta_base < 0:
-                delta_base = 0.0
-
-            delta_inj = None
-            if inj_state is not None and last_injection_state is not None:
-                delta_inj = inj_state - last_injection_state
-            if delta_inj is None:
-                if last_injection_sum is None:
-                    delta_inj = 0.0
-                else:
-                    delta_inj = inj_sum - last_injection_sum
-            if delta_inj < 0:
-                delta_inj = 0.0
-
-            battery_in_total += delta_inj
-            capacity_before = max(battery_in_total - battery_out_total, 0.0)
-            delta_out = min(delta_base, capacity_before)
-            battery_out_total += delta_out
-            capacity = max(battery_in_total - battery_out_total, 0.0)
-
-            base_total += delta_base
-            base_emulated_total = max(base_total - battery_out_total, 0.0)
-            delta_emulated = max(delta_base - delta_out, 0.0)
-
-            sum_battery_in += delta_inj
-            sum_battery_out += delta_out
-            sum_base_emulated += delta_emulated
-            sum_injection_emulated += delta_inj
-
-            if inj_state is not None:
-                injection_emulated_state = inj_state
-            elif injection_emulated_state is None:
-                injection_emulated_state = last_injection_state or 0.0
-
-            created_ts = start_ts + 3600
-            rows_to_insert.extend(
-                [
-                    (created_ts, battery_in_meta_id, start_ts, battery_in_total, sum_battery_in),
-                    (created_ts, battery_out_meta_id, start_ts, battery_out_total, sum_battery_out),
-                    (created_ts, capacity_meta_id, start_ts, capacity, 0.0),
-                    (created_ts, base_emulated_meta_id, start_ts, base_emulated_total, sum_base_emulated),
-                    (created_ts, injection_emulated_meta_id, start_ts, injection_emulated_state, sum_injection_emulated),
-                ]
+        # One lazy cursor per source, merged in a single pass; the derived rows
+        # inserted meanwhile never match the source metadata ids being read.
+        series = [
+            conn.execute(
+                "SELECT start_ts, sum, state FROM statistics WHERE metadata_id = ? ORDER BY start_ts",
+                (meta_id,),
             )
-
-            if base_state is not None:
-                last_base_state = base_state
-            if inj_state is not None:
-                last_injection_state = inj_state
-            last_base_sum = base_sum
-            last_injection_sum = inj_sum
+            for meta_id in source_meta_ids
+        ]
+        replay = _HistoryReplay(
+            len(base_entity_ids),
+            len(source_entity_ids),
+            start_capacity,
+            offpeak,
+            prices,
+            extras.bill_period_start if extras is not None else None,
+        )
+        rows_to_insert = []
+        inserted_rows = 0
+        for start_ts, hour_rows in _merge_source_rows(series, len(base_entity_ids)):
+            replay.step(start_ts, hour_rows)
+            rows_to_insert.extend(replay.derived_rows(start_ts, derived_meta_ids))
+            if len(rows_to_insert) >= REBUILD_BATCH_SIZE:
+                cur.executemany(
+                    "INSERT INTO statistics (created_ts, metadata_id, start_ts, state, sum) VALUES (?,?,?,?,?)",
+                    rows_to_insert,
+                )
+                inserted_rows += len(rows_to_insert)
+                rows_to_insert = []
+
+        if not replay.base_rows:
+            conn.rollback()
+            _LOGGER.error("No base statistics found; history rebuild skipped")
+            return None
 
         cur.executemany(
             "INSERT INTO statistics (created_ts, metadata_id, start_ts, state, sum) VALUES (?,?,?,?,?)",
             rows_to_insert,
         )
+        inserted_rows += len(rows_to_insert)
         conn.commit()
 
-        return RebuildResult(
-            battery_in=battery_in_total,
-            battery_out=battery_out_total,
-            capacity=capacity,
-            base_emulated=base_emulated_total,
-            last_base_state=last_base_state,
-            last_injection_state=last_injection_state,
-            rows=len(rows_to_insert),
-        )
+        return replay.result(source_entity_ids, inserted_rows)
     finally:
         conn.close()
 
 
+def _replay_arrays(
+    extras: RebuildExtras, first_ts: float, last_ts: float
+) -> Tuple[Optional[Tuple[int, List[float]]], Optional[HourlyPrices]]:
+    offpeak, prices = extras.hourly(first_ts, last_ts)
+    return (int(first_ts // 3600), offpeak) if offpeak is not None else None, prices
+
+
 def _get_meta_id(
     cur: sqlite3.Cursor,
     statistic_id: str,
@@ -365,14 +834,15 @@ async def _wait_recorder_engine(hass: HomeAssistant, timeout: int = 60, interval
 
 def _rebuild_sqlalchemy(
     engine,
-    base_entity_id: str,
-    injection_entity_id: str,
+    base_entity_ids: Sequence[str],
+    injection_entity_ids: Sequence[str],
     battery_in_entity_id: str,
     battery_out_entity_id: str,
     capacity_entity_id: str,
     base_emulated_entity_id: str,
     injection_emulated_entity_id: str,
     start_capacity: float,
+    extras: Optional[RebuildExtras] = None,
 ) -> Optional[RebuildResult]:
     from sqlalchemy import text
 
@@ -380,9 +850,11 @@ def _rebuild_sqlalchemy(
     dialect_name = getattr(dialect, "name", None)
     sum_col = "`sum`" if dialect_name in ("mysql", "mariadb") else "sum"
 
-    base_meta_id = _get_meta_id_sa_engine(engine, base_entity_id, create=False)
-    injection_meta_id = _get_meta_id_sa_engine(engine, injection_entity_id, create=False)
-    if base_meta_id is None or injection_meta_id is None:
+    source_entity_ids = [*base_entity_ids, *injection_entity_ids]
+    source_meta_ids = [
+        _get_meta_id_sa_engine(engine, entity_id, create=False) for entity_id in source_entity_ids
+    ]
+    if None in source_meta_ids:
         _LOGGER.error("Missing statistics meta for base/injection; history rebuild skipped")
         return None
 
@@ -401,70 +873,81 @@ def _rebuild_sqlalchemy(
         base_emulated_meta_id,
         injection_emulated_meta_id,
     )
+    if extras is not None:
+        derived_meta_ids += tuple(
+            _get_meta_id_sa_engine(engine, entity_id, create=True, unit=unit, unit_class=unit_class)
+            for entity_id, unit, unit_class in extras.entity_ids
+        )
+    derived_params = {f"m{index}": meta_id for index, meta_id in enumerate(derived_meta_ids)}
+    derived_placeholders = ",".join(f":{name}" for name in derived_params)
+    source_params = {f"s{index}": meta_id for index, meta_id in enumerate(source_meta_ids)}
+    source_placeholders = ",".join(f":{name}" for name in source_params)
+    source_index = {meta_id: index for index, meta_id in enumerate(source_meta_ids)}
 
     conn = engine.connect()
+    # MySQL drivers serve one result at a time per connection: the source rows
+    # are streamed on a second connection while the first one writes.
+    read_conn = engine.connect()
     try:
+        base_params = {f"b{index}": meta_id for index, meta_id in enumerate(source_meta_ids[: len(base_entity_ids)])}
+        with read_conn.begin():
+            # Checked before the derived statistics are deleted.
+            base_rows = read_conn.execute(
+                text(
+                    "SELECT COUNT(*) FROM statistics "
+                    f"WHERE metadata_id IN ({','.join(f':{name}' for name in base_params)})"
+                ),
+                base_params,
+            ).scalar()
+            first_ts, last_ts = read_conn.execute(
+                text(
+                    "SELECT MIN(start_ts), MAX(start_ts) FROM statistics "
+                    f"WHERE metadata_id IN ({source_placeholders})"
+                ),
+                source_params,
+            ).one()
+        if not base_rows:
+            _LOGGER.error("No base statistics found; history rebuild skipped")
+            return None
+
+        offpeak = prices = None
+        if extras is not None and first_ts is not None:
+            # Off-peak share and prices of every hour, looked up by index in the replay.
+            offpeak, prices = _replay_arrays(extras, first_ts, last_ts)
+
         with conn.begin():
             conn.execute(
-                text("DELETE FROM statistics WHERE metadata_id IN (:a,:b,:c,:d,:e)"),
-                {
-                    "a": derived_meta_ids[0],
-                    "b": derived_meta_ids[1],
-                    "c": derived_meta_ids[2],
-                    "d": derived_meta_ids[3],
-                    "e": derived_meta_ids[4],
-                },
+                text(f"DELETE FROM statistics WHERE metadata_id IN ({derived_placeholders})"),
+                derived_params,
             )
             conn.execute(
-                text("DELETE FROM statistics_short_term WHERE metadata_id IN (:a,:b,:c,:d,:e)"),
-                {
-                    "a": derived_meta_ids[0],
-                    "b": derived_meta_ids[1],
-                    "c": derived_meta_ids[2],
-                    "d": derived_meta_ids[3],
-                    "e": derived_meta_ids[4],
-                },
+                text(f"DELETE FROM statistics_short_term WHERE metadata_id IN ({derived_placeholders})"),
+                derived_params,
             )
 
-        base_rows = conn.execute(
-            text(
-                f"SELECT start_ts, {sum_col} AS sum_value, state "
-                "FROM statistics WHERE metadata_id = :mid ORDER BY start_ts"
-            ),
-            {"mid": base_meta_id},
-        ).fetchall()
-        if not base_rows:
-            _LOGGER.error("No base statistics found; history rebuild skipped")
-            return None
-
-        injection_rows = conn.execute(
+        # One pass over all the sources, streamed by the server.
+        source_rows = read_conn.execution_options(stream_results=True, yield_per=REBUILD_BATCH_SIZE).execute(
             text(
-                f"SELECT start_ts, {sum_col} AS sum_value, state "
-                "FROM statistics WHERE metadata_id = :mid ORDER BY start_ts"
+                f"SELECT metadata_id, start_ts, {sum_col} AS sum_value, state FROM statistics "
+                f"WHERE metadata_id IN ({source_placeholders}) ORDER BY start_ts, metadata_id"
             ),
-            {"mid": injection_meta_id},
-        ).fetchall()
-        injection_by_ts: Dict[float, Tuple[float, Optional[float]]] = {
-            row[0]: (row[1] if row[1] is not None else 0.0, row[2]) for row in injection_rows
-        }
-
-        battery_in_total = max(start_capacity, 0.0)
-        battery_out_total = 0.0
-        base_emulated_total = 0.0
-        capacity = max(battery_in_total - battery_out_total, 0.0)
-        base_total = 0.0
-        sum_battery_in = 0.0
-        sum_battery_out = 0.0
-        sum_base_emulated = 0.0
-        sum_injection_emulated = 0.0
+            source_params,
+        )
+        tagged_rows = (
+            (start_ts, source_index[metadata_id], sum_value, state)
+            for metadata_id, start_ts, sum_value, state in source_rows
+        )
 
+        replay = _HistoryReplay(
+            len(base_entity_ids),
+            len(source_entity_ids),
+            start_capacity,
+            offpeak,
+            prices,
+            extras.bill_period_start if extras is not None else None,
+        )
         rows_to_insert = []
         inserted_rows = 0
-        last_base_state = None
-        last_injection_state = None
-        last_base_sum = None
-        last_injection_sum = None
-        injection_emulated_state = None
 
         insert_stmt = text(
             f"INSERT INTO statistics (created_ts, metadata_id, start_ts, state, {sum_col}) "
@@ -482,118 +965,28 @@ def _rebuild_sqlalchemy(
             if REBUILD_BATCH_SLEEP_S > 0:
                 time.sleep(REBUILD_BATCH_SLEEP_S)
 
-        for start_ts, base_sum, base_state in base_rows:
-            if base_sum is None or base_sum < 0:
-                base_sum = 0.0
-            inj_sum, inj_state = injection_by_ts.get(start_ts, (0.0, None))
-            if inj_sum is None or inj_sum < 0:
-                inj_sum = 0.0
-
-            delta_base = None
-            if base_state is not None and last_base_state is not None:
-                delta_base = base_state - last_base_state
-            if delta_base is None:
-                if last_base_sum is None:
-                    delta_base = 0.0
-                else:
-                    delta_base = base_sum - last_base_sum
-            if delta_base < 0:
-                delta_base = 0.0
-
-            delta_inj = None
-            if inj_state is not None and last_injection_state is not None:
-                delta_inj = inj_state - last_injection_state
-            if delta_inj is None:
-                if last_injection_sum is None:
-                    delta_inj = 0.0
-                else:
-                    delta_inj = inj_sum - last_injection_sum
-            if delta_inj < 0:
-                delta_inj = 0.0
-
-            battery_in_total += delta_inj
-            capacity_before = max(battery_in_total - battery_out_total, 0.0)
-            delta_out = min(delta_base, capacity_before)
-            battery_out_total += delta_out
-            capacity = max(battery_in_total - battery_out_total, 0.0)
-
-            base_total += delta_base
-            base_emulated_total = max(base_total - battery_out_total, 0.0)
-            delta_emulated = max(delta_base - delta_out, 0.0)
-
-            sum_battery_in += delta_inj
-            sum_battery_out += delta_out
-            sum_base_emulated += delta_emulated
-            sum_injection_emulated += delta_inj
-
-            if inj_state is not None:
-                injection_emulated_state = inj_state
-            elif injection_emulated_state is None:
-                injection_emulated_state = last_injection_state or 0.0
-
-            created_ts = start_ts + 3600
+        for start_ts, hour_rows in _group_source_rows(tagged_rows, len(base_entity_ids)):
+            replay.step(start_ts, hour_rows)
             rows_to_insert.extend(
-                [
-                    {
-                        "created_ts": created_ts,
-                        "metadata_id": battery_in_meta_id,
-                        "start_ts": start_ts,
-                        "state": battery_in_total,
-                        "sum_value": sum_battery_in,
-                    },
-                    {
-                        "created_ts": created_ts,
-                        "metadata_id": battery_out_meta_id,
-                        "start_ts": start_ts,
-                        "state": battery_out_total,
-                        "sum_value": sum_battery_out,
-                    },
-                    {
-                        "created_ts": created_ts,
-                        "metadata_id": capacity_meta_id,
-                        "start_ts": start_ts,
-                        "state": capacity,
-                        "sum_value": 0.0,
-                    },
-                    {
-                        "created_ts": created_ts,
-                        "metadata_id": base_emulated_meta_id,
-                        "start_ts": start_ts,
-                        "state": base_emulated_total,
-                        "sum_value": sum_base_emulated,
-                    },
-                    {
-                        "created_ts": created_ts,
-                        "metadata_id": injection_emulated_meta_id,
-                        "start_ts": start_ts,
-                        "state": injection_emulated_state,
-                        "sum_value": sum_injection_emulated,
-                    },
-                ]
+                {
+                    "created_ts": created_ts,
+                    "metadata_id": metadata_id,
+                    "start_ts": row_start_ts,
+                    "state": state,
+                    "sum_value": sum_value,
+                }
+                for created_ts, metadata_id, row_start_ts, state, sum_value in replay.derived_rows(
+                    start_ts, derived_meta_ids
+                )
             )
-
             if len(rows_to_insert) >= REBUILD_BATCH_SIZE:
                 _flush_rows()
 
-            if base_state is not None:
-                last_base_state = base_state
-            if inj_state is not None:
-                last_injection_state = inj_state
-            last_base_sum = base_sum
-            last_injection_sum = inj_sum
-
         _flush_rows()
 
-        return RebuildResult(
-            battery_in=battery_in_total,
-            battery_out=battery_out_total,
-            capacity=capacity,
-            base_emulated=base_emulated_total,
-            last_base_state=last_base_state,
-            last_injection_state=last_injection_state,
-            rows=inserted_rows,
-        )
+        return replay.result(source_entity_ids, inserted_rows)
     finally:
+        read_conn.close()
         conn.close()
 
 
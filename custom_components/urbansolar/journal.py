@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+
+# (ts, delta_base, delta_inj, base_state, inj_state); NaN marks an unknown state.
+RECORD = struct.Struct("<ddddd")
+JOURNAL_FLUSH_INTERVAL_S = 300
+# Records older than this are merged into one record per hour by the compaction.
+JOURNAL_COMPACT_AFTER_S = 7 * 86400
+
+Record = Tuple[float, float, float, float, float]
+
+
+class DeltaJournal:
+    """Append-only file of the deltas applied by the live path of one entry.
+
+    Appends are buffered in memory from the event loop; ``flush``, ``replay``
+    and ``compact`` do file I/O and must run in the executor.
+    """
+
+    __slots__ = ("path", "_buffer")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._buffer = bytearray()
+
+    def append(
+        self,
+        ts: float,
+        delta_base: float,
+        delta_inj: float,
+        base_state: Optional[float],
+        inj_state: Optional[float],
+    ) -> None:
+        self._buffer += RECORD.pack(
+            ts,
+            delta_base,
+            delta_inj,
+            math.nan if base_state is None else base_state,
+            math.nan if inj_state is None else inj_state,
+        )
+
+    def take_pending(self) -> bytes:
+        """Detach the buffered records (event loop side of a flush)."""
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        with open(self.path, "ab") as fh:
+            fh.write(data)
+
+    def replay(self, since_ts: Optional[float] = None) -> Iterator[Record]:
+        """Yield the journal records, read through a memory map."""
+        try:
+            fh = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with fh:
+            size = os.fstat(fh.fileno()).st_size
+            size -= size % RECORD.size
+            if size == 0:
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for record in RECORD.iter_unpack(view[:size]):
+                        if since_ts is None or record[0] >= since_ts:
+                            yield record
+                finally:
+                    view.release()
+
+    def compact(self, before_ts: float) -> int:
+        """Merge records older than ``before_ts`` into one record per hour.
+
+        Returns the number of records removed.
+        """
+        records = list(self.replay())
+        if not records:
+            return 0
+
+        compacted: List[Record] = []
+        for record in records:
+            ts = record[0]
+            if ts >= before_ts or not compacted or compacted[-1][0] >= before_ts:
+                compacted.append(record)
+                continue
+            last = compacted[-1]
+            if int(last[0] // 3600) != int(ts // 3600):
+                compacted.append(record)
+                continue
+            compacted[-1] = (
+                ts,
+                last[1] + record[1],
+                last[2] + record[2],
+                record[3] if not math.isnan(record[3]) else last[3],
+                record[4] if not math.isnan(record[4]) else last[4],
+            )
+
+        removed = len(records) - len(compacted)
+        if removed:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as fh:
+                for record in compacted:
+                    fh.write(RECORD.pack(*record))
+            os.replace(tmp_path, self.path)
+        return removed
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def replay_battery(
+    records: Iterator[Record],
+    battery_in: float = 0.0,
+    battery_out: float = 0.0,
+) -> Tuple[float, float]:
+    """Replay journal deltas on given totals (what-if / audit), like the live path."""
+    for _, delta_base, delta_inj, _, _ in records:
+        if delta_inj > 0:
+            battery_in += delta_inj
+        if delta_base > 0:
+            battery_out += min(delta_base, max(battery_in - battery_out, 0.0))
+    return battery_in, battery_out
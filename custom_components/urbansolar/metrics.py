@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded.
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 100.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram; observing a value only bumps counters."""
+
+    __slots__ = ("bounds", "counts", "count", "total", "max")
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        self.counts: List[int] = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def buckets(self) -> Dict[str, int]:
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["inf"]
+        return dict(zip(labels, self.counts))
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean, 4),
+            "max_ms": round(self.max, 4),
+            "buckets": self.buckets(),
+        }
+
+
+class LiveMetrics:
+    """Counters of the live computation path of one config entry."""
+
+    __slots__ = (
+        "source_events",
+        "recomputes",
+        "recomputes_coalesced",
+        "state_writes",
+        "negative_deltas_clamped",
+        "reconcile_corrections",
+        "lock_wait_ms",
+        "recompute_ms",
+    )
+
+    def __init__(self) -> None:
+        self.source_events = 0
+        self.recomputes = 0
+        self.recomputes_coalesced = 0
+        self.state_writes = 0
+        self.negative_deltas_clamped = 0
+        self.reconcile_corrections = 0
+        self.lock_wait_ms = Histogram()
+        self.recompute_ms = Histogram()
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "source_events": self.source_events,
+            "recomputes": self.recomputes,
+            "recomputes_coalesced": self.recomputes_coalesced,
+            "state_writes": self.state_writes,
+            "negative_deltas_clamped": self.negative_deltas_clamped,
+            "reconcile_corrections": self.reconcile_corrections,
+            "lock_wait_ms": self.lock_wait_ms.as_dict(),
+            "recompute_ms": self.recompute_ms.as_dict(),
+        }
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from typing import Optional
+
+# Steady power fires no state change: the integrators are advanced with the last power this often.
+POWER_ADVANCE_INTERVAL_S = 300
+
+
+class PowerIntegrator:
+    """Riemann sum of a power sensor (W) into kWh, O(1) per sample.
+
+    A power sensor only reports changes, so each power holds until the next
+    sample (or ``advance``). Nothing is integrated while the sensor is
+    unavailable.
+    """
+
+    __slots__ = ("last_ts", "last_power_w", "energy_kwh")
+
+    def __init__(self) -> None:
+        self.last_ts: Optional[float] = None
+        self.last_power_w: Optional[float] = None
+        self.energy_kwh = 0.0
+
+    def add_sample(self, ts: float, power_w: float) -> None:
+        self.advance(ts)
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+        self.last_power_w = max(power_w, 0.0)
+
+    def advance(self, ts: float) -> None:
+        """Integrate the last power up to ``ts``."""
+        if self.last_ts is None or self.last_power_w is None:
+            return
+        elapsed = ts - self.last_ts
+        if elapsed > 0:
+            self.energy_kwh += self.last_power_w * elapsed / 3_600_000
+            self.last_ts = ts
+
+    def mark_unavailable(self) -> None:
+        """Stop integrating until the next valid sample."""
+        self.last_ts = None
+        self.last_power_w = None
+
+    def reanchor(self) -> None:
+        """Drop the energy estimated since the last authoritative index update."""
+        self.energy_kwh = 0.0
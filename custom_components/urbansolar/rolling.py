@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+# (window length in hours, label used in the keys / sensor names)
+WINDOWS = ((24, "24h"), (168, "7d"), (720, "30d"))
+
+
+class RollingRatios:
+    """Hourly (base, battery out, injection) buckets in a ring buffer.
+
+    Each window keeps running sums: when an hour is entered, the bucket that
+    leaves each window is subtracted, so updates are O(1) per window.
+    """
+
+    __slots__ = ("size", "hour_key", "base", "out", "inj", "sums")
+
+    def __init__(self) -> None:
+        self.size = max(hours for hours, _ in WINDOWS)
+        self.hour_key: Optional[int] = None
+        self.base: List[float] = [0.0] * self.size
+        self.out: List[float] = [0.0] * self.size
+        self.inj: List[float] = [0.0] * self.size
+        # hours -> [base, out, inj]
+        self.sums: Dict[int, List[float]] = {hours: [0.0, 0.0, 0.0] for hours, _ in WINDOWS}
+
+    def add(self, ts: float, delta_base: float, delta_out: float, delta_inj: float) -> None:
+        hour_key = int(ts // 3600)
+        self._advance(hour_key)
+        if hour_key < self.hour_key:
+            # Clock moved backwards: account the delta in the current hour.
+            hour_key = self.hour_key
+        index = hour_key % self.size
+        self.base[index] += delta_base
+        self.out[index] += delta_out
+        self.inj[index] += delta_inj
+        for sums in self.sums.values():
+            sums[0] += delta_base
+            sums[1] += delta_out
+            sums[2] += delta_inj
+
+    def _advance(self, hour_key: int) -> None:
+        if self.hour_key is None:
+            self.hour_key = hour_key
+            return
+        if hour_key <= self.hour_key:
+            return
+        if hour_key - self.hour_key >= self.size:
+            self._clear()
+            self.hour_key = hour_key
+            return
+        size = self.size
+        for hour in range(self.hour_key + 1, hour_key + 1):
+            for hours, sums in self.sums.items():
+                leaving = (hour - hours) % size
+                sums[0] -= self.base[leaving]
+                sums[1] -= self.out[leaving]
+                sums[2] -= self.inj[leaving]
+            index = hour % size
+            self.base[index] = 0.0
+            self.out[index] = 0.0
+            self.inj[index] = 0.0
+        self.hour_key = hour_key
+
+    def _clear(self) -> None:
+        for index in range(self.size):
+            self.base[index] = 0.0
+            self.out[index] = 0.0
+            self.inj[index] = 0.0
+        for sums in self.sums.values():
+            sums[0] = sums[1] = sums[2] = 0.0
+
+    def ratios(self) -> Dict[str, Optional[float]]:
+        """Coverage (out / base) and injection consumed (out / inj) per window, in %."""
+        values: Dict[str, Optional[float]] = {}
+        for hours, label in WINDOWS:
+            base, out, inj = self.sums[hours]
+            # Running sums can drift slightly below zero after many subtractions.
+            out = max(out, 0.0)
+            values[f"coverage_{label}"] = out / base * 100 if base > 1e-9 else None
+            values[f"injection_consumed_{label}"] = out / inj * 100 if inj > 1e-9 else None
+        return values
+
+    def as_dict(self) -> dict:
+        return {
+            "hour_key": self.hour_key,
+            "base": [round(value, 6) for value in self.base],
+            "out": [round(value, 6) for value in self.out],
+            "inj": [round(value, 6) for value in self.inj],
+        }
+
+    def load_dict(self, data: Optional[dict]) -> None:
+        """Load buckets saved by ``as_dict`` and recompute the window sums exactly."""
+        if not data or data.get("hour_key") is None:
+            return
+        buckets = [data.get(name) or [] for name in ("base", "out", "inj")]
+        if any(len(values) != self.size for values in buckets):
+            return
+        self.hour_key = int(data["hour_key"])
+        self.base, self.out, self.inj = ([float(value) for value in values] for values in buckets)
+        for hours, sums in self.sums.items():
+            sums[0] = sums[1] = sums[2] = 0.0
+            for hour in range(self.hour_key - hours + 1, self.hour_key + 1):
+                index = hour % self.size
+                sums[0] += self.base[index]
+                sums[1] += self.out[index]
+                sums[2] += self.inj[index]
@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .const import (
+    CONF_CAPACITY_BATTERY,
+    CONF_INDEX_BASE_EMULATED,
+    CONF_INDEX_BATTERY_IN,
+    CONF_INDEX_BATTERY_OUT,
+    CONF_INDEX_INJECTION_EMULATED,
+)
+from .forecast import DepletionForecast
+from .metrics import LiveMetrics
+from .rolling import RollingRatios
+
+# Accumulators persisted in the entry's Store file.
+PERSISTED_FIELDS = (
+    "battery_in",
+    "battery_out",
+    "capacity",
+    "base_emulated",
+    "injection_emulated",
+    "last_base",
+    "last_injection",
+    "cost_energy",
+    "cost_acheminement",
+    "injection_credit",
+    "base_emulated_hp",
+    "base_emulated_hc",
+    "battery_out_hp",
+    "battery_out_hc",
+    "bill_period_start",
+    "bill_energy",
+    "bill_acheminement",
+)
+
+# Runtime / snapshot attribute holding the value of each derived sensor.
+SENSOR_FIELDS = {
+    CONF_INDEX_BATTERY_IN: "battery_in",
+    CONF_INDEX_BATTERY_OUT: "battery_out",
+    CONF_CAPACITY_BATTERY: "capacity",
+    CONF_INDEX_BASE_EMULATED: "base_emulated",
+    CONF_INDEX_INJECTION_EMULATED: "injection_emulated",
+}
+
+
+def source_entity_list(value) -> List[str]:
+    """Source sensors of a role: one entity id (entries created before multi-meter) or a list."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        return [value]
+    return [entity_id for entity_id in value if entity_id]
+
+
+@dataclass(frozen=True)
+class BatterySnapshot:
+    battery_in: float
+    battery_out: float
+    capacity: float
+    base_emulated: float
+    injection_emulated: Optional[float]
+    depletion_time: Optional[datetime] = None
+    month_end_capacity: Optional[float] = None
+    ratios: Optional[dict] = None
+    cost_energy: Optional[float] = None
+    cost_acheminement: Optional[float] = None
+    injection_credit: Optional[float] = None
+    base_emulated_hp: Optional[float] = None
+    base_emulated_hc: Optional[float] = None
+    battery_out_hp: Optional[float] = None
+    battery_out_hc: Optional[float] = None
+    bill_period_start: Optional[float] = None
+    bill_energy: Optional[float] = None
+    bill_acheminement: Optional[float] = None
+
+
+class UrbanSolarRuntimeData:
+    """Per config entry state, stored in ``entry.runtime_data``."""
+
+    __slots__ = (
+        "battery_in",
+        "battery_out",
+        "capacity",
+        "base_emulated",
+        "injection_emulated",
+        "last_base",
+        "last_injection",
+        "cost_energy",
+        "cost_acheminement",
+        "injection_credit",
+        "base_emulated_hp",
+        "base_emulated_hc",
+        "battery_out_hp",
+        "battery_out_hc",
+        "bill_period_start",
+        "bill_energy",
+        "bill_acheminement",
+        "source_last",
+        "calc_lock",
+        "options",
+        "store",
+        "metrics",
+        "import_power",
+        "export_power",
+        "journal",
+        "forecast",
+        "rolling",
+        "coordinator",
+        "tariff_store",
+        "tariff_data",
+        "tariff_coordinator",
+    )
+
+    def __init__(self) -> None:
+        self.battery_in: Optional[float] = None
+        self.battery_out: Optional[float] = None
+        self.capacity: Optional[float] = None
+        self.base_emulated: Optional[float] = None
+        self.injection_emulated: Optional[float] = None
+        self.last_base: Optional[float] = None
+        self.last_injection: Optional[float] = None
+        # EUR totals, only accumulated when the tariff option has cost statistics.
+        self.cost_energy: Optional[float] = None
+        self.cost_acheminement: Optional[float] = None
+        self.injection_credit: Optional[float] = None
+        # HP/HC split of Base Emulated / Battery Out, only accumulated with the HP/HC option.
+        self.base_emulated_hp: Optional[float] = None
+        self.base_emulated_hc: Optional[float] = None
+        self.battery_out_hp: Optional[float] = None
+        self.battery_out_hc: Optional[float] = None
+        # Energy / acheminement costs since the start of the billing period (timestamp).
+        self.bill_period_start: Optional[float] = None
+        self.bill_energy: Optional[float] = None
+        self.bill_acheminement: Optional[float] = None
+        # Last index seen per source sensor; last_base / last_injection are their sums.
+        self.source_last: Dict[str, float] = {}
+        self.calc_lock = asyncio.Lock()
+        self.options: dict = {}
+        self.store = None
+        self.metrics = LiveMetrics()
+        # Optional power integrators estimating the flows between index updates.
+        self.import_power = None
+        self.export_power = None
+        self.journal = None
+        self.forecast = DepletionForecast()
+        self.rolling = RollingRatios()
+        self.coordinator = None
+        self.tariff_store = None
+        self.tariff_data = None
+        self.tariff_coordinator = None
+
+    def as_dict(self) -> dict:
+        data = {field: getattr(self, field) for field in PERSISTED_FIELDS}
+        data["source_last"] = dict(self.source_last)
+        data["rolling"] = self.rolling.as_dict()
+        return data
+
+    def load_dict(self, data: Optional[dict]) -> bool:
+        """Load accumulators saved by ``as_dict``; return False when nothing was stored."""
+        if not data:
+            return False
+        for field in PERSISTED_FIELDS:
+            value = data.get(field)
+            setattr(self, field, float(value) if value is not None else None)
+        self.source_last = {
+            entity_id: float(value)
+            for entity_id, value in (data.get("source_last") or {}).items()
+            if value is not None
+        }
+        self.rolling.load_dict(data.get("rolling"))
+        return True
+
+    def estimated_capacity(self) -> float:
+        """Capacity including the power-based flows not yet seen on the indexes."""
+        capacity = self.capacity or 0.0
+        if self.export_power is not None:
+            capacity += self.export_power.energy_kwh
+        if self.import_power is not None:
+            capacity = max(capacity - self.import_power.energy_kwh, 0.0)
+        return capacity
+
+    def snapshot(self) -> BatterySnapshot:
+        return BatterySnapshot(
+            battery_in=self.battery_in or 0.0,
+            battery_out=self.battery_out or 0.0,
+            capacity=self.estimated_capacity(),
+            base_emulated=self.base_emulated or 0.0,
+            injection_emulated=self.injection_emulated,
+            depletion_time=self.forecast.depletion_time,
+            month_end_capacity=self.forecast.month_end_capacity,
+            ratios=self.rolling.ratios(),
+            cost_energy=self.cost_energy,
+            cost_acheminement=self.cost_acheminement,
+            injection_credit=self.injection_credit,
+            base_emulated_hp=self.base_emulated_hp,
+            base_emulated_hc=self.base_emulated_hc,
+            battery_out_hp=self.battery_out_hp,
+            battery_out_hc=self.battery_out_hc,
+            bill_period_start=self.bill_period_start,
+            bill_energy=self.bill_energy,
+            bill_acheminement=self.bill_acheminement,
+        )
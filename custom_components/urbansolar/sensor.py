@@ -1,14 +1,21 @@
-import asyncio
+from datetime import timedelta
+
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, EntityCategory
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.restore_state import RestoreEntity
-from homeassistant.helpers.event import async_track_state_change, async_track_time_change
+from homeassistant.helpers.event import (
+    async_track_state_change_event,
+    async_track_time_change,
+    async_track_time_interval,
+)
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 from homeassistant.core import callback
+from homeassistant.util import dt as dt_util
 import logging
+import time
 
 from .const import (
     DOMAIN,
-    CONF_INDEX_BASE_SENSOR,
-    CONF_INDEX_INJECTION_SENSOR,
     CONF_START_BATTERY_ENERGY,
     CONF_REBUILD_HISTORY,
     CONF_INDEX_BATTERY_IN,
@@ -17,29 +24,39 @@ from .const import (
     CONF_INDEX_BASE_EMULATED,
     CONF_INDEX_INJECTION_EMULATED,
     CONF_TARIFF_OPTION,
+    SENSOR_BASE_EMULATED_HC,
+    SENSOR_BASE_EMULATED_HP,
+    SENSOR_BATTERY_OUT_HC,
+    SENSOR_BATTERY_OUT_HP,
+    SENSOR_CAPACITY_MONTH_END,
+    SENSOR_COST_ACHEMINEMENT,
+    SENSOR_COST_ENERGY,
+    SENSOR_DEPLETION_FORECAST,
+    SENSOR_ESTIMATED_BILL,
+    SENSOR_INJECTION_CREDIT_VALUE,
     SENSOR_TARIFF_ACH_HC_TTC,
     SENSOR_TARIFF_ACH_HP_TTC,
     SENSOR_TARIFF_ACH_TTC,
     SENSOR_TARIFF_ENERGY_HC_TTC,
     SENSOR_TARIFF_ENERGY_HP_TTC,
     SENSOR_TARIFF_ENERGY_TTC,
+    SENSOR_TARIFF_SUBSCRIPTION_TTC,
     TARIFF_OPTION_HPHC,
+    UNIT_EUR,
     UNIT_EUR_PER_KWH,
 )
-from .tariffs import TariffData
+from .costs import PRICE_KEYS
+from .coordinator import UrbanSolarCoordinator, UrbanSolarTariffCoordinator, _as_float
+from .runtime import SENSOR_FIELDS, UrbanSolarRuntimeData
+from .journal import JOURNAL_FLUSH_INTERVAL_S
+from .power import POWER_ADVANCE_INTERVAL_S
+from .metrics import Histogram
+from .rolling import WINDOWS
 
 _LOGGER = logging.getLogger(__name__)
 
-
-def _as_float(state):
-    if state is None:
-        return None
-    if state.state in ("unknown", "unavailable"):
-        return None
-    try:
-        return float(state.state)
-    except (TypeError, ValueError):
-        return None
+# Only the disabled-by-default diagnostic sensors are polled.
+SCAN_INTERVAL = timedelta(seconds=60)
 
 SENSOR_TYPES = [
     (CONF_INDEX_BATTERY_IN, "Battery In", "kWh",
@@ -74,161 +91,197 @@ TARIFF_SENSOR_TYPES_HPHC = [
     (SENSOR_TARIFF_ACH_HC_TTC, "Tarif Acheminement HC TTC", UNIT_EUR_PER_KWH, None, {"state_class": "measurement"}),
 ]
 
+# (unique_id, name, BatterySnapshot attribute, unit, device_class)
+FORECAST_SENSOR_TYPES = [
+    (SENSOR_DEPLETION_FORECAST, "Battery Depletion Forecast", "depletion_time", None, "timestamp"),
+    (SENSOR_CAPACITY_MONTH_END, "Battery Capacity Month End Forecast", "month_end_capacity", "kWh",
+     "energy_storage"),
+]
+
+# (unique_id, name, BatterySnapshot attribute)
+COST_SENSOR_TYPES = [
+    (SENSOR_COST_ENERGY, "Base Emulated Energy Cost", "cost_energy"),
+    (SENSOR_COST_ACHEMINEMENT, "Battery Out Acheminement Cost", "cost_acheminement"),
+    (SENSOR_INJECTION_CREDIT_VALUE, "Injection Credit Value", "injection_credit"),
+]
+
+# (unique_id, name, BatterySnapshot attribute)
+SPLIT_SENSOR_TYPES = [
+    (SENSOR_BASE_EMULATED_HP, "Base Emulated HP", "base_emulated_hp"),
+    (SENSOR_BASE_EMULATED_HC, "Base Emulated HC", "base_emulated_hc"),
+    (SENSOR_BATTERY_OUT_HP, "Battery Out HP", "battery_out_hp"),
+    (SENSOR_BATTERY_OUT_HC, "Battery Out HC", "battery_out_hc"),
+]
+
+# (unique_id, name, key in BatterySnapshot.ratios)
+RATIO_SENSOR_TYPES = [
+    sensor
+    for _, label in WINDOWS
+    for sensor in (
+        (f"battery_coverage_{label}", f"Battery Coverage {label}", f"coverage_{label}"),
+        (f"injection_consumed_{label}", f"Injection Consumed {label}", f"injection_consumed_{label}"),
+    )
+]
+
+# (unique_id, name, LiveMetrics attribute, unit)
+DIAGNOSTIC_SENSOR_TYPES = [
+    ("live_source_events", "Live Source Events", "source_events", None),
+    ("live_recomputes", "Live Recomputes", "recomputes", None),
+    ("live_recomputes_coalesced", "Live Recomputes Coalesced", "recomputes_coalesced", None),
+    ("live_state_writes", "Live State Writes", "state_writes", None),
+    ("live_negative_deltas_clamped", "Live Negative Deltas Clamped", "negative_deltas_clamped", None),
+    ("live_reconcile_corrections", "Live Reconcile Corrections", "reconcile_corrections", None),
+    ("live_calc_lock_wait", "Live Calc Lock Wait", "lock_wait_ms", "ms"),
+    ("live_recompute_latency", "Live Recompute Latency", "recompute_ms", "ms"),
+]
+
 async def async_setup_entry(hass, config_entry, async_add_entities):
     """Set up UrbanSolar sensors from a config entry."""
-    # Stocke les données de config pour accès global
-    hass.data.setdefault(DOMAIN, {})
-    hass.data[DOMAIN][config_entry.entry_id] = config_entry.data
-
-    sensors = []
-    for sensor_id, name, unit, device_class, attributes in SENSOR_TYPES:
-        sensor = UrbanSolarSensor(hass, config_entry, name, sensor_id, unit, device_class, attributes)
-        sensors.append(sensor)
-        hass.data[DOMAIN][sensor_id] = sensor  # Stocke l'entité dans les données de l'intégration
+    runtime: UrbanSolarRuntimeData = config_entry.runtime_data
+    coordinator = UrbanSolarCoordinator(hass, config_entry, runtime)
+    runtime.coordinator = coordinator
+
+    sensors = [
+        UrbanSolarSensor(coordinator, config_entry, name, sensor_id, unit, device_class, attributes)
+        for sensor_id, name, unit, device_class, attributes in SENSOR_TYPES
+    ]
+    if coordinator.needs_restore:
+        # Le premier calcul attend que chaque capteur ait restauré son état.
+        coordinator.expect_restores(len(sensors))
+    sensors.extend(
+        UrbanSolarForecastSensor(coordinator, config_entry, name, unique_id, field, unit, device_class)
+        for unique_id, name, field, unit, device_class in FORECAST_SENSOR_TYPES
+    )
+    sensors.extend(
+        UrbanSolarRatioSensor(coordinator, config_entry, name, unique_id, key)
+        for unique_id, name, key in RATIO_SENSOR_TYPES
+    )
 
     tariff_option = config_entry.data.get(CONF_TARIFF_OPTION)
+    if tariff_option == TARIFF_OPTION_HPHC:
+        sensors.extend(
+            UrbanSolarSplitSensor(coordinator, config_entry, name, unique_id, field)
+            for unique_id, name, field in SPLIT_SENSOR_TYPES
+        )
+    if tariff_option in PRICE_KEYS:
+        sensors.extend(
+            UrbanSolarCostSensor(coordinator, config_entry, name, unique_id, field)
+            for unique_id, name, field in COST_SENSOR_TYPES
+        )
     if tariff_option:
-        hass.data[DOMAIN].setdefault("tariff_data", {})
-        tariff_data = TariffData(hass, config_entry)
-        hass.data[DOMAIN]["tariff_data"][config_entry.entry_id] = tariff_data
+        # Sous-système tarifaire chargé uniquement pour les entrées qui l'utilisent.
+        from .tariffs import TariffData, async_get_tariff_service
+
+        tariff_data = TariffData(
+            hass, config_entry, runtime.tariff_store, async_get_tariff_service(hass)
+        )
+        tariff_coordinator = UrbanSolarTariffCoordinator(hass, config_entry, tariff_data)
+        runtime.tariff_data = tariff_data
+        runtime.tariff_coordinator = tariff_coordinator
+        if tariff_option in PRICE_KEYS:
+            sensors.append(
+                UrbanSolarBillSensor(coordinator, config_entry, tariff_data, tariff_coordinator)
+            )
         tariff_sensors = (
             TARIFF_SENSOR_TYPES_HPHC
             if tariff_option == TARIFF_OPTION_HPHC
             else TARIFF_SENSOR_TYPES_BASE
         )
-        created_tariff_sensors = []
         for sensor_id, name, unit, device_class, attributes in tariff_sensors:
-            sensor = UrbanSolarTariffSensor(
-                hass,
-                config_entry,
-                name,
-                sensor_id,
-                unit,
-                device_class,
-                attributes,
-                tariff_data,
+            sensors.append(
+                UrbanSolarTariffSensor(
+                    tariff_coordinator,
+                    config_entry,
+                    name,
+                    sensor_id,
+                    unit,
+                    device_class,
+                    attributes,
+                )
             )
-            sensors.append(sensor)
-            created_tariff_sensors.append(sensor)
 
-        async def _run_monthly_tariff_update():
-            await tariff_data.async_update(force=True)
-            for entity in created_tariff_sensors:
-                await entity.async_update_ha_state(force_refresh=True)
+        # Mises à jour (mensuelle, vérification de la page, nouvelles tentatives) partagées par toutes les entrées.
+        config_entry.async_on_unload(tariff_data.service.async_subscribe(tariff_coordinator))
+        config_entry.async_create_background_task(
+            hass, tariff_coordinator.async_refresh(), "urbansolar initial tariff update"
+        )
+    sensors.extend(
+        UrbanSolarDiagnosticSensor(config_entry, runtime.metrics, unique_id, name, metric, unit)
+        for unique_id, name, metric, unit in DIAGNOSTIC_SENSOR_TYPES
+    )
+    async_add_entities(sensors)
+    if not coordinator.needs_restore:
+        config_entry.async_create_task(hass, coordinator.async_refresh())
+    config_entry.async_create_background_task(
+        hass, coordinator.async_seed_forecast(), "urbansolar forecast seed"
+    )
 
-        @callback
-        def _monthly_tariff_update(now):
-            if now.day != 1:
-                return
-            hass.async_create_task(_run_monthly_tariff_update())
-
-        remove_listener = async_track_time_change(
-            hass,
-            _monthly_tariff_update,
-            hour=0,
-            minute=0,
-            second=0,
+    @callback
+    def _flush_journal(*_):
+        config_entry.async_create_background_task(
+            hass, coordinator.async_flush_journal(), "urbansolar journal flush"
         )
-        config_entry.async_on_unload(remove_listener)
-    async_add_entities(sensors, True)
-
-    calc_locks = hass.data[DOMAIN].setdefault("calc_locks", {})
-    calc_lock = calc_locks.setdefault(config_entry.entry_id, asyncio.Lock())
-
-    async def _recompute_from_sources():
-        async with calc_lock:
-            config = hass.data[DOMAIN][config_entry.entry_id]
-            base_entity_id = config.get(CONF_INDEX_BASE_SENSOR)
-            injection_entity_id = config.get(CONF_INDEX_INJECTION_SENSOR)
-
-            base = _as_float(hass.states.get(base_entity_id)) if base_entity_id else None
-            injection = _as_float(hass.states.get(injection_entity_id)) if injection_entity_id else None
-
-            sensor_battery_in = hass.data[DOMAIN].get(CONF_INDEX_BATTERY_IN)
-            sensor_battery_out = hass.data[DOMAIN].get(CONF_INDEX_BATTERY_OUT)
-            sensor_capacity = hass.data[DOMAIN].get(CONF_CAPACITY_BATTERY)
-            sensor_base_emulated = hass.data[DOMAIN].get(CONF_INDEX_BASE_EMULATED)
-            sensor_injection_emulated = hass.data[DOMAIN].get(CONF_INDEX_INJECTION_EMULATED)
-
-            if not all((sensor_battery_in, sensor_battery_out, sensor_capacity, sensor_base_emulated)):
-                return
-
-            battery_in_total = sensor_battery_in._state or 0.0
-            battery_out_total = sensor_battery_out._state or 0.0
-
-            last_injection = getattr(sensor_battery_in, "_last_injection", None)
-            last_base = getattr(sensor_battery_out, "_last_base", None)
-
-            delta_inj = 0.0
-            if injection is not None:
-                if last_injection is None:
-                    last_injection = injection
-                else:
-                    delta_inj = injection - last_injection
-                    if delta_inj > 0:
-                        battery_in_total += delta_inj
-                    last_injection = injection
-                if sensor_injection_emulated is not None:
-                    sensor_injection_emulated._state = injection
-
-            delta_base = 0.0
-            if base is not None:
-                if last_base is None:
-                    last_base = base
-                else:
-                    delta_base = base - last_base
-                    if delta_base > 0:
-                        capacity_before = max(battery_in_total - battery_out_total, 0.0)
-                        delta_out = min(delta_base, capacity_before)
-                        battery_out_total += delta_out
-                    last_base = base
-
-            capacity = max(battery_in_total - battery_out_total, 0.0)
-            base_emulated_total = sensor_base_emulated._state or 0.0
-            if base is not None:
-                base_emulated_total = max(base - battery_out_total, 0.0)
-
-            sensor_battery_in._state = battery_in_total
-            sensor_battery_out._state = battery_out_total
-            sensor_capacity._state = capacity
-            sensor_base_emulated._state = base_emulated_total
-            if sensor_injection_emulated is not None and injection is not None:
-                sensor_injection_emulated._state = injection
-
-            sensor_battery_in._last_injection = last_injection
-            sensor_battery_out._last_base = last_base
-            sensor_base_emulated._last_base = last_base
-            sensor_base_emulated._last_injection = last_injection
-
-            sensor_battery_in.async_write_ha_state()
-            sensor_battery_out.async_write_ha_state()
-            sensor_capacity.async_write_ha_state()
-            sensor_base_emulated.async_write_ha_state()
-            if sensor_injection_emulated is not None and injection is not None:
-                sensor_injection_emulated.async_write_ha_state()
-
-    hass.data[DOMAIN].setdefault("recompute", {})[config_entry.entry_id] = _recompute_from_sources
 
     @callback
-    def _source_update(entity_id, old_state, new_state):
-        hass.async_create_task(_recompute_from_sources())
-
-    if config_entry.data.get(CONF_INDEX_BASE_SENSOR):
-        remove_base = async_track_state_change(
-            hass,
-            config_entry.data[CONF_INDEX_BASE_SENSOR],
-            _source_update,
+    def _compact_journal(now):
+        config_entry.async_create_background_task(
+            hass, coordinator.async_compact_journal(), "urbansolar journal compaction"
         )
-        config_entry.async_on_unload(remove_base)
-    if config_entry.data.get(CONF_INDEX_INJECTION_SENSOR):
-        remove_inj = async_track_state_change(
-            hass,
-            config_entry.data[CONF_INDEX_INJECTION_SENSOR],
-            _source_update,
+
+    config_entry.async_on_unload(
+        async_track_time_interval(hass, _flush_journal, timedelta(seconds=JOURNAL_FLUSH_INTERVAL_S))
+    )
+    config_entry.async_on_unload(hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _flush_journal))
+    config_entry.async_on_unload(
+        async_track_time_change(hass, _compact_journal, hour=3, minute=40, second=0)
+    )
+
+    @callback
+    def _hourly_reconcile(now):
+        config_entry.async_create_background_task(
+            hass, coordinator.async_run_reconcile(), "urbansolar reconcile"
         )
-        config_entry.async_on_unload(remove_inj)
 
-    hass.async_create_task(_recompute_from_sources())
+    # Les statistiques horaires sont compilées quelques minutes après l'heure.
+    config_entry.async_on_unload(
+        async_track_time_change(hass, _hourly_reconcile, minute=15, second=0)
+    )
+
+    # Ferme l'heure de la prévision et des fenêtres glissantes même sans variation des index.
+    config_entry.async_on_unload(
+        async_track_time_change(hass, coordinator.async_hourly_tick, minute=0, second=30)
+    )
+
+    if coordinator.reduce_writes and coordinator.min_write_interval:
+        throttled_sensors = [sensor for sensor in sensors if isinstance(sensor, UrbanSolarThrottledEntity)]
+
+        @callback
+        def _flush_before_hour_end(now):
+            # Les statistiques horaires utilisent le dernier état de l'heure écoulée.
+            for sensor in throttled_sensors:
+                sensor.async_flush_pending_write()
+
+        config_entry.async_on_unload(
+            async_track_time_change(hass, _flush_before_hour_end, minute=59, second=59)
+        )
+
+    if coordinator.source_entity_ids:
+        remove_sources = async_track_state_change_event(
+            hass, coordinator.source_entity_ids, coordinator.async_source_update
+        )
+        config_entry.async_on_unload(remove_sources)
+    if coordinator.power_entity_ids:
+        coordinator.async_seed_power()
+        remove_power = async_track_state_change_event(
+            hass, coordinator.power_entity_ids, coordinator.async_power_update
+        )
+        config_entry.async_on_unload(remove_power)
+        # Une puissance stable ne déclenche aucun événement.
+        config_entry.async_on_unload(
+            async_track_time_interval(
+                hass, coordinator.async_advance_power, timedelta(seconds=POWER_ADVANCE_INTERVAL_S)
+            )
+        )
 
     if config_entry.data.get(CONF_REBUILD_HISTORY):
         _LOGGER.info(
@@ -236,78 +289,89 @@ async def async_setup_entry(hass, config_entry, async_add_entities):
             "Run the on-demand service 'urbansolar.rebuild_history' to start it."
         )
 
-class UrbanSolarSensor(RestoreEntity, Entity):  # Hérite de RestoreEntity
+class UrbanSolarThrottledEntity(CoordinatorEntity[UrbanSolarCoordinator]):
+    """Entity of the battery coordinator whose state writes follow the recorder write options."""
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        self._written_state = None
+        self._last_write_ts = 0.0
+        self._write_pending = False
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if not self.coordinator.reduce_writes:
+            self.async_write_ha_state()
+            return
+
+        state = self.state
+        if state == self._written_state:
+            self._write_pending = False
+            return
+
+        now = time.time()
+        interval = self.coordinator.min_write_interval
+        if (
+            interval
+            and now - self._last_write_ts < interval
+            and int(now // 3600) == int(self._last_write_ts // 3600)
+        ):
+            self._write_pending = True
+            return
+        self._async_write_throttled(state, now)
+
+    @callback
+    def async_flush_pending_write(self) -> None:
+        """Write a value held back by the minimum write interval."""
+        if self._write_pending:
+            self._async_write_throttled(self.state, time.time())
+
+    @callback
+    def async_write_ha_state(self) -> None:
+        self.coordinator.runtime.metrics.state_writes += 1
+        super().async_write_ha_state()
+
+    @callback
+    def _async_write_throttled(self, state, now: float) -> None:
+        self._written_state = state
+        self._last_write_ts = now
+        self._write_pending = False
+        self.async_write_ha_state()
+
+
+class UrbanSolarSensor(UrbanSolarThrottledEntity, RestoreEntity):
     """Representation of an Urban Solar Sensor."""
 
     async def async_added_to_hass(self):
         """Restaure l'état précédent à l'ajout."""
+        await super().async_added_to_hass()
+        if self._unique_id == CONF_CAPACITY_BATTERY and self.coordinator.power_entity_ids:
+            # La capacité estimée suit aussi les capteurs de puissance.
+            self.async_on_remove(
+                self.coordinator.async_add_capacity_listener(self._handle_coordinator_update)
+            )
+        if not self.coordinator.needs_restore:
+            return
+        default = 0.0
+        if self._unique_id in (CONF_INDEX_BATTERY_IN, CONF_CAPACITY_BATTERY):
+            default = float(self.config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0) or 0.0)
         last_state = await self.async_get_last_state()
-        if self._unique_id == CONF_CAPACITY_BATTERY:
-            if last_state is not None and last_state.state not in ("unknown", "unavailable"):
-                try:
-                    self._state = float(last_state.state)
-                except ValueError:
-                    self._state = self.config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0)
-            else:
-                self._state = self.config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0)
-        elif self._unique_id == CONF_INDEX_BATTERY_IN:
-            if last_state is not None and last_state.state not in ("unknown", "unavailable"):
-                try:
-                    self._state = float(last_state.state)
-                except ValueError:
-                    self._state = self.config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0)
-            else:
-                self._state = self.config_entry.data.get(CONF_START_BATTERY_ENERGY, 0.0)
-        elif self._unique_id == CONF_INDEX_BATTERY_OUT:
-            if last_state is not None and last_state.state not in ("unknown", "unavailable"):
-                try:
-                    self._state = float(last_state.state)
-                except ValueError:
-                    self._state = 0.0
-            else:
-                self._state = 0.0
-        elif self._unique_id == CONF_INDEX_BASE_EMULATED:
-            if last_state is not None and last_state.state not in ("unknown", "unavailable"):
-                try:
-                    self._state = float(last_state.state)
-                except ValueError:
-                    self._state = 0.0
-            else:
-                self._state = 0.0
-        elif self._unique_id == CONF_INDEX_INJECTION_EMULATED:
-            if last_state is not None and last_state.state not in ("unknown", "unavailable"):
-                try:
-                    self._state = float(last_state.state)
-                except ValueError:
-                    self._state = 0.0
-            else:
-                self._state = 0.0
-
-    async def _trigger_update(self, entity_id, old_state, new_state):
-        """Déclenche une mise à jour de l'état."""
-        await self.async_update_ha_state(force_refresh=True)
-
-    def __init__(self, hass, config_entry, name, unique_id, unit, device_class, attributes):
-        self.hass = hass
+        self._state = _as_float(last_state)
+        if self._state is None:
+            self._state = default
+        setattr(self.coordinator.runtime, self._field, self._state)
+        self.coordinator.async_entity_restored()
+
+    def __init__(self, coordinator, config_entry, name, unique_id, unit, device_class, attributes):
+        super().__init__(coordinator)
         self.config_entry = config_entry
         self._name = name
         self._unique_id = unique_id
         self._unit = unit
         self._device_class = device_class
         self._attributes = attributes
-        # Initialisation de la batterie à la création
-        if self._unique_id == CONF_CAPACITY_BATTERY:
-            self._state = None
-        elif self._unique_id == CONF_INDEX_BATTERY_IN:
-            self._state = 0.0
-        elif self._unique_id == CONF_INDEX_BATTERY_OUT:
-            self._state = 0.0
-        elif self._unique_id == CONF_INDEX_BASE_EMULATED:
-            self._state = 0.0
-        elif self._unique_id == CONF_INDEX_INJECTION_EMULATED:
-            self._state = 0.0
-        else:
-            self._state = None
+        self._field = SENSOR_FIELDS[unique_id]
+        self._state = None
 
     @property
     def name(self):
@@ -317,14 +381,16 @@ class UrbanSolarSensor(RestoreEntity, Entity):  # Hérite de RestoreEntity
     @property
     def unique_id(self):
         """Return a unique ID for this sensor."""
-        return self._unique_id
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
 
     @property
     def state(self):
         """Return the state of the sensor arrondi à 3 décimales."""
-        if self._state is None:
+        snapshot = self.coordinator.data
+        value = getattr(snapshot, self._field) if snapshot is not None else self._state
+        if value is None:
             return None
-        return round(self._state, 3)
+        return round(value, 3)
 
     @property
     def unit_of_measurement(self):
@@ -342,20 +408,6 @@ class UrbanSolarSensor(RestoreEntity, Entity):  # Hérite de RestoreEntity
     def suggested_object_id(self):
         return SUGGESTED_OBJECT_IDS.get(self._unique_id)
 
-    @property
-    def should_poll(self):
-        return False
-
-    def update(self):
-        # Ici, tu dois mettre à jour self._state avec la vraie valeur
-        pass
-
-    async def async_update(self):
-        """Met à jour l'état du capteur (piloté par les sources base/injection)."""
-        recompute = self.hass.data.get(DOMAIN, {}).get("recompute", {}).get(self.config_entry.entry_id)
-        if recompute:
-            await recompute()
-
     @property
     def device_info(self):
         """Retourne les infos de l'appareil pour rattacher les entités à un device."""
@@ -368,19 +420,32 @@ class UrbanSolarSensor(RestoreEntity, Entity):  # Hérite de RestoreEntity
         }
 
 
-class UrbanSolarTariffSensor(Entity):
+class UrbanSolarTariffSensor(CoordinatorEntity[UrbanSolarTariffCoordinator]):
     """Representation of an Urban Solar Tariff Sensor."""
 
-    def __init__(self, hass, config_entry, name, unique_id, unit, device_class, attributes, tariff_data):
-        self.hass = hass
+    _unrecorded_attributes = frozenset(
+        {
+            "tariff_option",
+            "subscribed_power_kva",
+            "source_url",
+            "effective_date",
+            "last_update",
+            "last_error",
+            "retry_count",
+            "next_retry",
+            "stale",
+        }
+    )
+
+    def __init__(self, coordinator, config_entry, name, unique_id, unit, device_class, attributes):
+        super().__init__(coordinator)
         self.config_entry = config_entry
         self._name = name
         self._unique_id = unique_id
         self._unit = unit
         self._device_class = device_class
         self._attributes = attributes or {}
-        self._tariff_data = tariff_data
-        self._state = None
+        self._tariff_data = coordinator.tariff_data
 
     @property
     def name(self):
@@ -388,13 +453,15 @@ class UrbanSolarTariffSensor(Entity):
 
     @property
     def unique_id(self):
-        return self._unique_id
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
 
     @property
     def state(self):
-        if self._state is None:
+        values = self.coordinator.data
+        value = values.get(self._unique_id) if values else None
+        if value is None:
             return None
-        return round(self._state, 4)
+        return round(value, 4)
 
     @property
     def unit_of_measurement(self):
@@ -406,19 +473,17 @@ class UrbanSolarTariffSensor(Entity):
 
     @property
     def extra_state_attributes(self):
-        return self._attributes
-
-    async def async_update(self):
-        await self._tariff_data.async_update()
-        self._state = self._tariff_data.values.get(self._unique_id)
-        self._attributes = {
-            **(self._attributes or {}),
+        return {
+            **self._attributes,
             "tariff_option": self._tariff_data.tariff_option,
             "subscribed_power_kva": self._tariff_data.subscribed_power,
             "source_url": self._tariff_data.source_url,
             "effective_date": self._tariff_data.effective_date,
             "last_update": self._tariff_data.last_update,
             "last_error": self._tariff_data.last_error,
+            "retry_count": self._tariff_data.failures,
+            "next_retry": self._tariff_data.next_retry.isoformat() if self._tariff_data.next_retry else None,
+            "stale": self._tariff_data.stale,
         }
 
     @property
@@ -430,3 +495,331 @@ class UrbanSolarTariffSensor(Entity):
             "model": "Battery Integration",
             "entry_type": "service",
         }
+
+
+class UrbanSolarForecastSensor(CoordinatorEntity[UrbanSolarCoordinator]):
+    """Depletion date / month-end capacity projected from the hourly averages."""
+
+    def __init__(self, coordinator, config_entry, name, unique_id, field, unit, device_class):
+        super().__init__(coordinator)
+        self.config_entry = config_entry
+        self._name = name
+        self._unique_id = unique_id
+        self._field = field
+        self._unit = unit
+        self._device_class = device_class
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    @property
+    def state(self):
+        value = getattr(self.coordinator.data, self._field, None)
+        if value is None:
+            return None
+        if self._device_class == "timestamp":
+            return value.isoformat()
+        return round(value, 3)
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def device_class(self):
+        return self._device_class
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
+
+
+class UrbanSolarRatioSensor(UrbanSolarThrottledEntity):
+    """Share of consumption covered by the battery / of injection consumed over a rolling window."""
+
+    def __init__(self, coordinator, config_entry, name, unique_id, key):
+        super().__init__(coordinator)
+        self.config_entry = config_entry
+        self._name = name
+        self._unique_id = unique_id
+        self._key = key
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    @property
+    def state(self):
+        ratios = getattr(self.coordinator.data, "ratios", None) or {}
+        value = ratios.get(self._key)
+        if value is None:
+            return None
+        return round(value, 1)
+
+    @property
+    def unit_of_measurement(self):
+        return "%"
+
+    @property
+    def extra_state_attributes(self):
+        return {"state_class": "measurement"}
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
+
+
+class UrbanSolarSplitSensor(UrbanSolarThrottledEntity):
+    """Part of an emulated flow counted in peak (HP) or off-peak (HC) hours."""
+
+    def __init__(self, coordinator, config_entry, name, unique_id, field):
+        super().__init__(coordinator)
+        self.config_entry = config_entry
+        self._name = name
+        self._unique_id = unique_id
+        self._field = field
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    @property
+    def state(self):
+        value = getattr(self.coordinator.data, self._field, None)
+        if value is None:
+            return None
+        return round(value, 3)
+
+    @property
+    def unit_of_measurement(self):
+        return "kWh"
+
+    @property
+    def device_class(self):
+        return "energy"
+
+    @property
+    def extra_state_attributes(self):
+        return {"state_class": "total_increasing"}
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
+
+
+class UrbanSolarCostSensor(UrbanSolarThrottledEntity):
+    """EUR total of the emulated flows, each hour priced with the tariff then in force."""
+
+    def __init__(self, coordinator, config_entry, name, unique_id, field):
+        super().__init__(coordinator)
+        self.config_entry = config_entry
+        self._name = name
+        self._unique_id = unique_id
+        self._field = field
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    @property
+    def state(self):
+        value = getattr(self.coordinator.data, self._field, None)
+        if value is None:
+            return None
+        return round(value, 2)
+
+    @property
+    def unit_of_measurement(self):
+        return UNIT_EUR
+
+    @property
+    def device_class(self):
+        return "monetary"
+
+    @property
+    def extra_state_attributes(self):
+        return {"state_class": "total"}
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
+
+
+class UrbanSolarBillSensor(UrbanSolarThrottledEntity):
+    """Estimated bill of the current month: subscription fee plus energy and acheminement costs."""
+
+    _unrecorded_attributes = frozenset({"subscription_fee", "energy_cost", "acheminement_cost"})
+
+    def __init__(self, coordinator, config_entry, tariff_data, tariff_coordinator):
+        super().__init__(coordinator)
+        self.config_entry = config_entry
+        self._name = "Estimated Bill"
+        self._unique_id = SENSOR_ESTIMATED_BILL
+        self._tariff_data = tariff_data
+        self._tariff_coordinator = tariff_coordinator
+
+    async def async_added_to_hass(self):
+        await super().async_added_to_hass()
+        # L'abonnement vient des tarifs : une nouvelle version doit apparaître sans attendre les index.
+        self.async_on_remove(self._tariff_coordinator.async_add_listener(self._handle_tariff_update))
+
+    @callback
+    def _handle_tariff_update(self) -> None:
+        # Mises à jour rares : écrites sans attendre l'intervalle minimal d'écriture.
+        if self.coordinator.reduce_writes and self.state == self._written_state:
+            return
+        self._async_write_throttled(self.state, time.time())
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    def _subscription_fee(self):
+        data = self.coordinator.data
+        if data is None or data.bill_period_start is None:
+            return None
+        # Abonnement en vigueur au début de la période de facturation.
+        version = self._tariff_data.timeline.at(data.bill_period_start) or {}
+        return version.get(SENSOR_TARIFF_SUBSCRIPTION_TTC)
+
+    @property
+    def state(self):
+        data = self.coordinator.data
+        if data is None or data.bill_period_start is None:
+            return None
+        fee = self._subscription_fee() or 0.0
+        return round(fee + (data.bill_energy or 0.0) + (data.bill_acheminement or 0.0), 2)
+
+    @property
+    def unit_of_measurement(self):
+        return UNIT_EUR
+
+    @property
+    def device_class(self):
+        return "monetary"
+
+    @property
+    def extra_state_attributes(self):
+        data = self.coordinator.data
+        if data is None or data.bill_period_start is None:
+            return {"state_class": "total"}
+        energy = data.bill_energy or 0.0
+        acheminement = data.bill_acheminement or 0.0
+        return {
+            "state_class": "total",
+            "last_reset": dt_util.utc_from_timestamp(data.bill_period_start).isoformat(),
+            "subscription_fee": self._subscription_fee(),
+            "energy_cost": round(energy, 2),
+            "acheminement_cost": round(acheminement, 2),
+        }
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
+
+
+class UrbanSolarDiagnosticSensor(Entity):
+    """Expose one live-path counter or latency histogram (disabled by default)."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _unrecorded_attributes = frozenset({"count", "max_ms", "buckets"})
+
+    def __init__(self, config_entry, metrics, unique_id, name, metric, unit):
+        self.config_entry = config_entry
+        self._metrics = metrics
+        self._unique_id = unique_id
+        self._name = name
+        self._metric = metric
+        self._unit = unit
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unique_id(self):
+        return f"{self.config_entry.entry_id}_{self._unique_id}"
+
+    @property
+    def state(self):
+        value = getattr(self._metrics, self._metric)
+        if isinstance(value, Histogram):
+            return round(value.mean, 4)
+        return value
+
+    @property
+    def unit_of_measurement(self):
+        return self._unit
+
+    @property
+    def extra_state_attributes(self):
+        value = getattr(self._metrics, self._metric)
+        if isinstance(value, Histogram):
+            return {
+                "count": value.count,
+                "max_ms": round(value.max, 4),
+                "buckets": value.buckets(),
+            }
+        return None
+
+    @property
+    def device_info(self):
+        return {
+            "identifiers": {(DOMAIN, self.config_entry.entry_id)},
+            "name": "Urban Solar",
+            "manufacturer": "Urban Solar",
+            "model": "Battery Integration",
+            "entry_type": "service",
+        }
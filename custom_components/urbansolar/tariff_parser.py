@@ -0,0 +1,190 @@
+"""Extraction of the Urban Solar prices from the tariff PDF.
+
+Imported by the parse worker (``tariff_worker``) only: pdfplumber (and pdfminer) are heavy to import.
+"""
+from __future__ import annotations
+
+import io
+import re
+from typing import Dict, List, Optional, Tuple
+
+import pdfplumber
+
+from .const import (
+    SENSOR_TARIFF_ACH_HC_TTC,
+    SENSOR_TARIFF_ACH_HP_TTC,
+    SENSOR_TARIFF_ACH_TTC,
+    SENSOR_TARIFF_ENERGY_HC_TTC,
+    SENSOR_TARIFF_ENERGY_HP_TTC,
+    SENSOR_TARIFF_ENERGY_TTC,
+    SENSOR_TARIFF_SUBSCRIPTION_TTC,
+    TARIFF_OPTION_HPHC,
+)
+
+_NUM_RE = re.compile(r"^\d+,\d{1,4}$")
+_DATE_RE = re.compile(r"^(\d{2}/\d{2}/\d{4})")
+_KVA_VALUES = {3, 6, 9, 12, 15, 18, 24, 30, 36}
+
+
+def parse_pdf(pdf_bytes: bytes, option: str, power_kva: int) -> Dict[str, object]:
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        if not pdf.pages:
+            raise ValueError("PDF has no pages")
+
+        page = pdf.pages[0]
+        # One extraction pass: the date, the kVA rows and the prices all come from these words.
+        words = page.extract_words(use_text_flow=True) or []
+        return parse_words(words, page.height, option, power_kva)
+
+
+def parse_words(
+    words: List[Dict[str, object]], page_height: float, option: str, power_kva: int
+) -> Dict[str, object]:
+    """Prices of ``power_kva`` from the words of the first page (``text``, ``x0``, ``x1``, ``top``, ``bottom``)."""
+    effective_date = _find_effective_date(words)
+
+    kva_rows = _find_kva_rows(words, page_height)
+    target_y = kva_rows.get(power_kva)
+    num_words = _crop_to_table(_extract_number_words(words), kva_rows)
+    kwh_values = [(x, y, val) for x, y, val in num_words if val < 1]
+
+    expected_clusters = 4 if option == TARIFF_OPTION_HPHC else 2
+    clusters = _cluster_by_x(kwh_values, expected_clusters)
+    if len(clusters) != expected_clusters:
+        raise ValueError("Could not detect expected price columns")
+
+    values: Dict[str, float] = {}
+    if option == TARIFF_OPTION_HPHC:
+        values[SENSOR_TARIFF_ENERGY_HP_TTC] = _pick_ttc(clusters[0])
+        values[SENSOR_TARIFF_ENERGY_HC_TTC] = _pick_ttc(clusters[1])
+        values[SENSOR_TARIFF_ACH_HP_TTC] = _pick_ttc(clusters[2])
+        values[SENSOR_TARIFF_ACH_HC_TTC] = _pick_ttc(clusters[3])
+    else:
+        values[SENSOR_TARIFF_ENERGY_TTC] = _pick_ttc(clusters[0], target_y)
+        values[SENSOR_TARIFF_ACH_TTC] = _pick_ttc(clusters[1], target_y)
+    values[SENSOR_TARIFF_SUBSCRIPTION_TTC] = _pick_subscription(num_words, kva_rows, target_y)
+
+    return {"values": values, "effective_date": effective_date}
+
+
+def _find_effective_date(words: List[Dict[str, object]]) -> Optional[str]:
+    """The ``dd/mm/yyyy`` date following an "Au" word on the same line."""
+    dates = [word for word in words if _DATE_RE.match(str(word.get("text", "")))]
+    for word in words:
+        if word.get("text") != "Au":
+            continue
+        following = [
+            date
+            for date in dates
+            if abs(float(date["top"]) - float(word["top"])) < 2 and float(date["x0"]) >= float(word["x1"])
+        ]
+        if following:
+            nearest = min(following, key=lambda date: float(date["x0"]))
+            return _DATE_RE.match(str(nearest["text"])).group(1)
+    return None
+
+
+def _extract_number_words(words: List[Dict[str, object]]) -> List[Tuple[float, float, float]]:
+    numbers: List[Tuple[float, float, float]] = []
+    for word in words:
+        text = str(word.get("text", ""))
+        if not _NUM_RE.match(text):
+            continue
+        value = _parse_number(text)
+        if value is None:
+            continue
+        x = (float(word["x0"]) + float(word["x1"])) / 2
+        y = (float(word["top"]) + float(word["bottom"])) / 2
+        numbers.append((x, y, value))
+    return numbers
+
+
+def _find_kva_rows(words: List[Dict[str, object]], page_height: float) -> Dict[int, float]:
+    candidates: List[Tuple[float, float, int]] = []
+    for word in words:
+        text = str(word.get("text", ""))
+        if not text.isdigit():
+            continue
+        value = int(text)
+        if value not in _KVA_VALUES:
+            continue
+        x = (float(word["x0"]) + float(word["x1"])) / 2
+        y = (float(word["top"]) + float(word["bottom"])) / 2
+        candidates.append((x, y, value))
+
+    if not candidates:
+        return {}
+
+    min_x = min(x for x, _, _ in candidates)
+    left = [c for c in candidates if c[0] <= min_x + 30]
+    if not left:
+        left = candidates
+
+    y_max = page_height * 0.6
+    left = [c for c in left if c[1] <= y_max]
+
+    rows: Dict[int, float] = {}
+    for _, y, value in left:
+        if value not in rows or y < rows[value]:
+            rows[value] = y
+    return rows
+
+
+def _crop_to_table(
+    numbers: List[Tuple[float, float, float]], kva_rows: Dict[int, float]
+) -> List[Tuple[float, float, float]]:
+    """Keep the numbers within the rows of the kVA table, give or take one row.
+
+    Footnotes and headers around the table are left out of the column
+    detection; without at least two kVA rows the table is not located and
+    every number is kept.
+    """
+    if len(kva_rows) < 2:
+        return numbers
+    ys = sorted(kva_rows.values())
+    pitch = max(b - a for a, b in zip(ys, ys[1:]))
+    top, bottom = ys[0] - pitch, ys[-1] + pitch
+    return [item for item in numbers if top <= item[1] <= bottom]
+
+
+def _cluster_by_x(values: List[Tuple[float, float, float]], k: int) -> List[List[Tuple[float, float, float]]]:
+    """Split ``values`` into ``k`` columns at the ``k - 1`` widest gaps between sorted x positions."""
+    if not values or len(values) < k:
+        return []
+
+    ordered = sorted(values, key=lambda v: v[0])
+    # Ties between equal gaps go to the leftmost one, so the split never depends on input order.
+    gaps = sorted(range(1, len(ordered)), key=lambda i: (ordered[i - 1][0] - ordered[i][0], i))[: k - 1]
+    if any(ordered[i][0] == ordered[i - 1][0] for i in gaps):
+        # Fewer distinct x positions than columns.
+        return []
+    bounds = [0, *sorted(gaps), len(ordered)]
+    return [ordered[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def _pick_ttc(cluster: List[Tuple[float, float, float]], target_y: Optional[float] = None) -> Optional[float]:
+    if not cluster:
+        return None
+    candidates = cluster
+    if target_y is not None and len(cluster) > 2:
+        candidates = sorted(cluster, key=lambda v: abs(v[1] - target_y))[:2]
+    return max(v[2] for v in candidates)
+
+
+def _pick_subscription(
+    numbers: List[Tuple[float, float, float]], kva_rows: Dict[int, float], target_y: Optional[float]
+) -> Optional[float]:
+    """Subscription fee TTC: the largest amount of at least 1 EUR on the row of the subscribed power."""
+    if target_y is None:
+        return None
+    ys = sorted(kva_rows.values())
+    half_row = min((b - a for a, b in zip(ys, ys[1:])), default=10.0) / 2
+    row = [value for _, y, value in numbers if value >= 1 and abs(y - target_y) < half_row]
+    return max(row) if row else None
+
+
+def _parse_number(text: str) -> Optional[float]:
+    try:
+        return float(text.replace(",", "."))
+    except ValueError:
+        return None
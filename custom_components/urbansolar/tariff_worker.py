@@ -0,0 +1,50 @@
+"""Child process side of the tariff PDF parsing.
+
+Run with ``runpy.run_path`` in a ``spawn`` child, so that the integration
+package is never imported there: its ``__init__`` pulls in Home Assistant,
+which would cost hundreds of MiB and seconds per parse under the memory limit.
+Only ``const`` and ``tariff_parser`` are loaded, from this directory.
+"""
+from __future__ import annotations
+
+import importlib
+import os
+import sys
+import types
+
+RUN_NAME = "__urbansolar_tariff_worker__"
+_PACKAGE = "_urbansolar_tariff_worker"
+
+
+def load_parser():
+    """Import ``tariff_parser`` (and ``const``) without the package ``__init__``."""
+    if _PACKAGE not in sys.modules:
+        package = types.ModuleType(_PACKAGE)
+        package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+        sys.modules[_PACKAGE] = package
+    return importlib.import_module(f"{_PACKAGE}.tariff_parser")
+
+
+def main(conn, pdf_bytes: bytes, option: str, power_kva: int, memory_limit: int) -> None:
+    """Parse under an address space limit and send (ok, result or error)."""
+    try:
+        import resource
+    except ImportError:  # Not available on Windows.
+        resource = None
+    if resource is not None and memory_limit:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard == resource.RLIM_INFINITY or hard > memory_limit:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, hard))
+    try:
+        conn.send((True, load_parser().parse_pdf(pdf_bytes, option, power_kva)))
+    except MemoryError:
+        conn.send((False, f"PDF parsing exceeded the {memory_limit // (1024 * 1024)} MiB memory limit"))
+    except Exception as err:  # pylint: disable=broad-except
+        conn.send((False, f"{type(err).__name__}: {err}"))
+    finally:
+        conn.close()
+
+
+if __name__ == RUN_NAME:
+    # Arguments passed by the parent through ``run_path(init_globals=...)``.
+    main(*globals()["WORKER_ARGS"])
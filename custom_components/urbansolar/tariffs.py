@@ -1,40 +1,76 @@
 from __future__ import annotations
 
 import asyncio
-import io
+import hashlib
+import random
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 from urllib.parse import urljoin
 
-import pdfplumber
-
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_point_in_utc_time
 from homeassistant.util import dt as dt_util
 
 from .const import (
     CONF_SUBSCRIBED_POWER,
     CONF_TARIFF_OPTION,
-    SENSOR_TARIFF_ACH_HC_TTC,
-    SENSOR_TARIFF_ACH_HP_TTC,
-    SENSOR_TARIFF_ACH_TTC,
-    SENSOR_TARIFF_ENERGY_HC_TTC,
-    SENSOR_TARIFF_ENERGY_HP_TTC,
-    SENSOR_TARIFF_ENERGY_TTC,
+    DOMAIN,
     TARIFF_OPTION_BASE,
     TARIFF_OPTION_HPHC,
 )
+from .timeline import TariffTimeline
 
 import logging
 
 _LOGGER = logging.getLogger(__name__)
 
 _TARIFFS_URL = "https://www.urbansolarenergy.fr/tarifs/"
-_NUM_RE = re.compile(r"^\d+,\d{1,4}$")
-_KVA_VALUES = {3, 6, 9, 12, 15, 18, 24, 30, 36}
+
+# Timeout of each request to the tariffs page or PDF.
+FETCH_TIMEOUT_S = 30
+
+# Limits of the PDF parser process.
+PARSE_TIMEOUT_S = 120
+PARSE_MEMORY_LIMIT = 1024 * 1024 * 1024
+
+# Refresh schedule: a conditional GET of the tariffs page every PAGE_CHECK_INTERVAL
+# (the PDF is only downloaded when its link changed), a full conditional refresh
+# at the start of each month (delayed by up to MONTHLY_JITTER_S), and retries
+# after a failure with an exponential backoff from RETRY_BASE_S up to RETRY_MAX_S.
+PAGE_CHECK_INTERVAL = timedelta(hours=6)
+MONTHLY_JITTER_S = 1800
+RETRY_BASE_S = 300
+RETRY_MAX_S = 6 * 3600
+# A download failure is shared with the entries refreshed in the same burst for this
+# long; strictly shorter than the smallest backoff (RETRY_BASE_S / 2) so that the
+# scheduled retry of each entry always downloads again.
+SHARED_ERROR_WINDOW_S = 60
+# Tariffs last checked longer ago than this (or before this month's refresh) are refreshed at startup.
+MAX_STALENESS = timedelta(days=1)
+
+
+# Bumped when the parser extracts new values, so that cached tariffs are parsed again.
+PARSER_VERSION = 2
+
+# Fields of the persisted tariff cache (besides the option / power it was parsed for).
+_CACHE_FIELDS = (
+    "values",
+    "source_url",
+    "effective_date",
+    "last_update",
+    "etag",
+    "last_modified",
+    "page_etag",
+    "page_last_modified",
+    "pdf_sha256",
+)
 
 
 class TariffData:
-    def __init__(self, hass, config_entry):
+    def __init__(self, hass, config_entry, store=None, service=None):
         self.hass = hass
         self.config_entry = config_entry
         self.values: Dict[str, float] = {}
@@ -42,6 +78,20 @@ class TariffData:
         self.effective_date: Optional[str] = None
         self.last_update: Optional[str] = None
         self.last_error: Optional[str] = None
+        # Consecutive failed refreshes and the time of the next attempt.
+        self.failures = 0
+        self.next_retry: Optional[datetime] = None
+        # HTTP validators of the PDF and of the tariffs page.
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.page_etag: Optional[str] = None
+        self.page_last_modified: Optional[str] = None
+        self.pdf_sha256: Optional[str] = None
+        # Every version seen so far, to price past periods with the prices then in force.
+        self.timeline = TariffTimeline()
+        self._store = store
+        self._cache_loaded = store is None
+        self.service = service if service is not None else TariffService(hass)
         self._lock = asyncio.Lock()
 
     @property
@@ -56,45 +106,354 @@ class TariffData:
         except (TypeError, ValueError):
             return 6
 
+    @property
+    def stale(self) -> bool:
+        """Whether the tariffs were last checked too long ago, or before this month's refresh."""
+        checked = dt_util.parse_datetime(self.last_update or "")
+        if checked is None:
+            return True
+        return dt_util.utcnow() - checked > MAX_STALENESS or checked < _month_start()
+
     async def async_update(self, force: bool = False) -> None:
-        if not force and self.last_update:
+        if not self._cache_loaded:
+            await self._async_load_cache()
+        if not force and self.last_update and not self.stale:
             return
 
         async with self._lock:
-            if not force and self.last_update:
+            if not force and self.last_update and not self.stale:
                 return
 
             try:
-                session = async_get_clientsession(self.hass)
-                html = await _fetch_text(session, _TARIFFS_URL)
-                pdf_url = _find_pdf_url(html, self.tariff_option)
-                if not pdf_url:
-                    raise ValueError("No matching PDF found on tariffs page")
-
-                pdf_bytes = await _fetch_bytes(session, pdf_url)
-                result = await self.hass.async_add_executor_job(
-                    _parse_pdf, pdf_bytes, self.tariff_option, self.subscribed_power
+                await self.service.async_update(self)
+                self.timeline.add(
+                    self.effective_date, self.values, dt_util.parse_datetime(self.last_update or "")
                 )
-                self.values = result["values"]
-                self.effective_date = result.get("effective_date")
-                self.source_url = pdf_url
-                self.last_update = dt_util.utcnow().isoformat()
                 self.last_error = None
+                self.failures = 0
+                self.next_retry = None
+                if self._store is not None:
+                    await self._store.async_save(self._as_cache())
             except Exception as err:  # pylint: disable=broad-except
                 self.last_error = str(err)
-                _LOGGER.error("Failed to update Urban Solar tariffs: %s", err)
+                self.failures += 1
+                self.next_retry = dt_util.utcnow() + _retry_delay(self.failures)
+                _LOGGER.error(
+                    "Failed to update Urban Solar tariffs (attempt %s, next at %s): %s",
+                    self.failures,
+                    self.next_retry.isoformat(),
+                    err,
+                )
+            self.service.async_reschedule()
 
+    async def _async_load_cache(self) -> None:
+        """Serve the tariffs parsed before the restart, if they match the current option and power."""
+        self._cache_loaded = True
+        data = await self._store.async_load()
+        if not data:
+            return
+        if data.get("tariff_option") != self.tariff_option or data.get("subscribed_power") != self.subscribed_power:
+            return
+        for field in _CACHE_FIELDS:
+            setattr(self, field, data.get(field))
+        if data.get("parser_version") != PARSER_VERSION:
+            # Served until the PDF, downloaded again without validators, is parsed at startup.
+            self.pdf_sha256 = None
+            self.last_update = None
+        self.values = {key: float(value) for key, value in (self.values or {}).items() if value is not None}
+        self.timeline.load_list(data.get("timeline"))
+        if not self.timeline:
+            # Cache written before the timeline existed.
+            self.timeline.add(self.effective_date, self.values, dt_util.parse_datetime(self.last_update or ""))
+
+    def _as_cache(self) -> Dict[str, object]:
+        return {
+            "tariff_option": self.tariff_option,
+            "subscribed_power": self.subscribed_power,
+            "parser_version": PARSER_VERSION,
+            **{field: getattr(self, field) for field in _CACHE_FIELDS},
+            "timeline": self.timeline.as_list(),
+        }
+
+
+class _TariffSource:
+    """Last download of the tariffs page and PDF for one option."""
+
+    __slots__ = (
+        "lock",
+        "round",
+        "check_round",
+        "error",
+        "failed_at",
+        "page_etag",
+        "page_last_modified",
+        "pdf_url",
+        "etag",
+        "last_modified",
+        "pdf_sha256",
+        "pdf_bytes",
+        "checked_at",
+    )
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        # Refresh round of the last download attempt (-1: never downloaded).
+        self.round = -1
+        # Page check round of the last link check.
+        self.check_round = -1
+        # Last download failure (monotonic time), re-raised to other entries for SHARED_ERROR_WINDOW_S.
+        self.error: Optional[Exception] = None
+        self.failed_at = 0.0
+        self.page_etag: Optional[str] = None
+        self.page_last_modified: Optional[str] = None
+        self.pdf_url: Optional[str] = None
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.pdf_sha256: Optional[str] = None
+        # Kept in memory so that other subscribed powers can be parsed without a download.
+        self.pdf_bytes: Optional[bytes] = None
+        self.checked_at: Optional[str] = None
+
+    def seed(self, tariff_data: TariffData) -> None:
+        """Reuse the validators persisted by an entry, when they identify the PDF content."""
+        if not tariff_data.pdf_sha256 or not tariff_data.source_url:
+            return
+        self.page_etag = tariff_data.page_etag
+        self.page_last_modified = tariff_data.page_last_modified
+        self.pdf_url = tariff_data.source_url
+        self.etag = tariff_data.etag
+        self.last_modified = tariff_data.last_modified
+        self.pdf_sha256 = tariff_data.pdf_sha256
 
-async def _fetch_text(session, url: str) -> str:
-    async with session.get(url, timeout=30) as resp:
-        resp.raise_for_status()
-        return await resp.text()
 
+class TariffService:
+    """Tariff downloads and parses shared by every config entry.
+
+    The page and the PDF of an option are downloaded once per refresh round,
+    parsed results are memoised by (PDF content hash, subscribed power), and a
+    single timer drives the monthly rounds, the page checks and the retries of
+    all subscribed entries.
+    """
 
-async def _fetch_bytes(session, url: str) -> bytes:
-    async with session.get(url, timeout=30) as resp:
+    def __init__(self, hass: HomeAssistant) -> None:
+        self.hass = hass
+        self._sources: Dict[str, _TariffSource] = {}
+        self._parsed: Dict[Tuple[str, int], Dict[str, object]] = {}
+        self._round = 0
+        self._check_round = 0
+        self._coordinators: List[object] = []
+        self._unsub_timer: Optional[Callable[[], None]] = None
+        self._next_round: Optional[datetime] = None
+        self._next_check: Optional[datetime] = None
+        # Set while the timer's refreshes run; the timer is re-armed once they are done.
+        self._refreshing = False
+
+    @callback
+    def async_subscribe(self, coordinator) -> Callable[[], None]:
+        """Refresh ``coordinator`` (which exposes ``tariff_data``) at each round, check and retry."""
+        self._coordinators.append(coordinator)
+        if self._next_round is None:
+            self._next_round = _next_month_start() + timedelta(seconds=random.uniform(0, MONTHLY_JITTER_S))
+            self._next_check = dt_util.utcnow() + PAGE_CHECK_INTERVAL
+        self.async_reschedule()
+
+        @callback
+        def _unsubscribe() -> None:
+            self._coordinators.remove(coordinator)
+            if not self._coordinators:
+                self._next_round = self._next_check = None
+                if self._unsub_timer is not None:
+                    self._unsub_timer()
+                    self._unsub_timer = None
+
+        return _unsubscribe
+
+    async def async_update(self, tariff_data: TariffData) -> None:
+        """Bring ``tariff_data`` up to date with the current round, downloading at most once per option."""
+        option = tariff_data.tariff_option
+        source = self._sources.get(option)
+        if source is None:
+            source = self._sources[option] = _TariffSource()
+            source.seed(tariff_data)
+
+        async with source.lock:
+            if source.round != self._round or source.check_round != self._check_round:
+                # A failed download leaves the round open; other entries share its error
+                # for a while instead of retrying it at once.
+                if source.error is not None and time.monotonic() - source.failed_at < SHARED_ERROR_WINDOW_S:
+                    raise source.error
+                try:
+                    await self._async_download(source, option, check_only=source.round == self._round)
+                except Exception as err:
+                    source.error = err
+                    source.failed_at = time.monotonic()
+                    raise
+                source.error = None
+                source.round = self._round
+                source.check_round = self._check_round
+
+            power = tariff_data.subscribed_power
+            if not (tariff_data.values and tariff_data.pdf_sha256 == source.pdf_sha256):
+                result = self._parsed.get((source.pdf_sha256, power))
+                if result is None:
+                    if source.pdf_bytes is None:
+                        # 304 on validators from a previous run: the content is needed for this power.
+                        source.pdf_bytes, source.etag, source.last_modified = await _fetch_conditional(
+                            async_get_clientsession(self.hass), source.pdf_url, None, None
+                        )
+                        source.pdf_sha256 = hashlib.sha256(source.pdf_bytes).hexdigest()
+                    result = await self.hass.async_add_executor_job(
+                        _parse_pdf_job, source.pdf_bytes, option, power
+                    )
+                    self._parsed[(source.pdf_sha256, power)] = result
+                tariff_data.values = result["values"]
+                tariff_data.effective_date = result.get("effective_date")
+            tariff_data.source_url = source.pdf_url
+            tariff_data.etag = source.etag
+            tariff_data.last_modified = source.last_modified
+            tariff_data.page_etag = source.page_etag
+            tariff_data.page_last_modified = source.page_last_modified
+            tariff_data.pdf_sha256 = source.pdf_sha256
+            tariff_data.last_update = source.checked_at
+
+    async def _async_download(self, source: _TariffSource, option: str, check_only: bool = False) -> None:
+        """Refresh the page and the PDF of ``option``; with ``check_only``, the PDF only if its link changed."""
+        session = async_get_clientsession(self.hass)
+        html, page_etag, page_last_modified = await _fetch_conditional(
+            session, _TARIFFS_URL, source.page_etag, source.page_last_modified, as_text=True
+        )
+        # 304: the page did not change, neither did the PDF link.
+        pdf_url = source.pdf_url if html is None else _find_pdf_url(html, option)
+        if not pdf_url:
+            raise ValueError("No matching PDF found on tariffs page")
+
+        same_pdf = pdf_url == source.pdf_url and source.pdf_sha256 is not None
+        if check_only and same_pdf:
+            source.page_etag = page_etag
+            source.page_last_modified = page_last_modified
+            source.checked_at = dt_util.utcnow().isoformat()
+            return
+        if check_only:
+            _LOGGER.info("New Urban Solar tariff PDF published: %s", pdf_url)
+        pdf_bytes, etag, last_modified = await _fetch_conditional(
+            session,
+            pdf_url,
+            source.etag if same_pdf else None,
+            source.last_modified if same_pdf else None,
+        )
+        if pdf_bytes is not None:
+            source.pdf_bytes = pdf_bytes
+            source.pdf_sha256 = hashlib.sha256(pdf_bytes).hexdigest()
+            self._prune()
+        else:
+            _LOGGER.debug("Urban Solar tariff PDF not modified; cached values kept")
+        source.pdf_url = pdf_url
+        source.etag = etag
+        source.last_modified = last_modified
+        source.page_etag = page_etag
+        source.page_last_modified = page_last_modified
+        source.checked_at = dt_util.utcnow().isoformat()
+
+    def _prune(self) -> None:
+        """Forget the parses of PDFs that no option serves anymore."""
+        current = {source.pdf_sha256 for source in self._sources.values()}
+        for key in [key for key in self._parsed if key[0] not in current]:
+            del self._parsed[key]
+
+    @callback
+    def async_reschedule(self) -> None:
+        """Re-arm the timer after the retry time of an entry changed."""
+        if self._coordinators and not self._refreshing:
+            self._schedule()
+
+    def _schedule(self) -> None:
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+        retries = [
+            coordinator.tariff_data.next_retry
+            for coordinator in self._coordinators
+            if coordinator.tariff_data.next_retry is not None
+        ]
+        self._unsub_timer = async_track_point_in_utc_time(
+            self.hass, self._handle_timer, min([self._next_round, self._next_check, *retries])
+        )
+
+    @callback
+    def _handle_timer(self, now: datetime) -> None:
+        self._unsub_timer = None
+        if now >= self._next_round:
+            self._round += 1
+            self._next_round = _next_month_start() + timedelta(seconds=random.uniform(0, MONTHLY_JITTER_S))
+            self._next_check = now + PAGE_CHECK_INTERVAL
+            due = list(self._coordinators)
+        elif now >= self._next_check:
+            self._check_round += 1
+            self._next_check = now + PAGE_CHECK_INTERVAL
+            due = list(self._coordinators)
+        else:
+            due = [
+                coordinator
+                for coordinator in self._coordinators
+                if coordinator.tariff_data.next_retry is not None and coordinator.tariff_data.next_retry <= now
+            ]
+        self._refreshing = True
+        self.hass.async_create_background_task(self._async_refresh(due), "urbansolar tariff update")
+
+    async def _async_refresh(self, coordinators: List[object]) -> None:
+        try:
+            await asyncio.gather(*(coordinator.async_force_refresh() for coordinator in coordinators))
+        finally:
+            self._refreshing = False
+            self.async_reschedule()
+
+
+@callback
+def async_get_tariff_service(hass: HomeAssistant) -> TariffService:
+    """Return the tariff service shared by the entries of the integration."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if "tariff_service" not in data:
+        data["tariff_service"] = TariffService(hass)
+    return data["tariff_service"]
+
+
+def _month_start() -> datetime:
+    """First day of this month at local midnight, in UTC."""
+    today = dt_util.start_of_local_day()
+    return dt_util.as_utc(dt_util.start_of_local_day(today.replace(day=1).date()))
+
+
+def _next_month_start() -> datetime:
+    """First day of next month at local midnight, in UTC."""
+    today = dt_util.start_of_local_day()
+    first = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return dt_util.as_utc(dt_util.start_of_local_day(first.date()))
+
+
+def _retry_delay(failures: int) -> timedelta:
+    """Exponential backoff with equal jitter, so that installations do not retry in step."""
+    delay = min(RETRY_BASE_S * 2 ** min(failures - 1, 16), RETRY_MAX_S)
+    return timedelta(seconds=delay / 2 + random.uniform(0, delay / 2))
+
+
+async def _fetch_conditional(
+    session,
+    url: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    as_text: bool = False,
+) -> Tuple[object, Optional[str], Optional[str]]:
+    """GET ``url`` with the given validators; the body is None on 304 Not Modified."""
+    headers = {}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    async with session.get(url, timeout=FETCH_TIMEOUT_S, headers=headers) as resp:
+        if resp.status == 304:
+            return None, etag, last_modified
         resp.raise_for_status()
-        return await resp.read()
+        body = await resp.text() if as_text else await resp.read()
+        return body, resp.headers.get("ETag"), resp.headers.get("Last-Modified")
 
 
 def _find_pdf_url(html: str, option: str) -> Optional[str]:
@@ -122,129 +481,61 @@ def _find_pdf_url(html: str, option: str) -> Optional[str]:
     return urljoin(_TARIFFS_URL, candidates[0])
 
 
-def _parse_pdf(pdf_bytes: bytes, option: str, power_kva: int) -> Dict[str, object]:
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        if not pdf.pages:
-            raise ValueError("PDF has no pages")
-
-        page = pdf.pages[0]
-        text = page.extract_text() or ""
-        effective_date = None
-        date_match = re.search(r"Au\s+(\d{2}/\d{2}/\d{4})", text)
-        if date_match:
-            effective_date = date_match.group(1)
-
-        words = page.extract_words(use_text_flow=True) or []
-        num_words = _extract_number_words(words)
-        kwh_values = [(x, y, val) for x, y, val in num_words if val < 1]
-
-        expected_clusters = 4 if option == TARIFF_OPTION_HPHC else 2
-        clusters = _cluster_by_x(kwh_values, expected_clusters)
-        if len(clusters) != expected_clusters:
-            raise ValueError("Could not detect expected price columns")
-
-        kva_rows = _find_kva_rows(words, page.height)
-        target_y = kva_rows.get(power_kva)
-
-        values: Dict[str, float] = {}
-        if option == TARIFF_OPTION_HPHC:
-            values[SENSOR_TARIFF_ENERGY_HP_TTC] = _pick_ttc(clusters[0])
-            values[SENSOR_TARIFF_ENERGY_HC_TTC] = _pick_ttc(clusters[1])
-            values[SENSOR_TARIFF_ACH_HP_TTC] = _pick_ttc(clusters[2])
-            values[SENSOR_TARIFF_ACH_HC_TTC] = _pick_ttc(clusters[3])
-        else:
-            values[SENSOR_TARIFF_ENERGY_TTC] = _pick_ttc(clusters[0], target_y)
-            values[SENSOR_TARIFF_ACH_TTC] = _pick_ttc(clusters[1], target_y)
-
-        return {"values": values, "effective_date": effective_date}
-
-
-def _extract_number_words(words: List[Dict[str, object]]) -> List[Tuple[float, float, float]]:
-    numbers: List[Tuple[float, float, float]] = []
-    for word in words:
-        text = str(word.get("text", ""))
-        if not _NUM_RE.match(text):
-            continue
-        value = _parse_number(text)
-        if value is None:
-            continue
-        x = (float(word["x0"]) + float(word["x1"])) / 2
-        y = (float(word["top"]) + float(word["bottom"])) / 2
-        numbers.append((x, y, value))
-    return numbers
-
-
-def _find_kva_rows(words: List[Dict[str, object]], page_height: float) -> Dict[int, float]:
-    candidates: List[Tuple[float, float, int]] = []
-    for word in words:
-        text = str(word.get("text", ""))
-        if not text.isdigit():
-            continue
-        value = int(text)
-        if value not in _KVA_VALUES:
-            continue
-        x = (float(word["x0"]) + float(word["x1"])) / 2
-        y = (float(word["top"]) + float(word["bottom"])) / 2
-        candidates.append((x, y, value))
+def _parse_pdf_job(pdf_bytes: bytes, option: str, power_kva: int) -> Dict[str, object]:
+    """Executor job: parse the PDF in a child process, in this thread if none can be started.
 
-    if not candidates:
-        return {}
-
-    min_x = min(x for x, _, _ in candidates)
-    left = [c for c in candidates if c[0] <= min_x + 30]
-    if not left:
-        left = candidates
-
-    y_max = page_height * 0.6
-    left = [c for c in left if c[1] <= y_max]
-
-    rows: Dict[int, float] = {}
-    for _, y, value in left:
-        if value not in rows or y < rows[value]:
-            rows[value] = y
-    return rows
-
-
-def _cluster_by_x(values: List[Tuple[float, float, float]], k: int) -> List[List[Tuple[float, float, float]]]:
-    if not values or len(values) < k:
-        return []
-
-    xs = [v[0] for v in values]
-    xs_sorted = sorted(xs)
-    centers = [
-        xs_sorted[int(i * (len(xs_sorted) - 1) / (k - 1))] for i in range(k)
-    ]
-
-    for _ in range(10):
-        clusters: List[List[Tuple[float, float, float]]] = [[] for _ in range(k)]
-        for item in values:
-            idx = min(range(k), key=lambda i: abs(item[0] - centers[i]))
-            clusters[idx].append(item)
-        new_centers = []
-        for i, cluster in enumerate(clusters):
-            if cluster:
-                new_centers.append(sum(v[0] for v in cluster) / len(cluster))
-            else:
-                new_centers.append(centers[i])
-        if new_centers == centers:
-            break
-        centers = new_centers
-
-    clusters = [c for _, c in sorted(zip(centers, clusters), key=lambda t: t[0])]
-    return clusters
-
-
-def _pick_ttc(cluster: List[Tuple[float, float, float]], target_y: Optional[float] = None) -> Optional[float]:
-    if not cluster:
-        return None
-    candidates = cluster
-    if target_y is not None and len(cluster) > 2:
-        candidates = sorted(cluster, key=lambda v: abs(v[1] - target_y))[:2]
-    return max(v[2] for v in candidates)
+    pdfplumber holds the GIL for seconds on small hardware; in a separate
+    process it cannot stall the event loop. Only the PDF bytes are sent to the
+    child and only the small result dict comes back.
+    """
+    import multiprocessing
+    import runpy
 
+    from . import tariff_worker
 
-def _parse_number(text: str) -> Optional[float]:
     try:
-        return float(text.replace(",", "."))
-    except ValueError:
-        return None
+        context = multiprocessing.get_context("spawn")
+        receiver, sender = context.Pipe(duplex=False)
+        # The child runs the worker file, not a function of this package: importing
+        # the package there would import Home Assistant too.
+        process = context.Process(
+            target=runpy.run_path,
+            args=(tariff_worker.__file__,),
+            kwargs={
+                "init_globals": {"WORKER_ARGS": (sender, pdf_bytes, option, power_kva, PARSE_MEMORY_LIMIT)},
+                "run_name": tariff_worker.RUN_NAME,
+            },
+            name="urbansolar-tariff-parser",
+            daemon=True,
+        )
+        process.start()
+    except (ImportError, NotImplementedError, OSError, AssertionError) as err:
+        # No subprocesses here (sandboxed interpreter, daemonic parent...).
+        _LOGGER.debug("Urban Solar tariff PDF parsed in-thread: %s", err)
+        return _parser_module().parse_pdf(pdf_bytes, option, power_kva)
+
+    sender.close()
+    try:
+        if not receiver.poll(PARSE_TIMEOUT_S):
+            process.kill()
+            raise TimeoutError(f"PDF parsing did not finish within {PARSE_TIMEOUT_S} s")
+        try:
+            ok, result = receiver.recv()
+        except EOFError as err:
+            raise RuntimeError(f"PDF parser process exited with code {process.exitcode}") from err
+    finally:
+        receiver.close()
+        process.join(5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+    if not ok:
+        raise ValueError(result)
+    return result
+
+
+def _parser_module():
+    """pdfplumber and the parser are only imported when a PDF is parsed."""
+    from . import tariff_parser
+
+    return tariff_parser
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from datetime import date, datetime
+from typing import Dict, List, Optional, Sequence
+
+from homeassistant.util import dt as dt_util
+
+
+def effective_timestamp(effective_date: str) -> Optional[float]:
+    """UTC timestamp of local midnight of a ``dd/mm/yyyy`` (PDF) or ISO date."""
+    try:
+        if "/" in effective_date:
+            day, month, year = (int(part) for part in effective_date.split("/"))
+            parsed = date(year, month, day)
+        else:
+            parsed = date.fromisoformat(effective_date[:10])
+    except (TypeError, ValueError):
+        return None
+    return dt_util.start_of_local_day(parsed).timestamp()
+
+
+class TariffTimeline:
+    """Tariff versions sorted by the moment they take effect.
+
+    The oldest known version also prices the timestamps before it: older
+    PDFs are not published, and it is the closest estimate available.
+    """
+
+    __slots__ = ("starts", "dates", "versions", "revision")
+
+    def __init__(self) -> None:
+        self.starts: List[float] = []
+        self.dates: List[str] = []
+        self.versions: List[Dict[str, float]] = []
+        # Bumped on every change, so that cached lookups can be invalidated.
+        self.revision = 0
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, effective_date: Optional[str], values: Dict[str, float], fallback: Optional[datetime] = None) -> bool:
+        """Insert or replace the version taking effect on ``effective_date``; return True when it changed.
+
+        ``fallback`` (the download time) dates a PDF without a readable effective date.
+        A version with the same values as the one in force at its start is not inserted.
+        """
+        if not values:
+            return False
+        start = effective_timestamp(effective_date) if effective_date else None
+        if start is None:
+            if fallback is None:
+                return False
+            local = dt_util.as_local(fallback)
+            effective_date = local.date().isoformat()
+            start = dt_util.start_of_local_day(local.date()).timestamp()
+        values = dict(values)
+        index = bisect_right(self.starts, start)
+        if index and self.starts[index - 1] == start:
+            if self.versions[index - 1] == values:
+                return False
+            self.versions[index - 1] = values
+            self.revision += 1
+            return True
+        if self.versions and self.versions[max(index - 1, 0)] == values:
+            # Same prices as the version in force then (e.g. an undated PDF checked again).
+            return False
+        self.starts.insert(index, start)
+        self.dates.insert(index, effective_date)
+        self.versions.insert(index, values)
+        self.revision += 1
+        return True
+
+    def at(self, ts: float) -> Optional[Dict[str, float]]:
+        """Version in force at ``ts`` (O(log n))."""
+        if not self.starts:
+            return None
+        return self.versions[max(bisect_right(self.starts, ts) - 1, 0)]
+
+    def prices(self, timestamps: Sequence[float], key: str) -> List[Optional[float]]:
+        """Price ``key`` at each of the ascending ``timestamps``, in one merge pass."""
+        if not self.starts:
+            return [None] * len(timestamps)
+        prices: List[Optional[float]] = []
+        if not timestamps:
+            return prices
+        starts = self.starts
+        last = len(starts) - 1
+        index = max(bisect_right(starts, timestamps[0]) - 1, 0)
+        price = self.versions[index].get(key)
+        for ts in timestamps:
+            if index < last and starts[index + 1] <= ts:
+                while index < last and starts[index + 1] <= ts:
+                    index += 1
+                price = self.versions[index].get(key)
+            prices.append(price)
+        return prices
+
+    def as_list(self) -> List[dict]:
+        return [
+            {"effective_date": effective_date, "values": values}
+            for effective_date, values in zip(self.dates, self.versions)
+        ]
+
+    def copy(self) -> "TariffTimeline":
+        """Independent copy, safe to read from an executor job."""
+        timeline = TariffTimeline()
+        timeline.starts = list(self.starts)
+        timeline.dates = list(self.dates)
+        timeline.versions = [dict(values) for values in self.versions]
+        timeline.revision = self.revision
+        return timeline
+
+    def load_list(self, data: Optional[List[dict]]) -> None:
+        """Load versions saved by ``as_list``; unreadable items are skipped."""
+        for item in data or []:
+            try:
+                values = {key: float(value) for key, value in item["values"].items() if value is not None}
+            except (AttributeError, KeyError, TypeError, ValueError):
+                continue
+            self.add(item.get("effective_date"), values)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import re
+from typing import List, Optional, Tuple
+
+from homeassistant.util import dt as dt_util
+
+SLOT_S = 1800
+SLOTS_PER_DAY = 86400 // SLOT_S
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+# 1970-01-01 was a Thursday: slots from Monday 00:00 to the epoch.
+_EPOCH_WEEK_SLOT = 3 * SLOTS_PER_DAY
+
+_RANGE_RE = re.compile(r"^(\d{1,2})[:h](\d{2})\s*-\s*(\d{1,2})[:h](\d{2})$")
+
+
+def parse_offpeak_hours(value: str) -> List[Tuple[int, int]]:
+    """Parse ``"22:00-06:00, 12:30-14:30"`` into (start, end) minutes of the day.
+
+    Boundaries must fall on a half hour; a range may wrap past midnight.
+    """
+    ranges = []
+    for part in re.split(r"[,;]", value or ""):
+        part = part.strip()
+        if not part:
+            continue
+        match = _RANGE_RE.match(part)
+        if not match:
+            raise ValueError(f"Invalid off-peak range '{part}' (expected HH:MM-HH:MM)")
+        start_h, start_m, end_h, end_m = (int(group) for group in match.groups())
+        start = start_h * 60 + start_m
+        end = end_h * 60 + end_m
+        if start_h > 24 or end_h > 24 or start > 1440 or end > 1440 or start_m >= 60 or end_m >= 60:
+            raise ValueError(f"Invalid off-peak range '{part}'")
+        if start % 30 or end % 30:
+            raise ValueError(f"Off-peak range '{part}' must start and end on a half hour")
+        if start == end:
+            raise ValueError(f"Empty off-peak range '{part}'")
+        ranges.append((start, end))
+    if not ranges:
+        raise ValueError("No off-peak range given")
+    return ranges
+
+
+class OffPeakSchedule:
+    """Off-peak (HC) schedule compiled into a week of half-hour slots (local time, Monday first).
+
+    ``hour_fraction[slot]`` is the off-peak share of the hour starting at ``slot``,
+    so an hourly row is classified with one index once its local slot is known.
+    """
+
+    __slots__ = ("offpeak", "hour_fraction", "_offset_hour", "_offset")
+
+    def __init__(self, ranges: List[Tuple[int, int]]) -> None:
+        day = [False] * SLOTS_PER_DAY
+        for start, end in ranges:
+            slot = start // 30 % SLOTS_PER_DAY
+            end_slot = end // 30 % SLOTS_PER_DAY
+            while True:
+                day[slot] = True
+                slot = (slot + 1) % SLOTS_PER_DAY
+                if slot == end_slot:
+                    break
+        self.offpeak: List[bool] = day * 7
+        self.hour_fraction: List[float] = [
+            (self.offpeak[slot] + self.offpeak[(slot + 1) % WEEK_SLOTS]) / 2 for slot in range(WEEK_SLOTS)
+        ]
+        self._offset_hour: Optional[int] = None
+        self._offset = 0
+
+    @classmethod
+    def from_string(cls, value: str) -> "OffPeakSchedule":
+        return cls(parse_offpeak_hours(value))
+
+    def is_offpeak(self, ts: float) -> bool:
+        """Whether ``ts`` falls in an off-peak slot (the UTC offset is cached per hour)."""
+        hour = int(ts // 3600)
+        if hour != self._offset_hour:
+            self._offset_hour = hour
+            self._offset = _utc_offset(hour)
+        return self.offpeak[_week_slot(ts, self._offset)]
+
+    def hourly_fractions(self, first_ts: float, last_ts: float) -> Tuple[int, List[float]]:
+        """(first hour, off-peak share of every UTC hour up to ``last_ts``).
+
+        The UTC offset is resolved once per day and bisected on the days it
+        changes, instead of converting every hour.
+        """
+        first_hour = int(first_ts // 3600)
+        last_hour = int(last_ts // 3600)
+        fractions: List[float] = []
+        hour = first_hour
+        offset = _utc_offset(hour)
+        while hour <= last_hour:
+            end = min(hour + 24, last_hour + 1)
+            if _utc_offset(end - 1) != offset:
+                low, high = hour, end - 1
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if _utc_offset(middle) == offset:
+                        low = middle
+                    else:
+                        high = middle
+                end = high
+            fractions.extend(self.hour_fraction[_week_slot(h * 3600, offset)] for h in range(hour, end))
+            hour = end
+            if hour <= last_hour:
+                offset = _utc_offset(hour)
+        return first_hour, fractions
+
+
+def _utc_offset(hour: int) -> int:
+    local = dt_util.as_local(dt_util.utc_from_timestamp(hour * 3600))
+    return int(local.utcoffset().total_seconds())
+
+
+def _week_slot(ts: float, offset: int) -> int:
+    return (int((ts + offset) // SLOT_S) + _EPOCH_WEEK_SLOT) % WEEK_SLOTS
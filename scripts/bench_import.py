@@ -0,0 +1,73 @@
+"""Import time of the integration modules, measured in fresh interpreters.
+
+Each run starts a new Python process, imports the Home Assistant modules the
+integration depends on (already loaded in a running instance), then times the
+import of one integration module and checks whether ``pdfplumber`` was pulled in.
+
+Usage (from the repository root, with the ``requirements.txt`` installed):
+
+    python scripts/bench_import.py --runs 10
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+TARGETS = (
+    "custom_components.urbansolar",
+    "custom_components.urbansolar.sensor",
+    "custom_components.urbansolar.tariffs",
+    "custom_components.urbansolar.tariff_parser",
+)
+
+_PROBE = """
+import importlib, json, sys, time
+import homeassistant.components.sensor, homeassistant.helpers.update_coordinator
+import homeassistant.helpers.event, homeassistant.helpers.storage, aiohttp
+started = time.perf_counter()
+importlib.import_module(sys.argv[1])
+print(json.dumps({"ms": (time.perf_counter() - started) * 1000, "pdfplumber": "pdfplumber" in sys.modules}))
+"""
+
+
+def _measure(target: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, target],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args()
+
+    report = {}
+    for target in TARGETS:
+        samples = [_measure(target) for _ in range(args.runs)]
+        report[target] = {
+            "median_ms": round(statistics.median(sample["ms"] for sample in samples), 2),
+            "pdfplumber_loaded": any(sample["pdfplumber"] for sample in samples),
+        }
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for target, result in report.items():
+            print(f"{target:44} {result['median_ms']:9.2f} ms  pdfplumber={result['pdfplumber_loaded']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+"""Load test of the live recompute path without a running Home Assistant.
+
+The integration is set up on an in-process ``HomeAssistant`` core (real state
+machine, event bus and executor) with a stand-in config entry, then synthetic
+base/injection index streams are replayed at a fixed rate on many entries.
+
+Usage (from the repository root, with the ``requirements.txt`` installed):
+
+    python scripts/bench_live.py --entries 20 --meters 2 --rate 5 --duration 30
+    python scripts/bench_live.py --listener compare --entries 20 --rate 20
+
+``--listener state`` subscribes the source sensors the way the integration did
+before its single state-change event subscription: one deprecated
+``async_track_state_change`` listener per sensor, each event scheduling a
+recompute from the current state of every source. ``--listener compare`` runs
+the same replay with both paths and reports the per-event CPU time of each.
+
+Exits with status 1 when one of the ``--max-*`` gates is exceeded.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from homeassistant.const import EVENT_STATE_CHANGED  # noqa: E402
+from homeassistant.core import HomeAssistant, callback  # noqa: E402
+from homeassistant.helpers import device_registry as dr  # noqa: E402
+from homeassistant.helpers import entity  # noqa: E402
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+from homeassistant.helpers import restore_state  # noqa: E402
+from homeassistant.helpers.entity_platform import EntityPlatform  # noqa: E402
+
+import custom_components.urbansolar as integration  # noqa: E402
+from custom_components.urbansolar import sensor  # noqa: E402
+from custom_components.urbansolar.const import (  # noqa: E402
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_REDUCE_RECORDER_WRITES,
+    CONF_START_BATTERY_ENERGY,
+)
+from custom_components.urbansolar.coordinator import _as_float  # noqa: E402
+from custom_components.urbansolar.metrics import LiveMetrics  # noqa: E402
+
+LAG_PROBE_INTERVAL_S = 0.01
+
+
+class BenchEntry:
+    """The parts of ``ConfigEntry`` used by the integration."""
+
+    version = 3
+    title = "Urban Solar"
+
+    def __init__(self, entry_id: str, data: dict, options: dict) -> None:
+        self.entry_id = entry_id
+        self.data = data
+        self.options = options
+        self.runtime_data = None
+        self._on_unload = []
+
+    def async_on_unload(self, func) -> None:
+        self._on_unload.append(func)
+
+    def add_update_listener(self, listener):
+        return lambda: None
+
+    def async_create_task(self, hass, target, name=None, eager_start=True):
+        return hass.async_create_task(target, name)
+
+    def async_create_background_task(self, hass, target, name, eager_start=True):
+        return hass.async_create_background_task(target, name)
+
+    def async_unload(self) -> None:
+        while self._on_unload:
+            self._on_unload.pop()()
+
+
+async def _async_forward_entry_setups(entry, platforms) -> None:
+    """Platforms are set up by the benchmark itself."""
+
+
+async def _async_make_hass(config_dir: str) -> HomeAssistant:
+    hass = HomeAssistant(config_dir)
+    os.makedirs(hass.config.path(".storage"), exist_ok=True)
+    entity.async_setup(hass)
+    await er.async_load(hass)
+    await dr.async_load(hass)
+    await restore_state.async_load(hass)
+    hass.config_entries = SimpleNamespace(async_forward_entry_setups=_async_forward_entry_setups)
+    return hass
+
+
+def _async_track_state_change_legacy(hass: HomeAssistant, entity_ids, action):
+    """Source subscription of the integration before ``async_track_state_change_event``.
+
+    ``action`` is the coordinator's event handler; it is replaced by a recompute
+    from the current state of all sources, scheduled on every event.
+    """
+    from homeassistant.helpers.event import async_track_state_change  # deprecated
+
+    coordinator = action.__self__
+
+    async def _recompute_from_sources() -> None:
+        values = {}
+        for entity_id in coordinator.source_entity_ids:
+            value = _as_float(hass.states.get(entity_id))
+            if value is not None:
+                values[entity_id] = value
+        async with coordinator.runtime.calc_lock:
+            snapshot = coordinator._apply_source_values(values)
+        coordinator.async_set_updated_data(snapshot)
+
+    @callback
+    def _source_update(entity_id, old_state, new_state) -> None:
+        coordinator.runtime.metrics.source_events += 1
+        hass.async_create_task(_recompute_from_sources())
+
+    removers = [async_track_state_change(hass, entity_id, _source_update) for entity_id in entity_ids]
+
+    def _remove() -> None:
+        for remove in removers:
+            remove()
+
+    return _remove
+
+
+async def _async_setup_bench_entry(hass: HomeAssistant, index: int, args) -> BenchEntry:
+    base_ids = [f"sensor.bench_{index}_base_{meter}" for meter in range(args.meters)]
+    injection_ids = [f"sensor.bench_{index}_injection_{meter}" for meter in range(args.meters)]
+    for entity_id in base_ids + injection_ids:
+        hass.states.async_set(entity_id, "1000.0", {"unit_of_measurement": "kWh"})
+
+    options = {}
+    if args.reduce_writes:
+        options = {
+            CONF_REDUCE_RECORDER_WRITES: True,
+            CONF_MIN_WRITE_INTERVAL: args.min_write_interval,
+        }
+    entry = BenchEntry(
+        f"bench{index}",
+        {
+            CONF_INDEX_BASE_SENSOR: base_ids,
+            CONF_INDEX_INJECTION_SENSOR: injection_ids,
+            CONF_START_BATTERY_ENERGY: 10.0,
+        },
+        options,
+    )
+    await integration.async_setup_entry(hass, entry)
+
+    platform = EntityPlatform(
+        hass=hass,
+        logger=logging.getLogger(__name__),
+        domain="sensor",
+        platform_name="urbansolar",
+        platform=None,
+        scan_interval=sensor.SCAN_INTERVAL,
+        entity_namespace=None,
+    )
+
+    def _add_entities(entities, update_before_add=False) -> None:
+        hass.async_create_task(platform.async_add_entities(entities, update_before_add))
+
+    track = sensor.async_track_state_change_event
+    if args.listener == "state":
+        sensor.async_track_state_change_event = _async_track_state_change_legacy
+    try:
+        await sensor.async_setup_entry(hass, entry, _add_entities)
+    finally:
+        sensor.async_track_state_change_event = track
+    return entry
+
+
+async def _async_probe_loop_lag(stop: asyncio.Event, lags: list) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_INTERVAL_S
+        await asyncio.sleep(LAG_PROBE_INTERVAL_S)
+        lags.append(max(loop.time() - expected, 0.0) * 1000)
+
+
+async def _async_drive_sources(hass: HomeAssistant, entries, args) -> int:
+    """Bump every source index ``args.rate`` times per second, catching up after late wakeups."""
+    sources = [
+        [entity_id, 1000.0]
+        for entry in entries
+        for entity_id in entry.data[CONF_INDEX_BASE_SENSOR] + entry.data[CONF_INDEX_INJECTION_SENSOR]
+    ]
+    rng = random.Random(args.seed)
+    interval = 1.0 / args.rate
+    started = time.monotonic()
+    ticks = 0
+    events = 0
+    while True:
+        elapsed = time.monotonic() - started
+        if elapsed >= args.duration:
+            return events
+        due = int(elapsed / interval) + 1
+        while ticks < due:
+            ticks += 1
+            for source in sources:
+                source[1] += rng.uniform(0.0, 0.05)
+                hass.states.async_set(source[0], f"{source[1]:.3f}", {"unit_of_measurement": "kWh"})
+                events += 1
+        await asyncio.sleep(max(started + ticks * interval - time.monotonic(), 0.0))
+
+
+def _percentile(values: list, percent: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+def _report(entries, args, events: int, wall_s: float, cpu_s: float, lags: list, state_changes: int) -> dict:
+    metrics = [entry.runtime_data.metrics for entry in entries]
+    recomputes = sum(m.recomputes for m in metrics)
+    lock_count = sum(m.lock_wait_ms.count for m in metrics)
+    recompute_count = sum(m.recompute_ms.count for m in metrics)
+    return {
+        "listener": args.listener,
+        "entries": args.entries,
+        "meters_per_role": args.meters,
+        "rate_per_source_hz": args.rate,
+        "duration_s": round(wall_s, 3),
+        "source_events": events,
+        "source_events_per_s": round(events / wall_s, 1),
+        # Event loop and executor CPU time of the replay, source state writes included.
+        "cpu_us_per_event": round(cpu_s / events * 1e6, 2) if events else 0.0,
+        "recomputes": recomputes,
+        "recomputes_per_s": round(recomputes / wall_s, 1),
+        "recomputes_coalesced": sum(m.recomputes_coalesced for m in metrics),
+        "state_writes": sum(m.state_writes for m in metrics),
+        "state_writes_per_s": round(sum(m.state_writes for m in metrics) / wall_s, 1),
+        "derived_state_changes": state_changes,
+        "calc_lock_wait_ms": {
+            "mean": round(sum(m.lock_wait_ms.total for m in metrics) / lock_count, 4) if lock_count else 0.0,
+            "max": round(max((m.lock_wait_ms.max for m in metrics), default=0.0), 4),
+        },
+        "recompute_ms": {
+            "mean": round(sum(m.recompute_ms.total for m in metrics) / recompute_count, 4)
+            if recompute_count
+            else 0.0,
+            "max": round(max((m.recompute_ms.max for m in metrics), default=0.0), 4),
+        },
+        "loop_lag_ms": {
+            "p50": round(_percentile(lags, 50), 3),
+            "p99": round(_percentile(lags, 99), 3),
+            "max": round(max(lags, default=0.0), 3),
+            "mean": round(statistics.fmean(lags), 3) if lags else 0.0,
+        },
+    }
+
+
+async def async_replay(args) -> dict:
+    """Set up ``args.entries`` entries, replay the source streams and return the report."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = await _async_make_hass(config_dir)
+        entries = [await _async_setup_bench_entry(hass, index, args) for index in range(args.entries)]
+        await hass.async_block_till_done()
+
+        source_ids = {
+            entity_id
+            for entry in entries
+            for entity_id in entry.data[CONF_INDEX_BASE_SENSOR] + entry.data[CONF_INDEX_INJECTION_SENSOR]
+        }
+        state_changes = 0
+
+        def _count_state_change(event) -> None:
+            nonlocal state_changes
+            if event.data["entity_id"] not in source_ids:
+                state_changes += 1
+
+        remove_listener = hass.bus.async_listen(EVENT_STATE_CHANGED, _count_state_change)
+        # Only measure the replay, not the setup.
+        for entry in entries:
+            entry.runtime_data.metrics = LiveMetrics()
+
+        stop = asyncio.Event()
+        lags: list = []
+        probe = asyncio.create_task(_async_probe_loop_lag(stop, lags))
+        started = time.monotonic()
+        cpu_started = time.process_time()
+        events = await _async_drive_sources(hass, entries, args)
+        await hass.async_block_till_done()
+        wall_s = time.monotonic() - started
+        cpu_s = time.process_time() - cpu_started
+        stop.set()
+        await probe
+        remove_listener()
+
+        report = _report(entries, args, events, wall_s, cpu_s, lags, state_changes)
+        for entry in entries:
+            entry.async_unload()
+        await hass.async_stop(force=True)
+    return report
+
+
+async def async_main(args) -> int:
+    if args.listener == "compare":
+        reports = [await async_replay(argparse.Namespace(**{**vars(args), "listener": listener}))
+                   for listener in ("state", "event")]
+    else:
+        reports = [await async_replay(args)]
+
+    if args.json:
+        print(json.dumps(reports[0] if len(reports) == 1 else reports))
+    else:
+        for report in reports:
+            for key, value in report.items():
+                print(f"{key:24} {value}")
+            print()
+        if len(reports) == 2 and reports[1]["cpu_us_per_event"]:
+            print(f"{'state/event cpu ratio':24} "
+                  f"{reports[0]['cpu_us_per_event'] / reports[1]['cpu_us_per_event']:.2f}")
+
+    report = reports[-1]
+
+    failures = []
+    if args.max_lag_ms is not None and report["loop_lag_ms"]["p99"] > args.max_lag_ms:
+        failures.append(f"loop lag p99 {report['loop_lag_ms']['p99']} ms > {args.max_lag_ms} ms")
+    if args.max_recompute_ms is not None and report["recompute_ms"]["max"] > args.max_recompute_ms:
+        failures.append(f"recompute max {report['recompute_ms']['max']} ms > {args.max_recompute_ms} ms")
+    if args.max_lock_wait_ms is not None and report["calc_lock_wait_ms"]["max"] > args.max_lock_wait_ms:
+        failures.append(f"calc_lock wait max {report['calc_lock_wait_ms']['max']} ms > {args.max_lock_wait_ms} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10, help="config entries to set up")
+    parser.add_argument("--meters", type=int, default=1, help="base and injection sensors per entry")
+    parser.add_argument("--rate", type=float, default=2.0, help="updates per second of every source sensor")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of replay")
+    parser.add_argument("--reduce-writes", action="store_true", help="enable the recorder write reduction")
+    parser.add_argument("--min-write-interval", type=int, default=0, help="seconds, with --reduce-writes")
+    parser.add_argument(
+        "--listener",
+        choices=("event", "state", "compare"),
+        default="event",
+        help="source subscription: the state-change event one, the former async_track_state_change one, or both",
+    )
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    parser.add_argument("--max-lag-ms", type=float, help="fail when the event loop lag p99 exceeds this")
+    parser.add_argument("--max-recompute-ms", type=float, help="fail when one recompute exceeds this")
+    parser.add_argument("--max-lock-wait-ms", type=float, help="fail when one calc_lock wait exceeds this")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    return asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
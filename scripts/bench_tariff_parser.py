@@ -0,0 +1,273 @@
+"""Parse time, peak memory and expected values of a corpus of tariff documents.
+
+The corpus is a directory of Urban Solar tariff PDFs and tariffs page HTML
+snapshots, each with an expected-values file of the same name:
+
+    BV_PARTICULIER_BASE_2025-08.pdf
+    BV_PARTICULIER_BASE_2025-08.json   {"option": "base", "effective_date": "01/08/2025",
+                                        "powers": {"6": {"tariff_energy_ttc": 0.2016, ...}}}
+    tarifs_2025-08.html
+    tarifs_2025-08.json                {"base": "https://.../BV_PARTICULIER_BASE.pdf",
+                                        "hphc": "https://.../BV_PARTICULIER_HPHC.pdf"}
+
+Each PDF is parsed in this process (the parser, not the child process that
+runs it in Home Assistant) for every power listed, and its parse time (median
+of ``--runs``) and ``tracemalloc`` peak are reported. Each HTML snapshot is
+checked with the PDF link lookup of the integration. Without an expected-values
+file, the option is guessed from the file name and 6 kVA is parsed.
+
+The synthetic word lists of ``tests/fixtures/tariff_parser`` (``*.words.json``:
+the words of a first page, the option and power, and under ``expected`` the
+kVA rows, the numbers cropped out of the table, the price columns and the
+parsed values) and its HTML snapshots are always checked as well; the unit
+tests of the parser read the same fixtures.
+
+Usage (from the repository root, with the ``requirements.txt`` installed):
+
+    python scripts/bench_tariff_parser.py path/to/corpus --runs 5
+    python scripts/bench_tariff_parser.py path/to/corpus --record
+    python scripts/bench_tariff_parser.py
+
+``--record`` writes the current results as the expected values of the
+documents that have none: check them by hand against the PDF before keeping
+them. Exits with status 1 when a document fails to parse, has no expected
+values (without ``--record``) or differs from them, so the corpus doubles as a
+regression check of the parser.
+"""
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from custom_components.urbansolar import tariff_parser  # noqa: E402
+from custom_components.urbansolar.const import TARIFF_OPTION_BASE, TARIFF_OPTION_HPHC  # noqa: E402
+from custom_components.urbansolar.tariffs import _find_pdf_url  # noqa: E402
+
+FIXTURES = os.path.join(ROOT, "tests", "fixtures", "tariff_parser")
+WORDS_SUFFIX = ".words.json"
+
+# Prices are read with at most 4 decimals from the PDF.
+TOLERANCE = 1e-6
+
+
+def _expected_path(path: str) -> str:
+    return os.path.splitext(path)[0] + ".json"
+
+
+def _load_expected(path: str):
+    try:
+        with open(_expected_path(path), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def _guess_option(path: str) -> str:
+    name = os.path.basename(path).upper()
+    return TARIFF_OPTION_HPHC if "HPHC" in name or "HP_HC" in name else TARIFF_OPTION_BASE
+
+
+def _diff_values(expected: dict, actual: dict) -> list:
+    diffs = []
+    for key in sorted(set(expected) | set(actual)):
+        want, got = expected.get(key), actual.get(key)
+        if want is None or got is None:
+            if want != got:
+                diffs.append(f"{key}: expected {want}, got {got}")
+        elif abs(want - got) > TOLERANCE:
+            diffs.append(f"{key}: expected {want}, got {got}")
+    return diffs
+
+
+def _check_pdf(path: str, runs: int, record: bool) -> dict:
+    with open(path, "rb") as fh:
+        pdf_bytes = fh.read()
+    expected = _load_expected(path)
+    option = expected.get("option", _guess_option(path)) if expected else _guess_option(path)
+    powers = [int(power) for power in expected.get("powers", {})] if expected else []
+    powers = powers or [6]
+
+    report = {"document": os.path.basename(path), "kind": "pdf", "kbytes": round(len(pdf_bytes) / 1024, 1)}
+    try:
+        tracemalloc.start()
+        results = {power: tariff_parser.parse_pdf(pdf_bytes, option, power) for power in powers}
+        report["peak_kib"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            tariff_parser.parse_pdf(pdf_bytes, option, powers[0])
+            samples.append((time.perf_counter() - started) * 1000)
+        report["median_ms"] = round(statistics.median(samples), 2)
+    except Exception as err:  # pylint: disable=broad-except
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        report["status"] = f"error: {type(err).__name__}: {err}"
+        return report
+
+    if expected is None:
+        if record:
+            recorded = {
+                "option": option,
+                "effective_date": results[powers[0]]["effective_date"],
+                "powers": {str(power): result["values"] for power, result in results.items()},
+            }
+            with open(_expected_path(path), "w", encoding="utf-8") as fh:
+                json.dump(recorded, fh, indent=2, sort_keys=True)
+            report["status"] = "recorded"
+        else:
+            report["status"] = "missing expected values"
+        return report
+
+    diffs = []
+    for power, result in results.items():
+        if result["effective_date"] != expected.get("effective_date"):
+            diffs.append(f"{power} kVA effective_date: expected {expected.get('effective_date')}, "
+                         f"got {result['effective_date']}")
+        diffs.extend(f"{power} kVA {diff}" for diff in _diff_values(expected["powers"][str(power)], result["values"]))
+    report["status"] = "ok" if not diffs else "mismatch: " + "; ".join(diffs)
+    return report
+
+
+def words_table(document: dict) -> dict:
+    """Intermediate and final results of the parser on a word-list fixture."""
+    words, option, power = document["words"], document["option"], document["power"]
+    kva_rows = tariff_parser._find_kva_rows(words, document["page_height"])
+    numbers = tariff_parser._extract_number_words(words)
+    cropped = tariff_parser._crop_to_table(numbers, kva_rows)
+    clusters = tariff_parser._cluster_by_x(
+        [item for item in cropped if item[2] < 1], 4 if option == TARIFF_OPTION_HPHC else 2
+    )
+    result = tariff_parser.parse_words(words, document["page_height"], option, power)
+    return {
+        "kva_rows": {str(kva): round(y, 2) for kva, y in sorted(kva_rows.items())},
+        "dropped": sorted(value for _, _, value in set(numbers) - set(cropped)),
+        "columns": [[value for _, _, value in sorted(cluster, key=lambda item: item[1])] for cluster in clusters],
+        "effective_date": result["effective_date"],
+        "values": result["values"],
+    }
+
+
+def dump_words_fixture(document: dict, fh) -> None:
+    """Write a word-list fixture with one expected value and one word per line."""
+    lines = [f" {json.dumps(key)}: {json.dumps(document[key])}," for key in ("option", "power", "page_height")]
+    if "expected" in document:
+        expected = document["expected"]
+        lines.append(' "expected": {')
+        lines.append(
+            ",\n".join(f"  {json.dumps(key)}: {json.dumps(expected[key], sort_keys=True)}" for key in sorted(expected))
+        )
+        lines.append(" },")
+    lines.append(' "words": [')
+    lines.append(",\n".join(f"  {json.dumps(word)}" for word in document["words"]))
+    lines.append(" ]")
+    fh.write("{\n" + "\n".join(lines) + "\n}\n")
+
+
+def _check_words(path: str, record: bool) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        document = json.load(fh)
+    report = {"document": os.path.basename(path), "kind": "words"}
+    try:
+        actual = words_table(document)
+    except Exception as err:  # pylint: disable=broad-except
+        report["status"] = f"error: {type(err).__name__}: {err}"
+        return report
+
+    expected = document.get("expected")
+    if expected is None:
+        if record:
+            document["expected"] = actual
+            with open(path, "w", encoding="utf-8") as fh:
+                dump_words_fixture(document, fh)
+            report["status"] = "recorded"
+        else:
+            report["status"] = "missing expected values"
+        return report
+
+    diffs = [
+        f"{key}: expected {expected.get(key)}, got {actual[key]}"
+        for key in ("kva_rows", "dropped", "columns", "effective_date")
+        if expected.get(key) != actual[key]
+    ]
+    diffs.extend(_diff_values(expected.get("values", {}), actual["values"]))
+    report["status"] = "ok" if not diffs else "mismatch: " + "; ".join(diffs)
+    return report
+
+
+def _check_html(path: str, record: bool) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        html = fh.read()
+    expected = _load_expected(path)
+    links = {option: _find_pdf_url(html, option) for option in (TARIFF_OPTION_BASE, TARIFF_OPTION_HPHC)}
+    report = {"document": os.path.basename(path), "kind": "html"}
+    if expected is None:
+        if record:
+            with open(_expected_path(path), "w", encoding="utf-8") as fh:
+                json.dump(links, fh, indent=2, sort_keys=True)
+            report["status"] = "recorded"
+        else:
+            report["status"] = "missing expected values"
+        return report
+    diffs = [
+        f"{option}: expected {url}, got {links.get(option)}"
+        for option, url in expected.items()
+        if links.get(option) != url
+    ]
+    report["status"] = "ok" if not diffs else "mismatch: " + "; ".join(diffs)
+    return report
+
+
+def _documents(directory: str, pattern: str) -> list:
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "corpus", nargs="?", help="directory of tariff PDFs / HTML snapshots / word lists and their expected values"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="timed parses per PDF")
+    parser.add_argument("--record", action="store_true", help="write the expected values of new documents")
+    parser.add_argument("--json", action="store_true", help="print the report as one JSON line")
+    args = parser.parse_args(argv)
+
+    directories = [FIXTURES]
+    if args.corpus:
+        if not any(_documents(args.corpus, pattern) for pattern in ("*.pdf", "*.html", "*" + WORDS_SUFFIX)):
+            print(f"No .pdf, .html or {WORDS_SUFFIX} document in {args.corpus}", file=sys.stderr)
+            return 1
+        if os.path.realpath(args.corpus) != os.path.realpath(FIXTURES):
+            directories.append(args.corpus)
+
+    report = []
+    for directory in directories:
+        report.extend(_check_words(path, args.record) for path in _documents(directory, "*" + WORDS_SUFFIX))
+        report.extend(_check_pdf(path, args.runs, args.record) for path in _documents(directory, "*.pdf"))
+        report.extend(_check_html(path, args.record) for path in _documents(directory, "*.html"))
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for item in report:
+            timing = (
+                f"{item['median_ms']:9.2f} ms {item['peak_kib']:10.1f} KiB peak"
+                if "median_ms" in item
+                else " " * 30
+            )
+            print(f"{item['document']:44} {timing}  {item['status']}")
+    failed = [item for item in report if item["status"].startswith(("error", "mismatch", "missing"))]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Tests of the Urban Solar integration."""
@@ -0,0 +1,130 @@
+"""Helpers to run the integration on an in-process Home Assistant core."""
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import device_registry as dr
+from homeassistant.helpers import entity
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers import restore_state
+from homeassistant.helpers.entity_platform import EntityPlatform
+
+import custom_components.urbansolar as integration
+from custom_components.urbansolar import sensor
+from custom_components.urbansolar.const import DOMAIN
+
+
+class MockConfigEntry:
+    """The parts of ``ConfigEntry`` used by the integration and the entity platform."""
+
+    domain = DOMAIN
+    title = "Urban Solar"
+    pref_disable_new_entities = False
+    pref_disable_polling = False
+    state = ConfigEntryState.LOADED
+
+    def __init__(self, entry_id: str, data: dict, options: dict | None = None, version: int = 3) -> None:
+        self.entry_id = entry_id
+        self.data = data
+        self.options = options or {}
+        self.version = version
+        self.runtime_data = None
+        self._on_unload = []
+
+    def async_on_unload(self, func) -> None:
+        self._on_unload.append(func)
+
+    def add_update_listener(self, listener):
+        return lambda: None
+
+    def async_create_task(self, hass, target, name=None, eager_start=True):
+        return hass.async_create_task(target, name)
+
+    def async_create_background_task(self, hass, target, name, eager_start=True):
+        return hass.async_create_background_task(target, name)
+
+    def async_unload(self) -> None:
+        while self._on_unload:
+            self._on_unload.pop()()
+
+
+class MockConfigEntries:
+    """The parts of ``ConfigEntries`` used by the integration."""
+
+    def __init__(self) -> None:
+        self.entries = {}
+
+    def async_get_entry(self, entry_id):
+        return self.entries.get(entry_id)
+
+    def async_get_known_entry(self, entry_id):
+        return self.entries[entry_id]
+
+    def async_entries(self, domain=None):
+        return list(self.entries.values())
+
+    def async_update_entry(self, entry, *, data=None, options=None, version=None) -> bool:
+        if data is not None:
+            entry.data = data
+        if options is not None:
+            entry.options = options
+        if version is not None:
+            entry.version = version
+        return True
+
+    async def async_forward_entry_setups(self, entry, platforms) -> None:
+        """Platforms are set up by ``async_setup_entry`` below."""
+
+    async def async_unload_platforms(self, entry, platforms) -> bool:
+        return True
+
+
+async def async_make_hass(config_dir: str | None = None) -> HomeAssistant:
+    """Return a started core with loaded registries, to be called in a running loop."""
+    hass = HomeAssistant(config_dir or tempfile.mkdtemp())
+    os.makedirs(hass.config.path(".storage"), exist_ok=True)
+    hass.config.set_time_zone("Europe/Paris")
+    entity.async_setup(hass)
+    await er.async_load(hass)
+    await dr.async_load(hass)
+    await restore_state.async_load(hass)
+    hass.config_entries = MockConfigEntries()
+    return hass
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: MockConfigEntry) -> list:
+    """Set up ``entry`` and its sensor platform, and return the added entities."""
+    hass.config_entries.entries[entry.entry_id] = entry
+    await integration.async_migrate_entry(hass, entry)
+    await integration.async_setup_entry(hass, entry)
+    platform = EntityPlatform(
+        hass=hass,
+        logger=logging.getLogger(__name__),
+        domain="sensor",
+        platform_name=DOMAIN,
+        platform=None,
+        scan_interval=sensor.SCAN_INTERVAL,
+        entity_namespace=None,
+    )
+    platform.config_entry = entry
+    added = []
+
+    def _add_entities(entities, update_before_add=False) -> None:
+        added.extend(entities)
+        hass.async_create_task(platform.async_add_entities(entities, update_before_add))
+
+    await sensor.async_setup_entry(hass, entry, _add_entities)
+    await hass.async_block_till_done()
+    return added
+
+
+async def async_stop(hass: HomeAssistant, entries) -> None:
+    """Unload ``entries`` and stop the core."""
+    for entry in entries:
+        await integration.async_unload_entry(hass, entry)
+        entry.async_unload()
+    await hass.async_stop(force=True)
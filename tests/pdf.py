@@ -0,0 +1,54 @@
+"""Minimal one-page PDFs of positioned text, to feed the tariff parser without sample documents."""
+from __future__ import annotations
+
+from typing import Iterable, Sequence, Tuple
+
+KVA_ROWS = (3, 6, 9, 12, 15, 18, 24, 30, 36)
+
+
+def build_pdf(items: Iterable[Tuple[float, float, str]]) -> bytes:
+    """A4 page with each ``(x, y, text)`` drawn in Helvetica 10 (PDF coordinates, origin bottom left)."""
+    stream = "\n".join(f"BT /F1 10 Tf {x} {y} Td ({text}) Tj ET" for x, y, text in items).encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R"
+        b" /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return out
+
+
+def tariff_items(
+    columns: Sequence[float],
+    effective_date: str = "01/08/2025",
+    kva_rows: Sequence[int] = KVA_ROWS,
+    top: float = 700,
+) -> list:
+    """Items of a tariff table: one row per power, one price column per x position.
+
+    The price of row ``r`` and column ``c`` is ``0,2rc0`` (e.g. ``0,2110`` for
+    the second row and first column), so every cell is distinct.
+    """
+    items = [(60, 800, "Au"), (80, 800, effective_date)]
+    for row, kva in enumerate(kva_rows):
+        y = top - 20 * row
+        items.append((50, y, str(kva)))
+        for column, x in enumerate(columns):
+            items.append((x, y, f"0,2{row}{column + 1}0"))
+    return items
+
+
+def tariff_price(row: int, column: int) -> float:
+    """Price written by ``tariff_items`` in ``row`` and ``column``."""
+    return float(f"0.2{row}{column + 1}0")
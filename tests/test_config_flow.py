@@ -0,0 +1,93 @@
+"""Config and options flows: off-peak hours are only asked with the HP/HC option."""
+import asyncio
+
+from homeassistant.data_entry_flow import FlowResultType
+
+from custom_components.urbansolar.config_flow import UrbanSolarConfigFlow, UrbanSolarOptionsFlow
+from custom_components.urbansolar.const import (
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_OFFPEAK_HOURS,
+    CONF_START_BATTERY_ENERGY,
+    CONF_SUBSCRIBED_POWER,
+    CONF_TARIFF_OPTION,
+    TARIFF_OPTION_BASE,
+    TARIFF_OPTION_HPHC,
+)
+
+from .common import MockConfigEntry, async_make_hass
+
+USER_INPUT = {
+    CONF_START_BATTERY_ENERGY: 10.0,
+    CONF_SUBSCRIBED_POWER: "9",
+    CONF_INDEX_BASE_SENSOR: ["sensor.linky_base"],
+    CONF_INDEX_INJECTION_SENSOR: ["sensor.linky_injection"],
+}
+
+
+def _fields(result) -> set:
+    return {str(key) for key in result["data_schema"].schema}
+
+
+async def _async_config_flow(hass):
+    flow = UrbanSolarConfigFlow()
+    flow.hass = hass
+    flow.handler = "urbansolar"
+    flow.flow_id = "flow0"
+    flow.context = {"source": "user"}
+    return flow
+
+
+def test_base_option_creates_the_entry_without_offpeak_hours():
+    async def _run():
+        hass = await async_make_hass()
+        flow = await _async_config_flow(hass)
+        result = await flow.async_step_user()
+        assert result["type"] == FlowResultType.FORM
+        assert CONF_OFFPEAK_HOURS not in _fields(result)
+
+        result = await flow.async_step_user({**USER_INPUT, CONF_TARIFF_OPTION: TARIFF_OPTION_BASE})
+        assert result["type"] == FlowResultType.CREATE_ENTRY
+        assert CONF_OFFPEAK_HOURS not in result["data"]
+        assert result["data"][CONF_SUBSCRIBED_POWER] == 9
+        await hass.async_stop(force=True)
+
+    asyncio.run(_run())
+
+
+def test_hphc_option_asks_and_validates_offpeak_hours():
+    async def _run():
+        hass = await async_make_hass()
+        flow = await _async_config_flow(hass)
+        result = await flow.async_step_user({**USER_INPUT, CONF_TARIFF_OPTION: TARIFF_OPTION_HPHC})
+        assert result["type"] == FlowResultType.FORM
+        assert result["step_id"] == "offpeak"
+        assert _fields(result) == {CONF_OFFPEAK_HOURS}
+
+        result = await flow.async_step_offpeak({CONF_OFFPEAK_HOURS: "22:00-25:00"})
+        assert result["errors"] == {CONF_OFFPEAK_HOURS: "invalid_offpeak_hours"}
+
+        result = await flow.async_step_offpeak({CONF_OFFPEAK_HOURS: "01:30-07:30, 12:30-14:30"})
+        assert result["type"] == FlowResultType.CREATE_ENTRY
+        assert result["data"][CONF_TARIFF_OPTION] == TARIFF_OPTION_HPHC
+        assert result["data"][CONF_OFFPEAK_HOURS] == "01:30-07:30, 12:30-14:30"
+        assert result["data"][CONF_SUBSCRIBED_POWER] == 9
+        await hass.async_stop(force=True)
+
+    asyncio.run(_run())
+
+
+def test_options_flow_shows_offpeak_hours_only_with_hphc():
+    async def _run():
+        hass = await async_make_hass()
+        for option, expected in ((TARIFF_OPTION_BASE, False), (TARIFF_OPTION_HPHC, True)):
+            entry = MockConfigEntry("entry0", {**USER_INPUT, CONF_TARIFF_OPTION: option})
+            flow = UrbanSolarOptionsFlow()
+            flow.hass = hass
+            flow.handler = entry.entry_id
+            hass.config_entries.entries[entry.entry_id] = entry
+            result = await flow.async_step_init()
+            assert (CONF_OFFPEAK_HOURS in _fields(result)) is expected
+        await hass.async_stop(force=True)
+
+    asyncio.run(_run())
@@ -0,0 +1,139 @@
+"""Hourly prices of the cost statistics and the billing period, in local time."""
+from datetime import datetime, timedelta
+
+import pytest
+from homeassistant.util import dt as dt_util
+
+from custom_components.urbansolar.const import (
+    SENSOR_TARIFF_ACH_HC_TTC,
+    SENSOR_TARIFF_ACH_HP_TTC,
+    SENSOR_TARIFF_ACH_TTC,
+    SENSOR_TARIFF_ENERGY_HC_TTC,
+    SENSOR_TARIFF_ENERGY_HP_TTC,
+    SENSOR_TARIFF_ENERGY_TTC,
+    TARIFF_OPTION_BASE,
+    TARIFF_OPTION_HPHC,
+)
+from custom_components.urbansolar.costs import HourlyPrices, LivePrices, bill_period_start
+from custom_components.urbansolar.timeline import TariffTimeline, effective_timestamp
+from custom_components.urbansolar.timeofuse import OffPeakSchedule
+
+PARIS = dt_util.get_time_zone("Europe/Paris")
+HPHC = {
+    SENSOR_TARIFF_ENERGY_HP_TTC: 0.20,
+    SENSOR_TARIFF_ENERGY_HC_TTC: 0.16,
+    SENSOR_TARIFF_ACH_HP_TTC: 0.06,
+    SENSOR_TARIFF_ACH_HC_TTC: 0.04,
+}
+
+
+@pytest.fixture(autouse=True)
+def _paris_time_zone():
+    previous = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(PARIS)
+    yield
+    dt_util.set_default_time_zone(previous)
+
+
+def _local(*args, fold: int = 0) -> float:
+    return datetime(*args, tzinfo=PARIS, fold=fold).timestamp()
+
+
+def _hphc_timeline() -> TariffTimeline:
+    timeline = TariffTimeline()
+    timeline.add("01/02/2025", HPHC)
+    return timeline
+
+
+def test_base_prices_follow_the_tariff_versions():
+    timeline = TariffTimeline()
+    timeline.add("01/02/2025", {SENSOR_TARIFF_ENERGY_TTC: 0.25, SENSOR_TARIFF_ACH_TTC: 0.05})
+    timeline.add("01/08/2025", {SENSOR_TARIFF_ENERGY_TTC: 0.20, SENSOR_TARIFF_ACH_TTC: 0.06})
+    august = effective_timestamp("01/08/2025")
+    prices = HourlyPrices(timeline, TARIFF_OPTION_BASE, august - 2 * 3600 + 1800, august + 3600)
+
+    assert len(prices.energy) == 4
+    assert prices.at(august - 1) == (0.25, 0.05)
+    assert prices.at(august) == (0.20, 0.06)
+    assert prices.at(august + 3600 + 3599) == (0.20, 0.06)
+    # Outside the resolved range.
+    assert prices.at(august - 3 * 3600) == (None, None)
+    assert prices.at(august + 2 * 3600) == (None, None)
+
+
+@pytest.mark.parametrize(
+    ("day", "hours", "offpeak_hours"),
+    [
+        # Last Sunday of March: 02:00-03:00 does not exist.
+        ((2025, 3, 30), 23, 7),
+        # Last Sunday of October: 02:00-03:00 happens twice.
+        ((2025, 10, 26), 25, 9),
+    ],
+)
+def test_hphc_prices_on_a_dst_day(day, hours, offpeak_hours):
+    schedule = OffPeakSchedule.from_string("22:00-06:00")
+    first_ts = _local(*day)
+    last_ts = (datetime(*day, tzinfo=PARIS) + timedelta(days=1)).timestamp() - 1
+    _, offpeak = schedule.hourly_fractions(first_ts, last_ts)
+    prices = HourlyPrices(_hphc_timeline(), TARIFF_OPTION_HPHC, first_ts, last_ts, offpeak)
+
+    assert len(prices.energy) == hours
+    assert prices.energy.count(0.16) == offpeak_hours
+    assert prices.energy.count(0.20) == hours - offpeak_hours
+    assert prices.at(_local(*day, 5, 30)) == (0.16, 0.04)
+    assert prices.at(_local(*day, 6, 0)) == (0.20, 0.06)
+    assert prices.at(_local(*day, 21, 59)) == (0.20, 0.06)
+    assert prices.at(_local(*day, 22, 0)) == (0.16, 0.04)
+
+
+def test_hphc_prices_are_weighted_by_the_offpeak_share_of_the_hour():
+    schedule = OffPeakSchedule.from_string("22:30-06:30")
+    first_ts = _local(2025, 11, 3, 22)
+    _, offpeak = schedule.hourly_fractions(first_ts, first_ts + 8 * 3600)
+    prices = HourlyPrices(_hphc_timeline(), TARIFF_OPTION_HPHC, first_ts, first_ts + 8 * 3600, offpeak)
+
+    assert prices.energy[0] == pytest.approx(0.18)
+    assert prices.acheminement[0] == pytest.approx(0.05)
+    assert prices.energy[1:8] == [0.16] * 7
+    assert prices.energy[8] == pytest.approx(0.18)
+    # Without a schedule, every hour is a peak hour.
+    assert HourlyPrices(_hphc_timeline(), TARIFF_OPTION_HPHC, first_ts, first_ts).energy == [0.20]
+
+
+def test_live_prices_are_cached_per_hour_and_timeline_revision():
+    timeline = _hphc_timeline()
+    live = LivePrices(TARIFF_OPTION_HPHC)
+    ts = _local(2025, 11, 3, 10, 5)
+
+    assert live.at(timeline, ts) == (0.20, 0.06)
+    assert live.at(timeline, ts, offpeak=True) == (0.16, 0.04)
+    # Same hour and revision: the version is not looked up again.
+    timeline.versions[0][SENSOR_TARIFF_ENERGY_HP_TTC] = 0.30
+    assert live.at(timeline, ts + 3000) == (0.20, 0.06)
+    # The next hour re-resolves.
+    assert live.at(timeline, ts + 3600) == (0.30, 0.06)
+    # A new tariff version bumps the revision, within the same hour.
+    assert timeline.add("01/02/2025", {**HPHC, SENSOR_TARIFF_ENERGY_HP_TTC: 0.22})
+    assert live.at(timeline, ts + 3600) == (0.22, 0.06)
+    assert LivePrices(TARIFF_OPTION_BASE).at(TariffTimeline(), ts) == (None, None)
+
+
+@pytest.mark.parametrize(
+    ("ts", "start"),
+    [
+        # Last local hour of October (UTC+1) and first hour of November.
+        (_local(2025, 10, 31, 23, 30), _local(2025, 10, 1)),
+        (_local(2025, 11, 1, 0, 30), _local(2025, 11, 1)),
+        # Still October 31 in UTC, already November in Paris.
+        (datetime(2025, 10, 31, 23, 30, tzinfo=dt_util.UTC).timestamp(), _local(2025, 11, 1)),
+        # A month that starts in winter time and ends in summer time.
+        (_local(2025, 3, 31, 23, 59), _local(2025, 3, 1)),
+        (_local(2025, 4, 1), _local(2025, 4, 1)),
+        # The repeated hour of the October DST change.
+        (_local(2025, 10, 26, 2, 30, fold=1), _local(2025, 10, 1)),
+        (_local(2025, 12, 31, 23, 59), _local(2025, 12, 1)),
+        (_local(2026, 1, 1), _local(2026, 1, 1)),
+    ],
+)
+def test_bill_period_starts_at_local_month_start(ts, start):
+    assert bill_period_start(ts) == start
@@ -0,0 +1,147 @@
+"""Depletion forecast projection."""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.urbansolar import forecast
+from custom_components.urbansolar.const import (
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_START_BATTERY_ENERGY,
+)
+from custom_components.urbansolar.forecast import DepletionForecast
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+PARIS = dt_util.get_time_zone("Europe/Paris")
+
+
+@pytest.fixture(autouse=True)
+def _paris_time_zone():
+    previous = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(PARIS)
+    yield
+    dt_util.set_default_time_zone(previous)
+
+
+def _constant(net: float) -> DepletionForecast:
+    projection = DepletionForecast()
+    for slot in range(96):
+        projection.seen[slot] = True
+        projection.inj_avg[slot] = max(net, 0.0)
+        projection.base_avg[slot] = max(-net, 0.0)
+    return projection
+
+
+def _hour_by_hour(projection: DepletionForecast, capacity: float, now: datetime):
+    """Reference: one step per UTC hour, each looked up in the slot of its local hour."""
+    start = dt_util.as_utc(dt_util.as_local(now).replace(minute=0, second=0, microsecond=0))
+    local_start = dt_util.as_local(start)
+    month_end = (local_start.replace(day=1, hour=0) + timedelta(days=32)).replace(day=1)
+    hours_to_month_end = int((dt_util.as_utc(month_end) - start).total_seconds() // 3600)
+    depletion = month_end_capacity = None
+    for step in range(forecast.FORECAST_HORIZON_HOURS):
+        if step == hours_to_month_end:
+            month_end_capacity = capacity
+        if depletion is None and capacity <= 0:
+            depletion = step
+        if depletion is not None and month_end_capacity is not None:
+            break
+        local = dt_util.as_local(start + timedelta(hours=step))
+        slot = forecast._season(local.month) * 24 + local.hour
+        if projection.seen[slot]:
+            capacity = max(capacity + projection.inj_avg[slot] - projection.base_avg[slot], 0.0)
+        else:
+            capacity = max(
+                capacity + projection.inj_hour_avg[local.hour] - projection.base_hour_avg[local.hour], 0.0
+            )
+    depletion_time = None if depletion is None else dt_util.as_local(start + timedelta(hours=depletion))
+    return depletion_time, month_end_capacity
+
+
+@pytest.mark.parametrize(
+    "local_start, hours",
+    [
+        (datetime(2025, 3, 31, 0, 0), 24),
+        (datetime(2025, 3, 30, 0, 0), 47),  # 23-hour day.
+        (datetime(2025, 10, 26, 0, 0), 145),  # 25-hour day.
+        (datetime(2025, 6, 15, 13, 30), 15 * 24 + 11),  # From 13:00.
+    ],
+)
+def test_month_end_is_counted_in_real_hours(local_start, hours):
+    projection = _constant(1.0)
+    projection.project(5.0, local_start.replace(tzinfo=PARIS))
+    assert projection.month_end_capacity == pytest.approx(5.0 + hours)
+    assert projection.depletion_time is None
+
+
+def test_depletion_time_across_dst_change():
+    projection = _constant(-1.0)
+    projection.project(30.0, datetime(2025, 3, 29, 20, 0, tzinfo=PARIS))
+    # 30 hours later, one of them skipped by the change to summer time.
+    assert projection.depletion_time == datetime(2025, 3, 31, 3, 0, tzinfo=PARIS)
+    assert projection.month_end_capacity == 0.0
+
+
+def test_matches_hour_by_hour_simulation():
+    rng = random.Random(3)
+    for trial in range(150):
+        projection = DepletionForecast()
+        for slot in range(96):
+            projection.seen[slot] = rng.random() < 0.7
+            projection.inj_avg[slot] = rng.random() * rng.choice((0.2, 1.0, 2.0))
+            projection.base_avg[slot] = rng.random() * rng.choice((0.2, 1.0, 2.0))
+        for hour in range(24):
+            projection.inj_hour_avg[hour] = rng.random()
+            projection.base_hour_avg[hour] = rng.random()
+        now = datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=rng.randrange(365 * 24 * 60))
+        if trial % 5 == 0:
+            now = rng.choice(
+                (
+                    datetime(2025, 3, 29, 22, 0, tzinfo=timezone.utc),
+                    datetime(2025, 10, 25, 23, 30, tzinfo=timezone.utc),
+                    datetime(2025, 3, 30, 0, 59, tzinfo=timezone.utc),
+                )
+            )
+        capacity = rng.choice((0.0, 1.0, 20.0, 500.0, 5000.0))
+
+        projection.project(capacity, now)
+        depletion_time, month_end_capacity = _hour_by_hour(projection, capacity, now)
+        assert projection.depletion_time == depletion_time
+        assert projection.month_end_capacity == pytest.approx(month_end_capacity)
+
+
+def test_hourly_tick_waits_for_a_recompute_in_progress():
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+        entry = MockConfigEntry(
+            "entry0",
+            {
+                CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+                CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+                CONF_START_BATTERY_ENERGY: 10.0,
+            },
+        )
+        await async_setup_entry(hass, entry)
+        runtime = entry.runtime_data
+        coordinator = runtime.coordinator
+        closed = []
+        set_updated_data = coordinator.async_set_updated_data
+        coordinator.async_set_updated_data = lambda data: closed.append(data) or set_updated_data(data)
+
+        await runtime.calc_lock.acquire()
+        tick = hass.async_create_task(coordinator.async_hourly_tick(dt_util.now()))
+        await asyncio.sleep(0)
+        assert not closed and not tick.done()
+        runtime.calc_lock.release()
+        await tick
+        assert len(closed) == 1
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
@@ -0,0 +1,138 @@
+"""History rebuild on a recorder SQLite database."""
+import sqlite3
+
+import pytest
+
+from custom_components.urbansolar.history import _rebuild_sqlalchemy, _rebuild_sqlite
+
+DERIVED = ("sensor.battery_in", "sensor.battery_out", "sensor.capacity", "sensor.base_emulated", "sensor.inj_emulated")
+
+
+def _make_db(path, series: dict) -> None:
+    conn = sqlite3.connect(path)
+    # As the recorder does: readers do not block the writer.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE statistics_meta (id INTEGER PRIMARY KEY, statistic_id TEXT, source TEXT,"
+        " unit_of_measurement TEXT, unit_class TEXT, has_mean INTEGER, has_sum INTEGER, name TEXT, mean_type INTEGER)"
+    )
+    for table in ("statistics", "statistics_short_term"):
+        conn.execute(
+            f"CREATE TABLE {table} (id INTEGER PRIMARY KEY, created_ts REAL, metadata_id INTEGER,"
+            " start_ts REAL, state REAL, sum REAL)"
+        )
+    for statistic_id, rows in series.items():
+        meta_id = conn.execute("INSERT INTO statistics_meta (statistic_id) VALUES (?)", (statistic_id,)).lastrowid
+        conn.executemany(
+            "INSERT INTO statistics (metadata_id, start_ts, state, sum) VALUES (?, ?, ?, ?)",
+            [(meta_id, hour * 3600.0, state, state - rows[0][1]) for hour, state in rows],
+        )
+    conn.commit()
+    conn.close()
+
+
+def _derived(path, statistic_id: str) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            "SELECT s.start_ts, s.state FROM statistics s JOIN statistics_meta m ON m.id = s.metadata_id"
+            " WHERE m.statistic_id = ? ORDER BY s.start_ts",
+            (statistic_id,),
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_rows_are_emitted_for_base_hours_only(tmp_path):
+    path = str(tmp_path / "home-assistant_v2.db")
+    # No base statistics at hours 2 and 3; the injection of those hours is counted at hour 4.
+    _make_db(
+        path,
+        {
+            "sensor.base": [(0, 100.0), (1, 101.0), (4, 104.0), (5, 105.0)],
+            "sensor.injection": [(hour, 50.0 + 2 * hour) for hour in range(6)],
+        },
+    )
+
+    result = _rebuild_sqlite(path, ["sensor.base"], ["sensor.injection"], *DERIVED, 0.0)
+
+    assert result.rows == 4 * len(DERIVED)
+    assert _derived(path, "sensor.battery_in") == [(0.0, 0.0), (3600.0, 2.0), (14400.0, 8.0), (18000.0, 10.0)]
+    assert _derived(path, "sensor.inj_emulated") == [(0.0, 50.0), (3600.0, 52.0), (14400.0, 58.0), (18000.0, 60.0)]
+    assert result.battery_in == 10.0
+    assert result.battery_out == 5.0
+    assert result.last_source_states == {"sensor.base": 105.0, "sensor.injection": 60.0}
+
+
+def test_several_meters_are_summed(tmp_path):
+    hours = range(48)
+    meters = {
+        "sensor.base_1": [(hour, 100.0 + 0.5 * hour) for hour in hours],
+        "sensor.base_2": [(hour, 10.0 + 0.25 * hour) for hour in hours if hour % 7],
+        "sensor.injection_1": [(hour, 50.0 + (hour % 12 > 5) * hour) for hour in hours],
+        "sensor.injection_2": [(hour, 5.0 + 0.1 * hour) for hour in hours],
+    }
+    several = str(tmp_path / "several.db")
+    _make_db(several, meters)
+    result = _rebuild_sqlite(
+        several, ["sensor.base_1", "sensor.base_2"], ["sensor.injection_1", "sensor.injection_2"], *DERIVED, 3.0
+    )
+
+    assert result.rows == len(hours) * len(DERIVED)
+    assert result.last_base_state == 100.0 + 0.5 * 47 + 10.0 + 0.25 * 47
+    assert result.last_injection_state == 50.0 + 47 + 5.0 + 0.1 * 47
+    assert abs(result.battery_in - result.battery_out - result.capacity) < 1e-9
+
+
+# The SQLAlchemy path targets MySQL (INSERT IGNORE): derived metadata is created beforehand.
+DERIVED_META = {statistic_id: [] for statistic_id in DERIVED}
+
+
+def _engine(path):
+    sqlalchemy = pytest.importorskip("sqlalchemy")
+    return sqlalchemy.create_engine(f"sqlite:///{path}")
+
+
+def test_sqlalchemy_rebuild_matches_sqlite(tmp_path):
+    hours = range(48)
+    # Injection metadata created first: source order differs from metadata_id order.
+    meters = {
+        **DERIVED_META,
+        "sensor.injection_1": [(hour, 50.0 + (hour % 12 > 5) * hour) for hour in hours if hour % 5],
+        "sensor.base_2": [(hour, 10.0 + 0.25 * hour) for hour in hours if hour % 7],
+        "sensor.base_1": [(hour, 100.0 + 0.5 * hour) for hour in hours if hour % 11],
+    }
+    bases, injections = ["sensor.base_1", "sensor.base_2"], ["sensor.injection_1"]
+    sqlite_path, sa_path = str(tmp_path / "sqlite.db"), str(tmp_path / "sqlalchemy.db")
+    _make_db(sqlite_path, meters)
+    _make_db(sa_path, meters)
+
+    expected = _rebuild_sqlite(sqlite_path, bases, injections, *DERIVED, 3.0)
+    engine = _engine(sa_path)
+    try:
+        result = _rebuild_sqlalchemy(engine, bases, injections, *DERIVED, 3.0)
+    finally:
+        engine.dispose()
+
+    assert result == expected
+    for statistic_id in DERIVED:
+        assert _derived(sa_path, statistic_id) == _derived(sqlite_path, statistic_id)
+
+
+def test_sqlalchemy_rebuild_without_base_keeps_the_derived_statistics(tmp_path):
+    path = str(tmp_path / "home-assistant_v2.db")
+    _make_db(
+        path,
+        {
+            **DERIVED_META,
+            "sensor.base": [],
+            "sensor.injection": [(hour, 50.0 + hour) for hour in range(3)],
+            "sensor.battery_in": [(hour, 1.0 + hour) for hour in range(3)],
+        },
+    )
+    engine = _engine(path)
+    try:
+        assert _rebuild_sqlalchemy(engine, ["sensor.base"], ["sensor.injection"], *DERIVED, 0.0) is None
+    finally:
+        engine.dispose()
+    assert _derived(path, "sensor.battery_in") == [(0.0, 1.0), (3600.0, 2.0), (7200.0, 3.0)]
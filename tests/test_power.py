@@ -0,0 +1,130 @@
+"""Power samples refresh the capacity estimate only."""
+import asyncio
+from types import SimpleNamespace
+
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.urbansolar.const import (
+    CONF_CAPACITY_BATTERY,
+    CONF_EXPORT_POWER_SENSOR,
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_BATTERY_IN,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_REDUCE_RECORDER_WRITES,
+    CONF_START_BATTERY_ENERGY,
+    DOMAIN,
+)
+from custom_components.urbansolar import coordinator as coordinator_module
+from custom_components.urbansolar.coordinator import entry_option
+from custom_components.urbansolar.power import PowerIntegrator
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+EXPORT = "sensor.linky_export_power"
+
+
+def _power_event(ts: float, watts):
+    state = SimpleNamespace(state=str(watts), attributes={"unit_of_measurement": "W"}, last_updated_timestamp=ts)
+    return SimpleNamespace(data={"entity_id": EXPORT, "new_state": state})
+
+
+def test_steady_power_holds_until_the_next_sample():
+    integrator = PowerIntegrator()
+    integrator.add_sample(0.0, 2000.0)
+    # No state change for an hour: the sensor held 2 kW.
+    integrator.add_sample(3600.0, 500.0)
+    assert integrator.energy_kwh == 2.0
+    integrator.advance(5400.0)
+    assert integrator.energy_kwh == 2.25
+    integrator.add_sample(5400.0, 0.0)
+    integrator.advance(9000.0)
+    assert integrator.energy_kwh == 2.25
+
+
+def test_unavailable_periods_are_not_integrated():
+    integrator = PowerIntegrator()
+    integrator.add_sample(0.0, 3600.0)
+    integrator.add_sample(10.0, 3600.0)
+    integrator.mark_unavailable()
+    integrator.advance(3600.0)
+    integrator.add_sample(7200.0, 3600.0)
+    integrator.add_sample(7210.0, 3600.0)
+    assert round(integrator.energy_kwh, 9) == 0.02
+
+
+def test_power_samples_only_write_the_capacity():
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+        entry = MockConfigEntry(
+            "entry0",
+            {
+                CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+                CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+                CONF_START_BATTERY_ENERGY: 10.0,
+                CONF_EXPORT_POWER_SENSOR: EXPORT,
+            },
+        )
+        await async_setup_entry(hass, entry)
+        coordinator = entry.runtime_data.coordinator
+        ent_reg = er.async_get(hass)
+        capacity_id = ent_reg.async_get_entity_id("sensor", DOMAIN, f"entry0_{CONF_CAPACITY_BATTERY}")
+        battery_in_id = ent_reg.async_get_entity_id("sensor", DOMAIN, f"entry0_{CONF_INDEX_BATTERY_IN}")
+        capacity = float(hass.states.get(capacity_id).state)
+        battery_in = hass.states.get(battery_in_id)
+        writes = entry.runtime_data.metrics.state_writes
+
+        # 3.6 kW exported for 10 s: +0.01 kWh.
+        coordinator.async_power_update(_power_event(1000.0, 3600.0))
+        coordinator.async_power_update(_power_event(1010.0, 3600.0))
+        await hass.async_block_till_done()
+
+        assert float(hass.states.get(capacity_id).state) == round(capacity + 0.01, 3)
+        assert entry.runtime_data.metrics.state_writes == writes + 1
+        assert hass.states.get(battery_in_id).last_updated == battery_in.last_updated
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
+
+
+def test_saved_options_are_authoritative():
+    data = {CONF_EXPORT_POWER_SENSOR: EXPORT}
+    assert entry_option(MockConfigEntry("e", data), CONF_EXPORT_POWER_SENSOR) == EXPORT
+    # Cleared in the options flow: the key is absent from the saved options.
+    entry = MockConfigEntry("e", data, options={CONF_REDUCE_RECORDER_WRITES: False})
+    assert entry_option(entry, CONF_EXPORT_POWER_SENSOR) is None
+    assert entry_option(entry, CONF_REDUCE_RECORDER_WRITES, True) is False
+
+
+def test_constant_export_over_15_minutes_updates_the_capacity(monkeypatch):
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set(EXPORT, "1.2", {"unit_of_measurement": "kW"})
+        entry = MockConfigEntry(
+            "entry0",
+            {
+                CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+                CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+                CONF_START_BATTERY_ENERGY: 10.0,
+                CONF_EXPORT_POWER_SENSOR: EXPORT,
+            },
+        )
+        now = 1_000_000.0
+        monkeypatch.setattr(coordinator_module.time, "time", lambda: now)
+        await async_setup_entry(hass, entry)
+        coordinator = entry.runtime_data.coordinator
+        capacity_id = er.async_get(hass).async_get_entity_id("sensor", DOMAIN, f"entry0_{CONF_CAPACITY_BATTERY}")
+        capacity = float(hass.states.get(capacity_id).state)
+
+        # 1.2 kW held for 20 minutes without any state change: +0.4 kWh.
+        for _ in range(4):
+            now += 300.0
+            coordinator.async_advance_power(None)
+        await hass.async_block_till_done()
+        assert float(hass.states.get(capacity_id).state) == round(capacity + 0.4, 3)
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
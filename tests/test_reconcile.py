@@ -0,0 +1,83 @@
+"""Hourly reconciliation of the live totals with the recorder statistics."""
+import asyncio
+import logging
+
+from custom_components.urbansolar import history
+from custom_components.urbansolar.const import (
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_START_BATTERY_ENERGY,
+)
+from custom_components.urbansolar.history import ReconcileSample
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+BASE, INJECTION = "sensor.linky_base", "sensor.linky_injection"
+
+
+def _sample(battery_in: float, battery_out: float, base: float, injection: float) -> ReconcileSample:
+    return ReconcileSample(
+        start_ts=1_700_000_000.0,
+        battery_in=battery_in,
+        battery_out=battery_out,
+        base_state=base,
+        injection_state=injection,
+        source_states={BASE: base, INJECTION: injection},
+    )
+
+
+def _reconcile(monkeypatch, battery_in: float, sample: ReconcileSample):
+    """Live totals: in ``battery_in``, out 5, indexes base 1000 / injection 500; return them after a run."""
+
+    async def _fetch(hass, config_entry):
+        return sample
+
+    monkeypatch.setattr(history, "async_fetch_reconcile_sample", _fetch)
+
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set(BASE, "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set(INJECTION, "500.0", {"unit_of_measurement": "kWh"})
+        entry = MockConfigEntry(
+            "entry0",
+            {CONF_INDEX_BASE_SENSOR: BASE, CONF_INDEX_INJECTION_SENSOR: INJECTION, CONF_START_BATTERY_ENERGY: 0.0},
+        )
+        await async_setup_entry(hass, entry)
+        runtime = entry.runtime_data
+        runtime.battery_in, runtime.battery_out = battery_in, 5.0
+        runtime.source_last = {BASE: 1000.0, INJECTION: 500.0}
+        runtime.last_base, runtime.last_injection = 1000.0, 500.0
+
+        await runtime.coordinator.async_run_reconcile()
+        await hass.async_block_till_done()
+        result = (runtime.battery_in, runtime.battery_out, runtime.capacity, runtime.metrics.reconcile_corrections)
+        await async_stop(hass, [entry])
+        return result
+
+    return asyncio.run(_run())
+
+
+def test_no_drift_keeps_the_totals(monkeypatch, caplog):
+    # 2 kWh injected and 0.5 kWh consumed since the sampled hour, none of it from the battery.
+    sample = _sample(18.0, 5.0, base=999.5, injection=498.0)
+    with caplog.at_level(logging.WARNING):
+        assert _reconcile(monkeypatch, 20.0, sample)[3] == 0
+    assert not [record for record in caplog.records if record.name.startswith("custom_components.urbansolar")]
+
+
+def test_drift_is_corrected_and_logged(monkeypatch, caplog):
+    sample = _sample(18.0, 5.0, base=999.5, injection=498.0)
+    with caplog.at_level(logging.WARNING):
+        battery_in, battery_out, capacity, corrections = _reconcile(monkeypatch, 25.0, sample)
+    assert (battery_in, battery_out, capacity, corrections) == (20.0, 5.0, 15.0, 1)
+    assert "in 25.000 -> 20.000" in caplog.text
+
+
+def test_index_reset_skips_the_reconciliation(monkeypatch, caplog):
+    # The injection meter was replaced: its index is now below the sampled one.
+    sample = _sample(18.0, 5.0, base=999.5, injection=12_345.0)
+    with caplog.at_level(logging.WARNING):
+        battery_in, battery_out, _, corrections = _reconcile(monkeypatch, 25.0, sample)
+    assert (battery_in, battery_out, corrections) == (25.0, 5.0, 0)
+    assert "went backwards" in caplog.text
+    assert INJECTION in caplog.text
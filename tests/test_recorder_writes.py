@@ -0,0 +1,120 @@
+"""Derived sensors follow the recorder write options of the battery sensors."""
+import asyncio
+import time
+
+from custom_components.urbansolar import tariffs
+from custom_components.urbansolar.const import (
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_MIN_WRITE_INTERVAL,
+    CONF_REDUCE_RECORDER_WRITES,
+    CONF_START_BATTERY_ENERGY,
+    CONF_TARIFF_OPTION,
+    SENSOR_TARIFF_SUBSCRIPTION_TTC,
+    TARIFF_OPTION_BASE,
+)
+from custom_components.urbansolar.sensor import (
+    UrbanSolarBillSensor,
+    UrbanSolarCostSensor,
+    UrbanSolarRatioSensor,
+    UrbanSolarSplitSensor,
+    UrbanSolarThrottledEntity,
+)
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+
+def test_derived_sensors_use_the_throttled_write_path():
+    for cls in (UrbanSolarRatioSensor, UrbanSolarSplitSensor, UrbanSolarCostSensor, UrbanSolarBillSensor):
+        assert issubclass(cls, UrbanSolarThrottledEntity)
+
+
+def test_ratio_writes_are_held_back_until_flushed():
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+        entry = MockConfigEntry(
+            "entry0",
+            {
+                CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+                CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+                CONF_START_BATTERY_ENERGY: 10.0,
+            },
+            options={CONF_REDUCE_RECORDER_WRITES: True, CONF_MIN_WRITE_INTERVAL: 3600},
+        )
+        entities = await async_setup_entry(hass, entry)
+        ratios = [entity for entity in entities if isinstance(entity, UrbanSolarRatioSensor)]
+        assert ratios
+
+        writes = {}
+
+        def _count(entity):
+            write = entity.async_write_ha_state
+
+            def _write():
+                writes[entity.entity_id] = writes.get(entity.entity_id, 0) + 1
+                write()
+
+            return _write
+
+        now = time.time()
+        for entity in ratios:
+            entity.async_write_ha_state = _count(entity)
+            # As if just written: every change of this hour is held back.
+            entity._last_write_ts = now
+
+        base, injection = 1000.0, 500.0
+        for _ in range(5):
+            base += 0.5
+            injection += 0.7
+            hass.states.async_set("sensor.linky_base", str(base), {"unit_of_measurement": "kWh"})
+            hass.states.async_set("sensor.linky_injection", str(injection), {"unit_of_measurement": "kWh"})
+            await hass.async_block_till_done()
+
+        assert not writes
+        pending = [entity for entity in ratios if entity._write_pending]
+        assert pending
+        for entity in ratios:
+            entity.async_flush_pending_write()
+        assert sorted(writes) == sorted(entity.entity_id for entity in pending)
+        assert all(count == 1 for count in writes.values())
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
+
+
+def test_bill_is_written_on_tariff_updates(monkeypatch):
+    # Nothing listens there: the initial tariff refresh fails at once.
+    monkeypatch.setattr(tariffs, "_TARIFFS_URL", "http://127.0.0.1:9/tarifs/")
+
+    async def _run():
+        hass = await async_make_hass()
+        hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+        hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+        entry = MockConfigEntry(
+            "entry0",
+            {
+                CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+                CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+                CONF_START_BATTERY_ENERGY: 10.0,
+                CONF_TARIFF_OPTION: TARIFF_OPTION_BASE,
+            },
+            options={CONF_REDUCE_RECORDER_WRITES: True, CONF_MIN_WRITE_INTERVAL: 3600},
+        )
+        entities = await async_setup_entry(hass, entry)
+        hass.states.async_set("sensor.linky_base", "1001.0", {"unit_of_measurement": "kWh"})
+        await hass.async_block_till_done()
+        (bill,) = [entity for entity in entities if isinstance(entity, UrbanSolarBillSensor)]
+        written = hass.states.get(bill.entity_id).state
+        # As if just written: index updates of this hour are held back.
+        bill._last_write_ts = time.time()
+
+        runtime = entry.runtime_data
+        runtime.tariff_data.timeline.add("01/01/2020", {SENSOR_TARIFF_SUBSCRIPTION_TTC: 12.5})
+        runtime.tariff_coordinator.async_set_updated_data(runtime.tariff_data.values)
+        assert float(hass.states.get(bill.entity_id).state) == round(float(written) + 12.5, 2)
+        assert hass.states.get(bill.entity_id).attributes["subscription_fee"] == 12.5
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
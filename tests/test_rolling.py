@@ -0,0 +1,99 @@
+"""Rolling 24h/7d/30d ratios against sums recomputed from every sample."""
+import random
+
+import pytest
+
+from custom_components.urbansolar.rolling import WINDOWS, RollingRatios
+
+HOUR = 3600.0
+
+
+def _expected(samples: list, now_hour: int) -> dict:
+    values = {}
+    for hours, label in WINDOWS:
+        base = out = inj = 0.0
+        for hour, delta_base, delta_out, delta_inj in samples:
+            if now_hour - hours < hour <= now_hour:
+                base += delta_base
+                out += delta_out
+                inj += delta_inj
+        values[f"coverage_{label}"] = out / base * 100 if base > 1e-9 else None
+        values[f"injection_consumed_{label}"] = out / inj * 100 if inj > 1e-9 else None
+    return values
+
+
+def _assert_ratios(rolling: RollingRatios, samples: list, now_hour: int) -> None:
+    expected = _expected(samples, now_hour)
+    for key, value in rolling.ratios().items():
+        assert value == (None if expected[key] is None else pytest.approx(expected[key], rel=1e-9)), key
+
+
+def test_windows_match_a_full_recount():
+    rng = random.Random(42)
+    rolling = RollingRatios()
+    samples = []
+    hour = 400_000
+    for _ in range(3000):
+        # Several samples per hour, hours without samples and gaps of a few days.
+        hour += rng.choice((0, 0, 0, 1, 1, 2, 5, 30, 100))
+        sample = (hour, rng.uniform(0, 2), rng.uniform(0, 1), rng.uniform(0, 1.5))
+        rolling.add(hour * HOUR + rng.uniform(0, HOUR - 1), *sample[1:])
+        samples.append(sample)
+        samples = [sample for sample in samples if sample[0] > hour - rolling.size]
+        _assert_ratios(rolling, samples, hour)
+
+
+def test_hour_leaves_the_window_after_its_length():
+    rolling = RollingRatios()
+    start = 500_000
+    rolling.add(start * HOUR, 2.0, 1.0, 4.0)
+    rolling.add((start + 1) * HOUR, 2.0, 0.0, 0.0)
+    assert rolling.ratios()["coverage_24h"] == pytest.approx(25.0)
+    assert rolling.ratios()["injection_consumed_24h"] == pytest.approx(25.0)
+
+    rolling.add((start + 24) * HOUR, 0.0, 0.0, 0.0)
+    assert rolling.ratios()["coverage_24h"] == 0.0
+    assert rolling.ratios()["injection_consumed_24h"] is None
+    assert rolling.ratios()["coverage_7d"] == pytest.approx(25.0)
+
+    rolling.add((start + 25) * HOUR, 0.0, 0.0, 0.0)
+    assert rolling.ratios()["coverage_24h"] is None
+    # A gap longer than every window clears the buckets.
+    rolling.add((start + 2000) * HOUR, 1.0, 0.5, 0.0)
+    assert rolling.ratios()["coverage_30d"] == pytest.approx(50.0)
+    assert sum(rolling.base) == 1.0
+
+
+def test_clock_going_backwards_counts_in_the_current_hour():
+    rolling = RollingRatios()
+    start = 500_000
+    rolling.add((start + 10) * HOUR, 1.0, 0.0, 0.0)
+    rolling.add((start + 2) * HOUR, 1.0, 1.0, 0.0)
+    assert rolling.hour_key == start + 10
+    assert rolling.base[(start + 10) % rolling.size] == 2.0
+    assert rolling.ratios()["coverage_24h"] == pytest.approx(50.0)
+    # The sample leaves the window with the hour it was counted in.
+    rolling.add((start + 34) * HOUR, 0.0, 0.0, 0.0)
+    assert rolling.ratios()["coverage_24h"] is None
+
+
+def test_saved_buckets_restore_the_same_ratios():
+    rng = random.Random(7)
+    rolling = RollingRatios()
+    hour = 450_000
+    for _ in range(1500):
+        hour += rng.choice((0, 1, 3))
+        rolling.add(hour * HOUR, rng.uniform(0, 2), rng.uniform(0, 1), rng.uniform(0, 1.5))
+
+    restored = RollingRatios()
+    restored.load_dict(rolling.as_dict())
+    assert restored.hour_key == rolling.hour_key
+    for key, value in rolling.ratios().items():
+        assert restored.ratios()[key] == pytest.approx(value, rel=1e-6)
+
+    # Missing or truncated data leaves the buckets empty.
+    for data in (None, {"hour_key": None}, {**rolling.as_dict(), "out": [0.0] * 10}):
+        empty = RollingRatios()
+        empty.load_dict(data)
+        assert empty.hour_key is None
+        assert all(value is None for value in empty.ratios().values())
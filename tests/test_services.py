@@ -0,0 +1,88 @@
+"""Service calls: journal replay, input validation and unload."""
+import asyncio
+
+import pytest
+from homeassistant.exceptions import ServiceValidationError
+
+import custom_components.urbansolar as integration
+from custom_components.urbansolar import SERVICE_GET_STATE_AT, SERVICE_REPLAY_JOURNAL
+from custom_components.urbansolar.const import (
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_START_BATTERY_ENERGY,
+    DOMAIN,
+)
+from custom_components.urbansolar.journal import replay_battery
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+
+async def _async_setup(hass):
+    hass.states.async_set("sensor.linky_base", "1000.0", {"unit_of_measurement": "kWh"})
+    hass.states.async_set("sensor.linky_injection", "500.0", {"unit_of_measurement": "kWh"})
+    entry = MockConfigEntry(
+        "entry0",
+        {
+            CONF_INDEX_BASE_SENSOR: "sensor.linky_base",
+            CONF_INDEX_INJECTION_SENSOR: "sensor.linky_injection",
+            CONF_START_BATTERY_ENERGY: 10.0,
+        },
+    )
+    await async_setup_entry(hass, entry)
+    return entry
+
+
+def test_replay_journal_counts_and_replays_every_record():
+    async def _run():
+        hass = await async_make_hass()
+        entry = await _async_setup(hass)
+        for step in range(1, 6):
+            hass.states.async_set("sensor.linky_injection", f"{500.0 + 2 * step}", {"unit_of_measurement": "kWh"})
+            await hass.async_block_till_done()
+            hass.states.async_set("sensor.linky_base", f"{1000.0 + step}", {"unit_of_measurement": "kWh"})
+            await hass.async_block_till_done()
+
+        response = await hass.services.async_call(
+            DOMAIN, SERVICE_REPLAY_JOURNAL, {"battery_in": 1.0}, blocking=True, return_response=True
+        )
+        records = list(entry.runtime_data.journal.replay())
+        battery_in, battery_out = replay_battery(iter(records), 1.0, 0.0)
+        assert response["records"] == len(records) == 10
+        assert response["battery_in"] == round(battery_in, 3) == 11.0
+        assert response["battery_out"] == round(battery_out, 3) == 5.0
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
+
+
+def test_invalid_service_calls_raise_validation_errors():
+    async def _run():
+        hass = await async_make_hass()
+        entry = await _async_setup(hass)
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(
+                DOMAIN, SERVICE_REPLAY_JOURNAL, {"entry_id": "missing"}, blocking=True, return_response=True
+            )
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(
+                DOMAIN, SERVICE_REPLAY_JOURNAL, {"since": "not a date"}, blocking=True, return_response=True
+            )
+        with pytest.raises(ServiceValidationError):
+            await hass.services.async_call(DOMAIN, SERVICE_GET_STATE_AT, {}, blocking=True, return_response=True)
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
+
+
+def test_unload_without_coordinator():
+    async def _run():
+        hass = await async_make_hass()
+        entry = MockConfigEntry("entry0", {CONF_START_BATTERY_ENERGY: 10.0})
+        hass.config_entries.entries[entry.entry_id] = entry
+        await integration.async_setup_entry(hass, entry)
+        # The sensor platform, which creates the coordinator, never ran.
+        assert entry.runtime_data.coordinator is None
+        assert await integration.async_unload_entry(hass, entry)
+        await hass.async_stop(force=True)
+
+    asyncio.run(_run())
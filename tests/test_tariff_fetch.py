@@ -0,0 +1,278 @@
+"""Tariff page and PDF downloads against a local HTTP server."""
+import asyncio
+from datetime import timedelta
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from homeassistant.util import dt as dt_util
+
+from custom_components.urbansolar import tariffs
+from custom_components.urbansolar.const import (
+    CONF_SUBSCRIBED_POWER,
+    CONF_TARIFF_OPTION,
+    SENSOR_TARIFF_ACH_TTC,
+    SENSOR_TARIFF_ENERGY_TTC,
+    TARIFF_OPTION_BASE,
+)
+from custom_components.urbansolar.coordinator import UrbanSolarTariffCoordinator
+from custom_components.urbansolar.tariffs import TariffData, TariffService
+
+from .common import MockConfigEntry, async_make_hass
+from .pdf import build_pdf, tariff_items, tariff_price
+
+PAGE = """<html><body>
+<a href="/files/BV_PARTICULIER_HPHC_2025.pdf">HP/HC</a>
+<a href="/files/BV_PARTICULIER_BASE_2025.pdf">Base</a>
+</body></html>"""
+PDF = build_pdf(tariff_items((200, 350)))
+
+
+def _entry() -> MockConfigEntry:
+    return MockConfigEntry("entry0", {CONF_TARIFF_OPTION: TARIFF_OPTION_BASE, CONF_SUBSCRIBED_POWER: 6})
+
+
+def _serve(handlers: dict, requests: list):
+    async def _handle(request):
+        requests.append((request.path, request.headers.get("If-None-Match")))
+        return await handlers[request.path](request)
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", _handle)
+    return TestServer(app)
+
+
+async def _page(request):
+    return web.Response(text=PAGE, content_type="text/html", headers={"ETag": '"page1"'})
+
+
+async def _pdf(request):
+    if request.headers.get("If-None-Match") == '"pdf1"':
+        return web.Response(status=304)
+    return web.Response(body=PDF, content_type="application/pdf", headers={"ETag": '"pdf1"'})
+
+
+def _update(monkeypatch, handlers: dict, force_twice: bool = False):
+    """Run a forced update of a base 6 kVA entry; returns (tariff data, requests served)."""
+    requests = []
+
+    async def _run():
+        hass = await async_make_hass()
+        server = _serve(handlers, requests)
+        await server.start_server()
+        monkeypatch.setattr(tariffs, "_TARIFFS_URL", str(server.make_url("/tarifs/")))
+        tariff_data = TariffData(hass, _entry(), service=TariffService(hass))
+        try:
+            await tariff_data.async_update(force=True)
+            if force_twice:
+                # Next page check: same link, the PDF is not downloaded again.
+                tariff_data.service._check_round += 1
+                await tariff_data.async_update(force=True)
+        finally:
+            await server.close()
+            await hass.async_stop(force=True)
+        return tariff_data
+
+    return asyncio.run(_run()), requests
+
+
+def test_success_parses_the_pdf_of_the_option(monkeypatch):
+    tariff_data, requests = _update(
+        monkeypatch,
+        {"/tarifs/": _page, "/files/BV_PARTICULIER_BASE_2025.pdf": _pdf},
+        force_twice=True,
+    )
+    assert tariff_data.last_error is None
+    assert tariff_data.failures == 0
+    assert tariff_data.values[SENSOR_TARIFF_ENERGY_TTC] == tariff_price(1, 0)
+    assert tariff_data.values[SENSOR_TARIFF_ACH_TTC] == tariff_price(1, 1)
+    assert tariff_data.effective_date == "01/08/2025"
+    assert tariff_data.source_url.endswith("/files/BV_PARTICULIER_BASE_2025.pdf")
+    assert tariff_data.etag == '"pdf1"'
+    assert requests == [
+        ("/tarifs/", None),
+        ("/files/BV_PARTICULIER_BASE_2025.pdf", None),
+        ("/tarifs/", '"page1"'),
+    ]
+
+
+@pytest.mark.parametrize("status", [404, 500, 503])
+def test_http_error_schedules_a_retry(monkeypatch, status):
+    async def _error(request):
+        return web.Response(status=status)
+
+    tariff_data, _ = _update(monkeypatch, {"/tarifs/": _error})
+    assert tariff_data.values == {}
+    assert str(status) in tariff_data.last_error
+    assert tariff_data.failures == 1
+    assert tariff_data.next_retry is not None
+
+
+def test_pdf_http_error_keeps_no_values(monkeypatch):
+    async def _error(request):
+        raise web.HTTPInternalServerError()
+
+    tariff_data, _ = _update(monkeypatch, {"/tarifs/": _page, "/files/BV_PARTICULIER_BASE_2025.pdf": _error})
+    assert tariff_data.values == {}
+    assert "500" in tariff_data.last_error
+    assert tariff_data.failures == 1
+
+
+def test_timeout(monkeypatch):
+    monkeypatch.setattr(tariffs, "FETCH_TIMEOUT_S", 0.2)
+
+    async def _slow(request):
+        await asyncio.sleep(2)
+        return await _page(request)
+
+    tariff_data, _ = _update(monkeypatch, {"/tarifs/": _slow})
+    assert tariff_data.values == {}
+    assert tariff_data.failures == 1
+    assert tariff_data.next_retry is not None
+
+
+@pytest.mark.parametrize(
+    "page",
+    [
+        "",
+        "<html><body><p>Maintenance</p></body></html>",
+        '<a href="/files/conditions_generales.pdf">CGV</a>',
+        "<html><a href='/files/BV_PARTICULIER_BASE",
+    ],
+)
+def test_malformed_page(monkeypatch, page):
+    async def _malformed(request):
+        return web.Response(text=page, content_type="text/html")
+
+    tariff_data, requests = _update(monkeypatch, {"/tarifs/": _malformed})
+    assert tariff_data.values == {}
+    assert tariff_data.last_error == "No matching PDF found on tariffs page"
+    assert tariff_data.failures == 1
+    assert requests == [("/tarifs/", None)]
+
+
+def test_fetch_conditional_not_modified():
+    async def _run():
+        server = _serve({"/files/a.pdf": _pdf}, [])
+        await server.start_server()
+        try:
+            async with aiohttp.ClientSession() as session:
+                url = str(server.make_url("/files/a.pdf"))
+                body, etag, _ = await tariffs._fetch_conditional(session, url, None, None)
+                again, same_etag, _ = await tariffs._fetch_conditional(session, url, etag, None)
+        finally:
+            await server.close()
+        return body, etag, again, same_etag
+
+    body, etag, again, same_etag = asyncio.run(_run())
+    assert body == PDF
+    assert etag == '"pdf1"'
+    assert again is None
+    assert same_etag == '"pdf1"'
+
+
+def test_retry_delay_grows_with_jitter_up_to_the_cap(monkeypatch):
+    for failures, full in ((1, 300), (2, 600), (3, 1200), (7, 19200), (8, 6 * 3600), (50, 6 * 3600)):
+        monkeypatch.setattr(tariffs.random, "uniform", lambda low, high: low)
+        assert tariffs._retry_delay(failures) == timedelta(seconds=full / 2)
+        monkeypatch.setattr(tariffs.random, "uniform", lambda low, high: high)
+        assert tariffs._retry_delay(failures) == timedelta(seconds=full)
+    assert tariffs.SHARED_ERROR_WINDOW_S < tariffs.RETRY_BASE_S / 2
+
+
+def test_failures_are_retried_with_backoff_then_reset(monkeypatch):
+    """Three failed page downloads, each retried by the service timer, then a success."""
+    monkeypatch.setattr(tariffs.random, "uniform", lambda low, high: high)
+    # Every retry downloads again (they are minutes apart in real life).
+    monkeypatch.setattr(tariffs, "SHARED_ERROR_WINDOW_S", 0)
+    timers = []
+
+    def _track(hass, action, when):
+        timers.append((when, action))
+        return lambda: None
+
+    monkeypatch.setattr(tariffs, "async_track_point_in_utc_time", _track)
+    failures = 3
+
+    async def _flaky_page(request):
+        nonlocal failures
+        if failures:
+            failures -= 1
+            return web.Response(status=503)
+        return await _page(request)
+
+    async def _run():
+        hass = await async_make_hass()
+        server = _serve({"/tarifs/": _flaky_page, "/files/BV_PARTICULIER_BASE_2025.pdf": _pdf}, [])
+        await server.start_server()
+        monkeypatch.setattr(tariffs, "_TARIFFS_URL", str(server.make_url("/tarifs/")))
+        entry = _entry()
+        service = TariffService(hass)
+        tariff_data = TariffData(hass, entry, service=service)
+        coordinator = UrbanSolarTariffCoordinator(hass, entry, tariff_data)
+        unsubscribe = service.async_subscribe(coordinator)
+        # Nothing failed yet: the timer waits for the next page check.
+        assert timers[-1][0] == service._next_check
+        # No monthly round during the test, even on the last evening of a month.
+        service._next_round = dt_util.utcnow() + timedelta(days=40)
+        steps = []
+        try:
+            started = dt_util.utcnow()
+            await coordinator.async_force_refresh()
+            for _ in range(4):
+                steps.append((tariff_data.failures, started, tariff_data.next_retry, timers[-1][0]))
+                if tariff_data.next_retry is None:
+                    break
+                started = dt_util.utcnow()
+                # The retry time is reached: the timer refreshes the entry in the background.
+                timers[-1][1](tariff_data.next_retry)
+                while service._refreshing:
+                    await asyncio.sleep(0.01)
+            next_check = service._next_check
+        finally:
+            unsubscribe()
+            await server.close()
+            await hass.async_stop(force=True)
+        return tariff_data, steps, next_check
+
+    tariff_data, steps, next_check = asyncio.run(_run())
+    assert [step[0] for step in steps] == [1, 2, 3, 0]
+    for (_, started, next_retry, armed), delay in zip(steps, (300, 600, 1200)):
+        assert timedelta(seconds=delay) <= next_retry - started < timedelta(seconds=delay + 5)
+        assert armed == next_retry
+    # The success clears the retry and the timer goes back to the page check.
+    assert steps[-1][2] is None
+    assert steps[-1][3] == next_check
+    assert tariff_data.last_error is None
+    assert tariff_data.values[SENSOR_TARIFF_ENERGY_TTC] == tariff_price(1, 0)
+
+
+def test_entries_share_a_recent_error(monkeypatch):
+    """A second entry failing within the window does not download the page again."""
+    requests = []
+
+    async def _error(request):
+        return web.Response(status=503)
+
+    async def _run():
+        hass = await async_make_hass()
+        server = _serve({"/tarifs/": _error}, requests)
+        await server.start_server()
+        monkeypatch.setattr(tariffs, "_TARIFFS_URL", str(server.make_url("/tarifs/")))
+        service = TariffService(hass)
+        first = TariffData(hass, _entry(), service=service)
+        second = TariffData(hass, MockConfigEntry("entry1", dict(_entry().data)), service=service)
+        try:
+            await first.async_update(force=True)
+            await second.async_update(force=True)
+        finally:
+            await server.close()
+            await hass.async_stop(force=True)
+        return first, second
+
+    first, second = asyncio.run(_run())
+    assert len(requests) == 1
+    assert first.failures == second.failures == 1
+    assert second.last_error == first.last_error
+    assert second.next_retry is not None
@@ -0,0 +1,166 @@
+"""Tariff parser helpers on the synthetic fixtures of tests/fixtures/tariff_parser."""
+import glob
+import importlib.util
+import json
+import os
+import shutil
+
+import pytest
+
+from custom_components.urbansolar import tariff_parser
+from custom_components.urbansolar.const import TARIFF_OPTION_BASE, TARIFF_OPTION_HPHC
+from custom_components.urbansolar.tariffs import _find_pdf_url
+
+from .pdf import build_pdf, tariff_items
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "tariff_parser")
+WORD_FIXTURES = sorted(glob.glob(os.path.join(FIXTURES, "*.words.json")))
+PAGE_FIXTURES = sorted(glob.glob(os.path.join(FIXTURES, "*.html")))
+
+
+def _bench():
+    spec = importlib.util.spec_from_file_location(
+        "bench_tariff_parser", os.path.join(ROOT, "scripts", "bench_tariff_parser.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as fh:
+        return json.load(fh)
+
+
+def _words(x: float, y: float, text: str) -> dict:
+    return {"text": text, "x0": x - 5, "x1": x + 5, "top": y - 5, "bottom": y + 5}
+
+
+@pytest.fixture(params=WORD_FIXTURES, ids=os.path.basename)
+def fixture(request):
+    return _load(request.param)
+
+
+def test_fixtures_exist():
+    assert WORD_FIXTURES
+    assert PAGE_FIXTURES
+
+
+def test_find_kva_rows(fixture):
+    rows = tariff_parser._find_kva_rows(fixture["words"], fixture["page_height"])
+    assert {str(kva): round(y, 2) for kva, y in rows.items()} == fixture["expected"]["kva_rows"]
+
+
+def test_crop_to_table(fixture):
+    rows = tariff_parser._find_kva_rows(fixture["words"], fixture["page_height"])
+    numbers = tariff_parser._extract_number_words(fixture["words"])
+    cropped = tariff_parser._crop_to_table(numbers, rows)
+    assert sorted(item[2] for item in numbers if item not in cropped) == fixture["expected"]["dropped"]
+    assert all(item in numbers for item in cropped)
+
+
+def test_cluster_by_x(fixture):
+    rows = tariff_parser._find_kva_rows(fixture["words"], fixture["page_height"])
+    numbers = tariff_parser._crop_to_table(tariff_parser._extract_number_words(fixture["words"]), rows)
+    prices = [item for item in numbers if item[2] < 1]
+    columns = tariff_parser._cluster_by_x(prices, 4 if fixture["option"] == TARIFF_OPTION_HPHC else 2)
+    assert [
+        [value for _, _, value in sorted(column, key=lambda item: item[1])] for column in columns
+    ] == fixture["expected"]["columns"]
+    # The columns do not depend on the order of the words.
+    reversed_columns = tariff_parser._cluster_by_x(prices[::-1], len(columns))
+    assert [sorted(column) for column in reversed_columns] == [sorted(column) for column in columns]
+
+
+def test_parse_words(fixture):
+    result = tariff_parser.parse_words(
+        fixture["words"], fixture["page_height"], fixture["option"], fixture["power"]
+    )
+    assert result["effective_date"] == fixture["expected"]["effective_date"]
+    assert result["values"] == pytest.approx(fixture["expected"]["values"])
+
+
+@pytest.mark.parametrize("path", PAGE_FIXTURES, ids=os.path.basename)
+def test_find_pdf_url(path):
+    with open(path, encoding="utf-8") as fh:
+        html = fh.read()
+    expected = _load(os.path.splitext(path)[0] + ".json")
+    for option in (TARIFF_OPTION_BASE, TARIFF_OPTION_HPHC):
+        assert _find_pdf_url(html, option) == expected[option]
+
+
+def test_find_pdf_url_hphc_falls_back_to_hp_token():
+    html = '<a href="/a/BV_PARTICULIER_BASE.pdf">b</a><a href="/a/BV_PARTICULIER_HP_HC.pdf">h</a>'
+    assert _find_pdf_url(html, TARIFF_OPTION_HPHC).endswith("/a/BV_PARTICULIER_HP_HC.pdf")
+    assert _find_pdf_url("<p>no link</p>", TARIFF_OPTION_BASE) is None
+
+
+def test_cluster_by_x_needs_enough_distinct_columns():
+    assert tariff_parser._cluster_by_x([], 2) == []
+    assert tariff_parser._cluster_by_x([(10, 1, 0.1)], 2) == []
+    same_x = [(10, y, 0.1) for y in range(5)]
+    assert tariff_parser._cluster_by_x(same_x, 2) == []
+
+
+def test_cluster_by_x_splits_at_widest_gaps():
+    values = [(100, 1, 0.1), (102, 2, 0.1), (150, 1, 0.2), (151, 2, 0.2), (300, 1, 0.3)]
+    assert tariff_parser._cluster_by_x(values, 3) == [values[:2], values[2:4], values[4:]]
+    # Equal gaps: the leftmost split wins.
+    even = [(0, 0, 0.1), (10, 0, 0.2), (20, 0, 0.3)]
+    assert tariff_parser._cluster_by_x(even, 2) == [even[:1], even[1:]]
+
+
+def test_find_kva_rows_keeps_the_left_column_of_the_upper_page():
+    words = [
+        _words(50, 100, "6"),
+        _words(50, 120, "9"),
+        _words(52, 90, "6"),  # Same power higher up: the topmost one is kept.
+        _words(300, 110, "12"),  # Not in the left column.
+        _words(50, 700, "3"),  # Below 60 % of the page.
+        _words(50, 140, "7"),  # Not a subscribed power.
+    ]
+    assert tariff_parser._find_kva_rows(words, 842) == {6: 90, 9: 120}
+    assert tariff_parser._find_kva_rows([_words(50, 100, "abc")], 842) == {}
+
+
+def test_crop_to_table_without_a_table_keeps_every_number():
+    numbers = [(10, 5, 0.1), (10, 800, 0.2)]
+    assert tariff_parser._crop_to_table(numbers, {}) == numbers
+    assert tariff_parser._crop_to_table(numbers, {6: 100}) == numbers
+    # One row pitch above and below the table.
+    rows = {3: 100, 6: 120, 9: 140}
+    inside = [(10, 80, 0.1), (10, 160, 0.2), (10, 79, 0.3), (10, 161, 0.4)]
+    assert tariff_parser._crop_to_table(inside, rows) == inside[:2]
+
+
+def test_parse_pdf_matches_parse_words():
+    pdf = build_pdf(tariff_items((200, 350)))
+    result = tariff_parser.parse_pdf(pdf, TARIFF_OPTION_BASE, 6)
+    fixture = _load(os.path.join(FIXTURES, "base_clean.words.json"))
+    assert result == tariff_parser.parse_words(fixture["words"], fixture["page_height"], TARIFF_OPTION_BASE, 6)
+
+
+def test_regression_check_passes_on_the_fixtures():
+    assert _bench().main(["--runs", "1"]) == 0
+
+
+def test_regression_check_fails_when_the_output_changes(tmp_path):
+    for name in ("base_clean.words.json", "page_links.html", "page_links.json"):
+        shutil.copy(os.path.join(FIXTURES, name), tmp_path / name)
+    bench = _bench()
+    assert bench.main([str(tmp_path), "--runs", "1"]) == 0
+
+    document = _load(tmp_path / "base_clean.words.json")
+    document["expected"]["columns"][0][1] = 0.2
+    with open(tmp_path / "base_clean.words.json", "w", encoding="utf-8") as fh:
+        bench.dump_words_fixture(document, fh)
+    assert bench.main([str(tmp_path), "--runs", "1"]) == 1
+
+
+def test_regression_check_fails_without_expected_values(tmp_path):
+    shutil.copy(os.path.join(FIXTURES, "page_links.html"), tmp_path / "page_links.html")
+    bench = _bench()
+    assert bench.main([str(tmp_path), "--runs", "1"]) == 1
+    assert bench.main([str(tmp_path), "--runs", "1", "--record"]) == 0
+    assert bench.main([str(tmp_path), "--runs", "1"]) == 0
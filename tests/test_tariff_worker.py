@@ -0,0 +1,57 @@
+"""PDF parsing in a child process: result, isolation from Home Assistant, timeout and fallback."""
+import json
+import multiprocessing
+import subprocess
+import sys
+
+import pytest
+
+from custom_components.urbansolar import tariff_parser, tariff_worker, tariffs
+from custom_components.urbansolar.const import TARIFF_OPTION_HPHC
+
+from .pdf import build_pdf, tariff_items
+
+PDF = build_pdf(tariff_items((200, 280, 360, 440)))
+
+_PROBE = """
+import json, runpy, sys
+worker = runpy.run_path(sys.argv[1], run_name="probe")
+worker["load_parser"]()
+print(json.dumps({name: name in sys.modules for name in
+                  ("homeassistant", "custom_components.urbansolar", "pdfplumber")}))
+"""
+
+
+def test_child_process_result_matches_the_parser():
+    assert tariffs._parse_pdf_job(PDF, TARIFF_OPTION_HPHC, 6) == tariff_parser.parse_pdf(PDF, TARIFF_OPTION_HPHC, 6)
+
+
+def test_child_process_error_is_raised():
+    with pytest.raises(ValueError, match="PDF"):
+        tariffs._parse_pdf_job(b"not a pdf", TARIFF_OPTION_HPHC, 6)
+
+
+def test_worker_does_not_import_home_assistant():
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE, tariff_worker.__file__], check=True, capture_output=True, text=True
+    ).stdout
+    assert json.loads(output.strip().splitlines()[-1]) == {
+        "homeassistant": False,
+        "custom_components.urbansolar": False,
+        "pdfplumber": True,
+    }
+
+
+def test_timeout_kills_the_child(monkeypatch):
+    monkeypatch.setattr(tariffs, "PARSE_TIMEOUT_S", 0.001)
+    with pytest.raises(TimeoutError):
+        tariffs._parse_pdf_job(PDF, TARIFF_OPTION_HPHC, 6)
+    assert not multiprocessing.active_children()
+
+
+def test_parses_in_thread_when_no_process_can_start(monkeypatch):
+    def _no_processes(method):
+        raise OSError("no subprocesses")
+
+    monkeypatch.setattr(multiprocessing, "get_context", _no_processes)
+    assert tariffs._parse_pdf_job(PDF, TARIFF_OPTION_HPHC, 6) == tariff_parser.parse_pdf(PDF, TARIFF_OPTION_HPHC, 6)
@@ -0,0 +1,88 @@
+"""Tariff versions: lookups across version boundaries and undated PDFs."""
+from datetime import datetime, timezone
+
+import pytest
+from homeassistant.util import dt as dt_util
+
+from custom_components.urbansolar.timeline import TariffTimeline, effective_timestamp
+
+PRICE = "tariff_energy_ttc"
+
+
+@pytest.fixture(autouse=True)
+def paris_time_zone():
+    previous = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(dt_util.get_time_zone("Europe/Paris"))
+    yield
+    dt_util.set_default_time_zone(previous)
+
+
+def _timeline() -> TariffTimeline:
+    timeline = TariffTimeline()
+    # Added out of order.
+    assert timeline.add("01/08/2025", {PRICE: 0.20})
+    assert timeline.add("01/02/2025", {PRICE: 0.25})
+    assert timeline.add("2025-11-01", {PRICE: 0.22})
+    return timeline
+
+
+def test_effective_dates_are_local_midnight():
+    assert effective_timestamp("01/08/2025") == datetime(2025, 7, 31, 22, tzinfo=timezone.utc).timestamp()
+    assert effective_timestamp("2025-02-01") == datetime(2025, 1, 31, 23, tzinfo=timezone.utc).timestamp()
+    assert effective_timestamp("32/01/2025") is None
+
+
+def test_version_in_force():
+    timeline = _timeline()
+    august = effective_timestamp("01/08/2025")
+    assert timeline.dates == ["01/02/2025", "01/08/2025", "2025-11-01"]
+    assert timeline.at(august - 1) == {PRICE: 0.25}
+    assert timeline.at(august) == {PRICE: 0.20}
+    assert timeline.at(effective_timestamp("2026-01-01")) == {PRICE: 0.22}
+    # Before the oldest version: the oldest one is the closest estimate.
+    assert timeline.at(0.0) == {PRICE: 0.25}
+    assert TariffTimeline().at(august) is None
+
+
+def test_prices_across_version_boundaries():
+    timeline = _timeline()
+    august, november = effective_timestamp("01/08/2025"), effective_timestamp("2025-11-01")
+    timestamps = [0.0, august - 3600, august, august + 3600, november - 1, november, november + 86400 * 400]
+    assert timeline.prices(timestamps, PRICE) == [0.25, 0.25, 0.20, 0.20, 0.20, 0.22, 0.22]
+    assert timeline.prices(timestamps, "missing") == [None] * len(timestamps)
+    assert timeline.prices(timestamps, PRICE) == [timeline.at(ts)[PRICE] for ts in timestamps]
+    assert TariffTimeline().prices([august], PRICE) == [None]
+
+
+def test_replacing_a_version_bumps_the_revision():
+    timeline = _timeline()
+    revision = timeline.revision
+    assert not timeline.add("01/08/2025", {PRICE: 0.20})
+    assert timeline.revision == revision
+    assert timeline.add("01/08/2025", {PRICE: 0.21})
+    assert timeline.revision == revision + 1
+    assert len(timeline) == 3
+
+
+def test_undated_pdf_checked_every_day_adds_no_version():
+    timeline = TariffTimeline()
+    assert timeline.add(None, {PRICE: 0.20}, datetime(2025, 8, 3, 10, tzinfo=timezone.utc))
+    for day in range(4, 30):
+        assert not timeline.add(None, {PRICE: 0.20}, datetime(2025, 8, day, 10, tzinfo=timezone.utc))
+    assert timeline.dates == ["2025-08-03"]
+    # New prices are still recorded, dated by their first check.
+    assert timeline.add(None, {PRICE: 0.21}, datetime(2025, 9, 1, 10, tzinfo=timezone.utc))
+    assert timeline.dates == ["2025-08-03", "2025-09-01"]
+    assert not timeline.add(None, {PRICE: 0.20}, None)
+
+
+def test_duplicates_saved_before_are_dropped_on_load():
+    saved = [{"effective_date": f"2025-08-{day:02d}", "values": {PRICE: 0.20}} for day in range(3, 10)]
+    saved.append({"effective_date": "01/09/2025", "values": {PRICE: 0.21}})
+    saved.append({"effective_date": "bad", "values": {PRICE: "x"}})
+    timeline = TariffTimeline()
+    timeline.load_list(saved)
+    assert timeline.as_list() == [
+        {"effective_date": "2025-08-03", "values": {PRICE: 0.20}},
+        {"effective_date": "01/09/2025", "values": {PRICE: 0.21}},
+    ]
@@ -0,0 +1,77 @@
+"""Off-peak schedule lookups across DST changes."""
+from datetime import datetime, timedelta
+
+import pytest
+
+from homeassistant.util import dt as dt_util
+
+from custom_components.urbansolar.timeofuse import OffPeakSchedule, _utc_offset, _week_slot
+
+PARIS = dt_util.get_time_zone("Europe/Paris")
+
+
+@pytest.fixture(autouse=True)
+def _paris_time_zone():
+    previous = dt_util.DEFAULT_TIME_ZONE
+    dt_util.set_default_time_zone(PARIS)
+    yield
+    dt_util.set_default_time_zone(previous)
+
+
+def _expected(schedule: OffPeakSchedule, first_hour: int, hours: int) -> list:
+    return [
+        schedule.hour_fraction[_week_slot(hour * 3600, _utc_offset(hour))]
+        for hour in range(first_hour, first_hour + hours)
+    ]
+
+
+def test_dst_change_in_final_partial_day():
+    schedule = OffPeakSchedule.from_string("22:00-06:00")
+    start = datetime(2025, 3, 29, 20, 0, tzinfo=PARIS).timestamp()
+    first_hour, fractions = schedule.hourly_fractions(start, start + 11 * 3600)
+
+    assert len(fractions) == 12
+    # 2025-03-30 06:00 CEST: the first peak hour after the change.
+    assert fractions[8] == 1.0
+    assert fractions[9] == 0.0
+    assert fractions == _expected(schedule, first_hour, 12)
+
+
+@pytest.mark.parametrize(
+    "start",
+    [
+        datetime(2025, 3, 27, 13, 0, tzinfo=PARIS),
+        datetime(2025, 10, 25, 23, 0, tzinfo=PARIS),
+        datetime(2025, 10, 26, 1, 0, tzinfo=PARIS),
+    ],
+)
+@pytest.mark.parametrize("hours", [1, 5, 24, 25, 49, 24 * 9 + 7])
+def test_hourly_fractions_match_hour_by_hour_lookup(start, hours):
+    schedule = OffPeakSchedule.from_string("01:30-07:30, 12:30-14:30")
+    first_ts = start.timestamp()
+    last_ts = (start + timedelta(hours=hours - 1)).timestamp()
+    first_hour, fractions = schedule.hourly_fractions(first_ts, last_ts)
+    assert fractions == _expected(schedule, first_hour, int(last_ts // 3600) - first_hour + 1)
+
+
+@pytest.mark.parametrize(
+    ("day", "ranges", "expected"),
+    [
+        # 2025-03-30: 02:00-03:00 does not exist, the day has 23 hours.
+        ((2025, 3, 30), "22:00-06:00", [1.0] * 5 + [0.0] * 16 + [1.0] * 2),
+        ((2025, 3, 30), "02:30-03:30", [0.0, 0.0, 0.5] + [0.0] * 20),
+        # 2025-10-26: 02:00-03:00 happens twice, the day has 25 hours.
+        ((2025, 10, 26), "22:00-06:00", [1.0] * 7 + [0.0] * 16 + [1.0] * 2),
+        ((2025, 10, 26), "02:30-03:30", [0.0, 0.0, 0.5, 0.5, 0.5] + [0.0] * 20),
+    ],
+)
+def test_hourly_fractions_of_a_dst_day(day, ranges, expected):
+    schedule = OffPeakSchedule.from_string(ranges)
+    first_ts = datetime(*day, tzinfo=PARIS).timestamp()
+    last_ts = (datetime(*day, tzinfo=PARIS) + timedelta(days=1)).timestamp() - 1
+    first_hour, fractions = schedule.hourly_fractions(first_ts, last_ts)
+    assert first_hour * 3600 == first_ts
+    assert fractions == expected
+    # The same day as the last partial day of a longer range.
+    _, fractions = schedule.hourly_fractions(first_ts - 3 * 86400 - 7200, last_ts)
+    assert fractions[-len(expected):] == expected
@@ -0,0 +1,109 @@
+"""Unique ids and source listeners of the sensors are scoped to their config entry."""
+import asyncio
+
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.urbansolar.const import (
+    CONF_CAPACITY_BATTERY,
+    CONF_INDEX_BASE_SENSOR,
+    CONF_INDEX_INJECTION_SENSOR,
+    CONF_START_BATTERY_ENERGY,
+    DOMAIN,
+)
+from custom_components.urbansolar.history import _derived_entity_ids
+
+from .common import MockConfigEntry, async_make_hass, async_setup_entry, async_stop
+
+ENTRIES = 120
+
+
+def _entry(hass, index: int, version: int = 3) -> MockConfigEntry:
+    base = f"sensor.linky_{index}_base"
+    injection = f"sensor.linky_{index}_injection"
+    hass.states.async_set(base, "1000.0", {"unit_of_measurement": "kWh"})
+    hass.states.async_set(injection, "500.0", {"unit_of_measurement": "kWh"})
+    return MockConfigEntry(
+        f"entry{index}",
+        {
+            CONF_INDEX_BASE_SENSOR: base,
+            CONF_INDEX_INJECTION_SENSOR: injection,
+            CONF_START_BATTERY_ENERGY: 10.0,
+        },
+        version=version,
+    )
+
+
+def test_concurrent_entries_register_every_sensor():
+    async def _run():
+        hass = await async_make_hass()
+        entries = [_entry(hass, index) for index in range(ENTRIES)]
+        added = await asyncio.gather(*(async_setup_entry(hass, entry) for entry in entries))
+        ent_reg = er.async_get(hass)
+
+        per_entry = len(added[0])
+        assert per_entry > 0
+        unique_ids = set()
+        for entry, entities in zip(entries, added):
+            assert len(entities) == per_entry
+            registered = er.async_entries_for_config_entry(ent_reg, entry.entry_id)
+            assert len(registered) == per_entry
+            assert all(e.unique_id.startswith(f"{entry.entry_id}_") for e in registered)
+            assert all(hass.states.get(e.entity_id) is not None for e in registered if not e.disabled)
+            unique_ids.update(e.unique_id for e in registered)
+            assert CONF_CAPACITY_BATTERY in _derived_entity_ids(hass, entry)
+        assert len(unique_ids) == ENTRIES * per_entry
+        await async_stop(hass, entries)
+
+    asyncio.run(_run())
+
+
+def test_migration_prefixes_existing_unique_ids():
+    async def _run():
+        hass = await async_make_hass()
+        entry = _entry(hass, 0, version=2)
+        ent_reg = er.async_get(hass)
+        old = ent_reg.async_get_or_create(
+            "sensor", DOMAIN, CONF_CAPACITY_BATTERY, config_entry=entry, suggested_object_id="my_battery"
+        )
+
+        await async_setup_entry(hass, entry)
+
+        assert entry.version == 3
+        migrated = ent_reg.async_get(old.entity_id)
+        assert migrated.unique_id == f"{entry.entry_id}_{CONF_CAPACITY_BATTERY}"
+        assert ent_reg.async_get_entity_id("sensor", DOMAIN, CONF_CAPACITY_BATTERY) is None
+        assert _derived_entity_ids(hass, entry)[CONF_CAPACITY_BATTERY] == "sensor.my_battery"
+        assert hass.states.get("sensor.my_battery") is not None
+        await async_stop(hass, [entry])
+
+    asyncio.run(_run())
+
+
+def test_source_event_only_reaches_its_own_entry():
+    async def _run():
+        hass = await async_make_hass()
+        entries = [_entry(hass, index) for index in range(20)]
+        await asyncio.gather(*(async_setup_entry(hass, entry) for entry in entries))
+        await hass.async_block_till_done()
+        updates = {entry.entry_id: 0 for entry in entries}
+        for entry in entries:
+            coordinator = entry.runtime_data.coordinator
+            original = coordinator.async_set_updated_data
+
+            def _count(data, entry_id=entry.entry_id, original=original):
+                updates[entry_id] += 1
+                original(data)
+
+            coordinator.async_set_updated_data = _count
+        events = {entry.entry_id: entry.runtime_data.metrics.source_events for entry in entries}
+
+        hass.states.async_set("sensor.linky_7_base", "1001.0", {"unit_of_measurement": "kWh"})
+        await hass.async_block_till_done()
+
+        for entry in entries:
+            expected = 1 if entry.entry_id == "entry7" else 0
+            assert entry.runtime_data.metrics.source_events - events[entry.entry_id] == expected
+            assert updates[entry.entry_id] == expected
+        await async_stop(hass, entries)
+
+    asyncio.run(_run())